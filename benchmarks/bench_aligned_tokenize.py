@@ -0,0 +1,25 @@
+import timeit
+import argparse
+from visolex.framework_components.aligned_tokenizer import aligned_tokenize
+from tests.data_handler.test_preprocessing_cache import build_tokenizer
+from tests.data_handler.test_aligned_tokenizer import aligned_tokenize_loop, random_data
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m benchmarks.bench_aligned_tokenize
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_sents", default=5000, type=int, help="Number of sentences to pre-process")
+    parser.add_argument("--method", default="train", type=str, help="'train' (labeled) or 'unlabeled'")
+    parser.add_argument("--repeat", default=1, type=int, help="Number of timed runs")
+    args = parser.parse_args()
+
+    tokenizer = build_tokenizer()
+    data = random_data(args.num_sents, args.method)
+    loop_time = min(timeit.repeat(
+        lambda: aligned_tokenize_loop(data, tokenizer, args.method, 1, 0.0, False), number=1, repeat=args.repeat
+    ))
+    batched_time = min(timeit.repeat(
+        lambda: aligned_tokenize(data, tokenizer, args.method, 1, 0.0, False), number=1, repeat=args.repeat
+    ))
+    print("{} sentences: loop {:.2f}s, batched {:.2f}s ({:.1f}x)".format(
+        args.num_sents, loop_time, batched_time, loop_time / batched_time
+    ))
@@ -0,0 +1,42 @@
+import timeit
+import argparse
+from visolex.lexnorm.basic_normalizer import BasicNormalizer
+from tests.lexnorm.test_basic_normalizer import basic_normalizer_reference, random_corpus
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m benchmarks.bench_basic_normalizer
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=None, type=str, help="Text file with one sentence per line (default: synthetic corpus)")
+    parser.add_argument("--num_sents", default=2000, type=int, help="Size of the synthetic corpus")
+    parser.add_argument("--lowercase", action="store_true", help="Lowercase before normalizing")
+    parser.add_argument("--workers", default=0, type=int, help="Also time normalize_many with this many processes")
+    parser.add_argument("--repeat", default=1, type=int, help="Number of timed runs")
+    args = parser.parse_args()
+
+    if args.input is not None:
+        with open(args.input, encoding="utf-8") as f:
+            corpus = [line.rstrip("\n") for line in f]
+    else:
+        corpus = random_corpus(args.num_sents)
+    num_chars = sum(len(sent) for sent in corpus)
+    normalizer = BasicNormalizer()
+
+    reference_time = min(timeit.repeat(
+        lambda: [basic_normalizer_reference(sent, args.lowercase) for sent in corpus], number=1, repeat=args.repeat
+    ))
+    compiled_time = min(timeit.repeat(
+        lambda: [normalizer.basic_normalizer(sent, args.lowercase) for sent in corpus], number=1, repeat=args.repeat
+    ))
+    print("{} sentences, {} characters".format(len(corpus), num_chars))
+    print("{:>12} {:>14} {:>16}".format("pipeline", "time (s)", "chars/sec"))
+    print("{:>12} {:>14.2f} {:>16,.0f}".format("reference", reference_time, num_chars / reference_time))
+    print("{:>12} {:>14.2f} {:>16,.0f}".format("compiled", compiled_time, num_chars / compiled_time))
+    if args.workers > 1:
+        parallel_time = min(timeit.repeat(
+            lambda: list(normalizer.normalize_many(corpus, workers=args.workers, lowercase=args.lowercase)),
+            number=1, repeat=args.repeat
+        ))
+        print("{:>12} {:>14.2f} {:>16,.0f}".format(
+            "{} workers".format(args.workers), parallel_time, num_chars / parallel_time
+        ))
+    print("speedup: {:.1f}x".format(reference_time / compiled_time))
@@ -0,0 +1,27 @@
+import timeit
+import logging
+import argparse
+import attridict
+from visolex.framework_components.evaluator import Evaluator
+from tests.evaluator.test_evaluator import evaluate_loop, random_batches
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m benchmarks.bench_evaluator
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_elements", default=[100, 1000, 10000], type=int, nargs="+", help="Number of sentences/batches evaluated")
+    parser.add_argument("--repeat", default=3, type=int, help="Number of timed runs per size")
+    args = parser.parse_args()
+
+    evaluator = Evaluator(attridict({'metric': 'f1_score'}), logging.getLogger(__name__))
+    print("{:>12} {:>14} {:>16} {:>10}".format("elements", "loop (ms)", "vectorized (ms)", "speedup"))
+    for num_elements in args.num_elements:
+        preds, targets, sources = random_batches(num_elements)
+        loop_time = min(timeit.repeat(
+            lambda: evaluate_loop(preds, targets, sources), number=1, repeat=args.repeat
+        ))
+        vectorized_time = min(timeit.repeat(
+            lambda: evaluator.evaluate(preds, targets, sources), number=1, repeat=args.repeat
+        ))
+        print("{:>12} {:>14.2f} {:>16.2f} {:>9.1f}x".format(
+            num_elements, 1000 * loop_time, 1000 * vectorized_time, loop_time / vectorized_time
+        ))
@@ -0,0 +1,29 @@
+import timeit
+import argparse
+import torch
+from visolex.global_variables import NUM_LABELS_N_MASKS
+from visolex.framework_components.normalizer.trainer_tools import get_label_n_masks
+from tests.normalizer.test_trainer_tools import get_label_n_masks_loop
+
+BATCH_SHAPES = [(16, 16), (16, 64), (128, 32), (128, 128)]
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m benchmarks.bench_label_n_masks
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cpu", type=str, help="Device to run the benchmark on")
+    parser.add_argument("--mask_ratio", default=0.2, type=float, help="Ratio of <mask> tokens")
+    parser.add_argument("--repeat", default=5, type=int, help="Number of timed runs per shape")
+    args = parser.parse_args()
+
+    print("{:>12} {:>14} {:>14} {:>10}".format("shape", "loop (ms)", "vectorized (ms)", "speedup"))
+    for shape in BATCH_SHAPES:
+        input = (torch.rand(*shape) < args.mask_ratio).to(args.device)
+        loop_time = min(timeit.repeat(
+            lambda: get_label_n_masks_loop(input, NUM_LABELS_N_MASKS), number=1, repeat=args.repeat
+        ))
+        vectorized_time = min(timeit.repeat(
+            lambda: get_label_n_masks(input, NUM_LABELS_N_MASKS), number=1, repeat=args.repeat
+        ))
+        print("{:>12} {:>14.2f} {:>14.2f} {:>9.1f}x".format(
+            "x".join(map(str, shape)), 1000 * loop_time, 1000 * vectorized_time, loop_time / vectorized_time
+        ))
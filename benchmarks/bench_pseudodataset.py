@@ -0,0 +1,60 @@
+import time
+import logging
+import argparse
+import tracemalloc
+from copy import deepcopy
+import numpy as np
+from attridict import AttriDict
+from visolex.framework_components.columnar import ColumnStore
+from visolex.framework_components.data_handler import PseudoDataset
+
+def random_columns(num_sents, num_rules=2, seed=0):
+    rng = np.random.default_rng(seed)
+    sent_lens = rng.integers(5, 60, size=num_sents)
+    return {
+        'id': list(range(num_sents)),
+        'input': [['w{}'.format(i) for i in range(n // 2)] for n in sent_lens],
+        'input_ids': [rng.integers(0, 30000, size=n).tolist() for n in sent_lens],
+        'align_index': [np.repeat(np.arange(n // 2 + 1), 2)[:n - 2].tolist() for n in sent_lens],
+        'weak_labels': [rng.integers(0, 30000, size=(n, num_rules)).tolist() for n in sent_lens],
+        'sent_len': sent_lens.tolist(),
+    }
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size / 2 ** 20
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m benchmarks.bench_pseudodataset
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_sents", default=20000, type=int, help="Number of unlabeled sentences")
+    parser.add_argument("--sample_size", default=5000, type=int, help="PseudoDataset.downsample size")
+    args = parser.parse_args()
+
+    columns = random_columns(args.num_sents)
+    lists, _, list_size = measure(lambda: deepcopy(columns))
+    store, _, store_size = measure(lambda: ColumnStore.from_dict(columns))
+    print("{} sentences: lists {:.1f}MB, columnar {:.1f}MB".format(args.num_sents, list_size, store_size))
+
+    logger = logging.getLogger(__name__)
+    def copy_lists():
+        # PseudoDataset before the columnar store: three deep copies, then a downsample
+        original_data, data = deepcopy(lists), deepcopy(lists)
+        keep_indices = np.random.choice(args.num_sents, args.sample_size, replace=False)
+        return original_data, data, {key: [values[i] for i in keep_indices] for key, values in original_data.items()}
+    _, list_time, _ = measure(copy_lists)
+
+    def create_views():
+        dataset = PseudoDataset(AttriDict({'seed': 0}), AttriDict({
+            'method': 'unlabeled', 'num_labels': 30000, 'data': store, 'no_accent_data': {},
+            'online_augmentation': False
+        }), logger)
+        dataset.downsample(args.sample_size)
+        return dataset
+    _, view_time, view_size = measure(create_views)
+    print("PseudoDataset + downsample: copies {:.2f}s, views {:.4f}s ({:.1f}MB)".format(list_time, view_time, view_size))
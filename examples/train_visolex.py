@@ -40,10 +40,9 @@ def train_visolex(model_name, training_mode, rm_accent_ratio, custom_dataset=Fal
 
     logger.info("Loading data")
     dh = DataHandler(args, tokenizer=tokenizer, logger=logger)
-    train_dataset = dh.load_dataset(method='train') 
-    dev_dataset = dh.load_dataset(method='dev')
-    test_dataset = dh.load_dataset(method='test')
-    unlabeled_dataset = dh.load_dataset(method='unlabeled')
+    train_dataset, dev_dataset, test_dataset, unlabeled_dataset = dh.load_datasets(
+        methods=['train', 'dev', 'test', 'unlabeled']
+    )
 
     trainer = ViSoLexTrainer(
         args, dh, tokenizer, normalizer, logger, ev,
@@ -0,0 +1,104 @@
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from visolex.utils import sort_data
+from visolex.framework_components.aligned_tokenizer import aligned_tokenize, AccentAugmenter
+from visolex.framework_components.data_handler import WSDataset
+from tests.data_handler.test_preprocessing_cache import build_tokenizer, build_args, write_dataset
+from tests.data_handler.test_aligned_tokenizer import WORDS
+
+def random_data(num_sents, method, seed=0):
+    # Rule predictions are the targets and sources: never truncated by the alignment
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(num_sents):
+        num_words = rng.integers(1, 10)
+        row = {'id': i, 'input': rng.choice(WORDS, num_words).tolist()}
+        row['output'] = rng.choice(WORDS, num_words).tolist()
+        row['rule_01'] = row['output'] if method != 'unlabeled' else [word[:1] for word in row['input']]
+        row['rule_02'] = list(row['input'])
+        rows.append(row)
+    data = pd.DataFrame(rows)
+    return data.drop(columns=['output']) if method == 'unlabeled' else data
+
+def unpad(batch, i, key):
+    values = batch[key][i]
+    return values[:batch['sent_len'][i] - (2 if key == 'align_index' else 0)]
+
+class TestAccentAugmenter(TestCase):
+    def setUp(self):
+        self.tokenizer = build_tokenizer()
+
+    def test_same_as_preprocessing_stripped_words(self):
+        for method in ['train', 'unlabeled']:
+            data = random_data(100, method)
+            batch = aligned_tokenize(data, self.tokenizer, method, 1, 0.0, False)
+            batch['augment'] = [i % 3 != 0 for i in range(len(data))]
+            augmenter = AccentAugmenter(self.tokenizer, 0.5, seed=0)
+            augmented = augmenter.augment_batch(batch, augmenter.stripper.rng(0))
+            self.assertNotEqual(augmented['input'], batch['input'])
+
+            data['input'] = augmented['input']
+            expected = aligned_tokenize(data, self.tokenizer, method, 1, 0.0, False)
+            self.assertEqual(augmented['sent_len'], expected['sent_len'])
+            for key in ['input_ids', 'output_ids', 'align_index', 'weak_labels']:
+                if key not in expected:
+                    continue
+                for i in range(len(data)):
+                    self.assertEqual(unpad(augmented, i, key), expected[key][i], (method, key, i))
+            # Sentences of different lengths are padded
+            self.assertEqual(len(set(len(ids) for ids in augmented['input_ids'])), 1)
+            self.assertEqual([sum(mask) for mask in augmented['attention_mask']], augmented['sent_len'])
+            # Unflagged sentences are untouched
+            self.assertEqual(augmented['input'][0], batch['input'][0])
+
+    def test_unflagged_token_budget_batch(self):
+        # Batches of gen_bucketIter(pad=False) are padded even when no sentence is augmented
+        batch = aligned_tokenize(random_data(20, 'train'), self.tokenizer, 'train', 1, 0.0, False)
+        batch['augment'] = [False] * len(batch['input'])
+        augmenter = AccentAugmenter(self.tokenizer, 0.5, seed=0)
+        padded = augmenter.augment_batch(batch, augmenter.stripper.rng(0))
+        self.assertEqual([sum(mask) for mask in padded['attention_mask']], batch['sent_len'])
+        for i in range(len(batch['input'])):
+            self.assertEqual(unpad(padded, i, 'input_ids'), batch['input_ids'][i])
+
+    def test_epochs(self):
+        data = random_data(50, 'train')
+        batch = aligned_tokenize(data, self.tokenizer, 'train', 1, 0.0, False)
+        batch['augment'] = [True] * len(data)
+        augmenter = AccentAugmenter(self.tokenizer, 0.5, seed=0)
+        first, = augmenter.augment_iter([batch])
+        second, = augmenter.augment_iter([batch])
+        self.assertNotEqual(first['input'], second['input'])
+        replay, = AccentAugmenter(self.tokenizer, 0.5, seed=0).augment_iter([batch])
+        self.assertEqual(replay, first)
+        self.assertGreater(len(augmenter.token_cache), 0)
+
+class TestOnlineAugmentation(TestCase):
+    def setUp(self):
+        self.datapath = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.datapath)
+        write_dataset(self.datapath, 'train')
+        self.tokenizer = build_tokenizer()
+        self.logger = logging.getLogger(__name__)
+
+    def test_training_data(self):
+        args = build_args(self.datapath, remove_accents=1, rm_accent_ratio=0.5)
+        dataset = WSDataset(args, 'train', self.tokenizer, self.logger)
+        self.assertTrue(dataset.online_augmentation)
+        self.assertEqual(dataset.no_accent_data, {})
+        train_data = sort_data(dataset, remove_accents=True)
+        self.assertEqual(len(train_data), 2 * len(dataset))
+        self.assertEqual(sum(train_data['augment']), len(dataset))
+        self.assertIs(dataset.accent_augmenter(), dataset.accent_augmenter())
+
+        stored = WSDataset(build_args(self.datapath, remove_accents=1, rm_accent_ratio=0.5, online_augmentation=0), 'train', self.tokenizer, self.logger)
+        self.assertFalse(stored.online_augmentation)
+        self.assertEqual(len(sort_data(stored, remove_accents=True)), 2 * len(dataset))
+
+if __name__ == '__main__':
+    unittest.main()
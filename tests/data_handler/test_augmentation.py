@@ -0,0 +1,82 @@
+import random
+import unicodedata
+import unittest
+from unittest import TestCase
+import numpy as np
+from visolex.utils import run_strip_accents
+from visolex.global_variables import RM_ACCENTS_DICT
+from visolex.framework_components.augmentation import AccentStripper
+
+def run_strip_accents_loop(txt, ratio):
+    # Reference implementation: former O(n^2) version
+    if not unicodedata.is_normalized("NFC", txt):
+        txt = unicodedata.normalize("NFC", txt)
+    num_character = len(txt)
+    num_remove = int(ratio*num_character)
+    random_indices = random.sample(np.arange(num_character).tolist(), num_remove)
+    new_txt = ""
+    for i in range(num_character):
+        c = txt[i]
+        if i in random_indices:
+            c = c.translate(RM_ACCENTS_DICT)
+        new_txt += c
+    return new_txt
+
+SENTS = [
+    ["Hôm", "nay", "trời", "đẹp", "quá", "điiii"],
+    ["ĐƯỢC", "không", "ạ", "😀😀"],
+    [],
+    ["người", "Việt", "Nam", "", "x"],
+]
+
+class TestAccentStripper(TestCase):
+    def test_run_strip_accents(self):
+        # Same results as the former version for the same random state
+        for ratio in [0.0, 0.3, 0.5, 1.0]:
+            for word in ["người", "ĐƯỢC", "nghiêng", "", "a"]:
+                random.seed(7)
+                expected = run_strip_accents_loop(word, ratio)
+                random.seed(7)
+                self.assertEqual(run_strip_accents(word, ratio), expected)
+
+    def test_ratio(self):
+        words = [word for sent in SENTS for word in sent]
+        self.assertEqual(AccentStripper(0.0, seed=0).strip_words(words), words)
+        self.assertEqual(AccentStripper(1.0, seed=0).strip_words(words), [word.translate(RM_ACCENTS_DICT) for word in words])
+        stripped = AccentStripper(0.5, seed=0).strip_words(words)
+        for word, new_word in zip(words, stripped):
+            self.assertEqual(len(new_word), len(word))
+            changed = [i for i, (a, b) in enumerate(zip(word, new_word)) if a != b]
+            self.assertLessEqual(len(changed), int(0.5 * len(word)))
+            for i in changed:
+                self.assertEqual(new_word[i], word[i].translate(RM_ACCENTS_DICT))
+        # Every character has an accent: exactly int(ratio*n) are stripped
+        self.assertEqual(
+            sum(a != b for a, b in zip("ờớởỡợ", AccentStripper(0.5, seed=1).strip_words(["ờớởỡợ"])[0])), 2
+        )
+
+    def test_nfd(self):
+        word = unicodedata.normalize("NFD", "người")
+        self.assertEqual(AccentStripper(1.0).strip_words([word]), ["nguoi"])
+        self.assertEqual(AccentStripper(0.0).strip_words([word, "a"]), ["người", "a"])
+
+    def test_seeded_epochs(self):
+        stripper = AccentStripper(0.5, seed=42)
+        sents = SENTS * 50
+        first = stripper.strip_sentences(sents, stripper.rng(epoch=0))
+        self.assertEqual([len(sent) for sent in first], [len(sent) for sent in sents])
+        self.assertEqual(first, AccentStripper(0.5, seed=42).strip_sentences(sents, stripper.rng(epoch=0)))
+        self.assertNotEqual(first, stripper.strip_sentences(sents, stripper.rng(epoch=1)))
+
+    def test_uniform(self):
+        # Every character is as likely to be stripped
+        stripper = AccentStripper(0.4, seed=3)
+        counts = np.zeros(5)
+        for epoch in range(2000):
+            word, = stripper.strip_words(["ạạạạạ"], stripper.rng(epoch))
+            counts += [c == 'a' for c in word]
+        self.assertEqual(counts.sum(), 2 * 2000)
+        self.assertTrue(np.all(np.abs(counts / 2000 - 0.4) < 0.05), counts)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import logging
+import unittest
+from unittest import TestCase
+import numpy as np
+from attridict import AttriDict
+from visolex.framework_components.columnar import RaggedArray, ColumnStore, BatchView
+from visolex.framework_components.data_handler import PseudoDataset
+from visolex.utils import arrow_dataset
+
+SENTS = [[1, 2, 3], [], [4], [5, 6], [7, 8, 9, 10]]
+
+def keep_loop(data, keep_indices):
+    # Reference: PseudoDataset.keep before the columnar store
+    new_dict = {}
+    for key, values in data.items():
+        keep_sents = []
+        for i, indices in enumerate(keep_indices):
+            if len(indices) == 0:
+                continue
+            if key in ['id', 'align_index']:
+                keep_sent = [values[i][idx] for idx in indices]
+            else:
+                keep_sent = values[i][np.array(indices)]
+            keep_sents.append(keep_sent)
+        new_dict[key] = keep_sents
+    return new_dict
+
+def build_store():
+    return ColumnStore.from_dict({
+        'id': list(range(len(SENTS))),
+        'input': [['w{}'.format(token) for token in sent] for sent in SENTS],
+        'input_ids': SENTS,
+        'align_index': [list(range(len(sent))) for sent in SENTS],
+        'weak_labels': [[[token, -token] for token in sent] for sent in SENTS],
+        'sent_len': [len(sent) for sent in SENTS],
+    })
+
+class TestRaggedArray(TestCase):
+    def test_rows(self):
+        array = RaggedArray.from_lists(SENTS)
+        self.assertEqual(array.values.dtype, np.int32)
+        self.assertEqual(len(array), len(SENTS))
+        self.assertEqual(array[3], [5, 6])
+        self.assertEqual(array[-1], SENTS[-1])
+        self.assertEqual(array.tolist(), SENTS)
+        self.assertEqual(array.lengths().tolist(), [len(sent) for sent in SENTS])
+        with self.assertRaises(IndexError):
+            array[len(SENTS)]
+
+    def test_views(self):
+        array = RaggedArray.from_lists(SENTS)
+        for indices in [slice(1, 4), slice(None, None, -2), [4, 0, 0, 2], np.array([3, -1])]:
+            expected = SENTS[indices] if isinstance(indices, slice) else [SENTS[i] for i in indices]
+            view = array[indices]
+            self.assertIs(view.values, array.values)
+            self.assertEqual(view.tolist(), expected)
+            self.assertEqual(view[1:].tolist(), expected[1:])
+            self.assertEqual(view[[0]].tolist(), expected[:1])
+        self.assertTrue(np.shares_memory(array[1:4].compact()[0], array.values))
+
+    def test_concatenate(self):
+        array = RaggedArray.from_lists(SENTS)
+        self.assertEqual(RaggedArray.concatenate([array[[4, 1]], array[2:]]).tolist(), [SENTS[4], SENTS[1]] + SENTS[2:])
+
+    def test_to_arrow(self):
+        words = [['a', 'b'], ['c']]
+        self.assertEqual(RaggedArray.from_lists(words, dtype=object).to_arrow().to_pylist(), words)
+        labels = [[[1, 2], [3, 4]], [[5, 6]]]
+        self.assertEqual(RaggedArray.from_lists(labels)[::-1].to_arrow().to_pylist(), labels[::-1])
+
+class TestColumnStore(TestCase):
+    def test_take(self):
+        store = build_store()
+        self.assertEqual(store.num_rows, len(SENTS))
+        view = store.take([4, 2])
+        self.assertEqual(view['input'][0], ['w7', 'w8', 'w9', 'w10'])
+        self.assertEqual(view['weak_labels'][1], [[4, -4]])
+        self.assertEqual(view['id'].tolist(), [4, 2])
+        self.assertIs(view['input_ids'].values, store['input_ids'].values)
+        self.assertEqual(store.take(slice(1, 3)), store.take([1, 2]))
+
+    def test_arrow_dataset(self):
+        store = build_store()
+        expected = {key: values.tolist() for key, values in store.take([3, 0]).items()}
+        self.assertEqual(arrow_dataset(store.take([3, 0])).to_dict(), expected)
+        self.assertEqual(ColumnStore.concatenate([store, store]).num_rows, 2 * len(SENTS))
+
+class TestPseudoDataset(TestCase):
+    def setUp(self):
+        wsdataset = AttriDict({
+            'method': 'unlabeled', 'num_labels': 11, 'data': build_store(), 'no_accent_data': {}, 'online_augmentation': False
+        })
+        self.dataset = PseudoDataset(AttriDict({'seed': 42}), wsdataset, logging.getLogger(__name__))
+
+    def test_downsample(self):
+        self.dataset.inference_downsample(1, 3)
+        self.assertEqual([self.dataset[i]['input_ids'] for i in range(len(self.dataset))], SENTS[1:3])
+        np.random.seed(0)
+        self.dataset.downsample(3)
+        self.assertEqual(len(self.dataset), 3)
+        self.assertIs(self.dataset.data['input_ids'].values, self.dataset.original_data['input_ids'].values)
+        sample = self.dataset[0]
+        self.assertEqual(sample['input_ids'], SENTS[sample['id']])
+
+    def test_keep_and_drop(self):
+        rng = np.random.default_rng(0)
+        batches = {
+            'id': [[0, 1, 2], [3, 4], [5, 6]],
+            'align_index': [[[0], [0], [1]], [[0], [1]], [[1], [0]]],
+            'labels': [rng.integers(-1, 3, size=(3, 4)), rng.integers(-1, 3, size=(2, 5)), rng.integers(0, 3, size=(2, 3))],
+        }
+        batches['labels'][0][1] = -1
+        keep_indices = [[2, 0], [], [1]]
+        self.dataset.teacher_data = dict(batches)
+        self.dataset.keep(keep_indices)
+        expected = keep_loop(batches, keep_indices)
+        for key, values in expected.items():
+            self.assertEqual(len(self.dataset.teacher_data[key]), len(values))
+            for batch, expected_batch in zip(self.dataset.teacher_data[key], values):
+                np.testing.assert_array_equal(batch, expected_batch)
+
+        self.dataset.teacher_data = dict(batches)
+        self.dataset.drop(col='labels')
+        kept = [np.flatnonzero(~np.all(array == -1, axis=1)).tolist() for array in batches['labels']]
+        self.assertIsInstance(self.dataset.teacher_data['labels'], BatchView)
+        self.assertEqual(list(self.dataset.teacher_data['id']), keep_loop(batches, kept)['id'])
+        # Views of views
+        self.dataset.keep([[0]] * len(self.dataset.teacher_data['id']))
+        self.assertEqual(list(self.dataset.teacher_data['id']), [[ids[0]] for ids in keep_loop(batches, kept)['id']])
+
+if __name__ == '__main__':
+    unittest.main()
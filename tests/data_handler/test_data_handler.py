@@ -0,0 +1,96 @@
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest import TestCase, mock
+import numpy as np
+from datasets import Dataset
+from visolex.framework_components import data_handler
+from visolex.framework_components.data_handler import DataHandler, WSDataset, PseudoDataset
+from visolex.utils import sort_data
+from tests.data_handler.test_preprocessing_cache import build_tokenizer, build_args, write_dataset
+
+METHODS = ('train', 'dev', 'unlabeled')
+
+class TestParallelPreprocessing(TestCase):
+    def setUp(self):
+        self.datapath = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.datapath)
+        self.tokenizer = build_tokenizer()
+        self.logger = logging.getLogger(__name__)
+        for method in METHODS:
+            write_dataset(self.datapath, method, num_repeats=7)
+
+    def load(self, workers):
+        args = build_args(
+            self.datapath, preprocess_cache=0, preprocess_workers=workers, remove_accents=1, rm_accent_ratio=0.5,
+            online_augmentation=0
+        )
+        return DataHandler(args, self.tokenizer, self.logger).load_datasets(METHODS)
+
+    @mock.patch.object(data_handler, 'PREPROCESS_SHARD_SIZE', 4)
+    def test_deterministic(self):
+        serial = self.load(workers=1)
+        parallel = self.load(workers=2)
+        for method, serial_dataset, parallel_dataset in zip(METHODS, serial, parallel):
+            self.assertEqual(parallel_dataset.method, method)
+            self.assertEqual(parallel_dataset.data, serial_dataset.data)
+            self.assertEqual(parallel_dataset.no_accent_data, serial_dataset.no_accent_data)
+        self.assertEqual(serial[1].no_accent_data, self.load(workers=1)[1].no_accent_data)
+        # Accents were stripped
+        self.assertNotEqual(serial[0].no_accent_data['input'][:len(serial[0])], serial[0].data['input'])
+
+    def test_shards_merged_in_order(self):
+        expected = DataHandler(build_args(self.datapath, preprocess_cache=0), self.tokenizer, self.logger).load_dataset('train')
+        with mock.patch.object(data_handler, 'PREPROCESS_SHARD_SIZE', 3):
+            dataset = DataHandler(
+                build_args(self.datapath, preprocess_cache=0, preprocess_workers=2), self.tokenizer, self.logger
+            ).load_dataset('train')
+        self.assertEqual(dataset.data, expected.data)
+        self.assertEqual(dataset.data['id'].tolist(), list(range(len(dataset))))
+
+def sort_lists(data):
+    # Reference: sort_data before the cached Arrow datasets
+    return Dataset.from_dict({key: values.tolist() for key, values in data.items()}).sort('sent_len').to_dict()
+
+class TestSortedViews(TestCase):
+    def setUp(self):
+        self.datapath = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.datapath)
+        self.tokenizer = build_tokenizer()
+        self.logger = logging.getLogger(__name__)
+        write_dataset(self.datapath, 'train', num_repeats=5)
+
+    def dataset(self, **kw):
+        args = build_args(self.datapath, preprocess_cache=0, remove_accents=1, rm_accent_ratio=0.5, **kw)
+        return WSDataset(args, 'train', self.tokenizer, self.logger)
+
+    def test_same_as_sorting(self):
+        dataset = self.dataset(online_augmentation=0)
+        self.assertEqual(sort_data(dataset).to_dict(), sort_lists(dataset.data))
+        self.assertEqual(sort_data(dataset, remove_accents=True).to_dict(), sort_lists(dataset.no_accent_data))
+        # Built once
+        self.assertIs(sort_data(dataset), sort_data(dataset))
+
+    def test_pseudodataset_views(self):
+        dataset = self.dataset()
+        pseudodataset = PseudoDataset(dataset.args, dataset, self.logger)
+        np.random.seed(0)
+        for _ in range(2):
+            pseudodataset.downsample(7)
+            view = sort_data(pseudodataset)
+            self.assertEqual(view.to_dict(), sort_lists(pseudodataset.data))
+        pseudodataset.inference_downsample(2, 6)
+        self.assertEqual(sort_data(pseudodataset).to_dict(), sort_lists(pseudodataset.data))
+        # Samples are views of the Arrow dataset of the source WSDataset
+        self.assertEqual(list(dataset.arrow_datasets), ['data'])
+
+        # Online augmentation: both copies of the sampled sentences
+        augmented = sort_data(pseudodataset, remove_accents=True)
+        self.assertEqual(len(augmented), 8)
+        self.assertEqual(sum(augmented['augment']), 4)
+        self.assertEqual(sorted(augmented['id']), sorted(2 * pseudodataset.data['id'].tolist()))
+        self.assertIs(pseudodataset.accent_augmenter(), dataset.accent_augmenter())
+
+if __name__ == '__main__':
+    unittest.main()
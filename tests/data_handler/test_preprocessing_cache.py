@@ -0,0 +1,101 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest import TestCase, mock
+import attridict
+import pandas as pd
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+from visolex.global_variables import NULL_STR
+from visolex.framework_components.data_handler import WSDataset
+from visolex.framework_components.preprocessing_cache import PreprocessingCache
+
+CHARS = list("abcdefghijklmnopqrstuvwxyzđàáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵ.,!?")
+PIECES = ['kh', 'ng', 'nh', 'th', 'ch', 'tr', 'ông', 'không', 'được', 'biết', 'ko']
+
+def build_tokenizer():
+    # Small WordPiece fast tokenizer (the pretrained ones need the hub)
+    specials = ['<s>', '<pad>', '</s>', '<unk>', '<mask>']
+    tokens = specials + PIECES + CHARS + ['##' + token for token in CHARS + PIECES]
+    model = models.WordPiece({token: i for i, token in enumerate(tokens)}, unk_token='<unk>')
+    backend = Tokenizer(model)
+    backend.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend, name_or_path='test-wordpiece', bos_token='<s>', eos_token='</s>',
+        unk_token='<unk>', pad_token='<pad>', mask_token='<mask>'
+    )
+    tokenizer.add_tokens([NULL_STR])
+    return tokenizer
+
+SENTENCES = [
+    (["ko", "biết", "nha"], ["không", "biết", "nhé"]),
+    (["Thank", "you", "ạ"], ["cảm ơn", "bạn", "ạ"]),
+    (["đc", "k", "?"], ["được", "không", "?"]),
+    (["hôm", "nay", "trời", "đẹp"], ["hôm", "nay", "trời", "đẹp"]),
+    (["x😀", "ngonnn"], ["x😀", "ngon"]),
+]
+
+def write_dataset(datapath, method, num_repeats=1):
+    rows = []
+    for i, (source, target) in enumerate(SENTENCES * num_repeats):
+        rule_01 = [word.lower() for word in target]
+        rule_02 = source
+        if method == 'unlabeled':
+            rows.append([i, ' '.join(source), source, rule_01, rule_02])
+        else:
+            rows.append([i, ' '.join(source), ' '.join(target), source, target, rule_01, rule_02])
+    columns = ['id', 'original', 'input', 'regrex_rule', 'dict_rule']
+    if method != 'unlabeled':
+        columns = ['id', 'original', 'normalized', 'input', 'output', 'regrex_rule', 'dict_rule']
+    pd.DataFrame(rows, columns=columns).to_csv(os.path.join(datapath, '{}.csv'.format(method)), index=False)
+
+def build_args(datapath, **kwargs):
+    return attridict({
+        'seed': 42, 'lower_case': 1, 'datapath': datapath,
+        'remove_accents': 0, 'rm_accent_ratio': 0.0, **kwargs
+    })
+
+class TestPreprocessingCache(TestCase):
+    def setUp(self):
+        self.datapath = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.datapath)
+        self.tokenizer = build_tokenizer()
+        self.logger = logging.getLogger(__name__)
+        for method in ['train', 'unlabeled']:
+            write_dataset(self.datapath, method)
+
+    def test_cached_dataset(self):
+        for method in ['train', 'unlabeled']:
+            expected = WSDataset(build_args(self.datapath, preprocess_cache=0), method, self.tokenizer, self.logger).data
+            self.assertEqual(WSDataset(build_args(self.datapath), method, self.tokenizer, self.logger).data, expected)
+            # Second run: nothing is read from the CSV
+            with mock.patch.object(WSDataset, 'read_csv', side_effect=AssertionError):
+                dataset = WSDataset(build_args(self.datapath), method, self.tokenizer, self.logger)
+            self.assertEqual(dataset.data, expected)
+            self.assertEqual('output_ids' in dataset.data, method != 'unlabeled')
+        self.assertEqual(len(os.listdir(os.path.join(self.datapath, 'cache'))), 2)
+
+    def test_memory_mapped_shards(self):
+        dataset = WSDataset(build_args(self.datapath), 'train', self.tokenizer, self.logger)
+        cache = PreprocessingCache(os.path.join(self.datapath, 'cache'))
+        key, = os.listdir(cache.cache_dir)
+        values, offsets = cache.load_arrays(key, 'weak_labels')
+        self.assertEqual(values.shape, (offsets[-1], 2))
+        self.assertEqual(values[offsets[1]:offsets[2]].tolist(), dataset.data['weak_labels'][1])
+
+    def test_invalidation(self):
+        WSDataset(build_args(self.datapath), 'train', self.tokenizer, self.logger)
+        # Other configuration
+        dataset = WSDataset(build_args(self.datapath, lower_case=0), 'train', self.tokenizer, self.logger)
+        self.assertEqual(len(os.listdir(os.path.join(self.datapath, 'cache'))), 2)
+        self.assertNotEqual(dataset.data['input_ids'][1], WSDataset(build_args(self.datapath), 'train', self.tokenizer, self.logger).data['input_ids'][1])
+        # Other content
+        write_dataset(self.datapath, 'train', num_repeats=2)
+        dataset = WSDataset(build_args(self.datapath), 'train', self.tokenizer, self.logger)
+        self.assertEqual(len(dataset), 2 * len(SENTENCES))
+        self.assertEqual(len(os.listdir(os.path.join(self.datapath, 'cache'))), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+from visolex.dictionary import Dictionary
+from visolex.dictionary.fuzzy import FuzzyIndex, fold, edit_distance
+from visolex.dictionary.index import render_entry
+
+KEYS = ["ko", "hok", "khong", "kbiet", "thoai", "biet", "biết", "ngừi", "đc"]
+
+class TestFuzzyIndex(TestCase):
+    def setUp(self):
+        self.index = FuzzyIndex(KEYS)
+
+    def test_fold(self):
+        self.assertEqual(fold("Khônggg"), "khong")
+        self.assertEqual(fold("ĐC"), "dc")
+        self.assertEqual(fold("thoaiiii"), "thoai")
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance("biet", "biet", 2), 0)
+        self.assertEqual(edit_distance("bjet", "biet", 2), 1)
+        self.assertEqual(edit_distance("beit", "biet", 2), 1)
+        self.assertEqual(edit_distance("kbiet", "biet", 2), 1)
+        self.assertEqual(edit_distance("abcdef", "biet", 2), 3)
+
+    def test_folded_lookup(self):
+        self.assertEqual(self.index.closest("khongg"), "khong")
+        self.assertEqual(self.index.closest("KHÔNG"), "khong")
+        self.assertEqual(self.index.closest("hokkk"), "hok")
+        self.assertEqual(self.index.closest("đcc"), "đc")
+        self.assertEqual(self.index.lookup("biêt"), [("biet", 0), ("biết", 0)])
+
+    def test_edit_lookup(self):
+        self.assertEqual(self.index.lookup("bjett"), [("biet", 1), ("biết", 1)])
+        self.assertEqual(self.index.closest("kbiett"), "kbiet")
+        self.assertEqual(self.index.closest("thoaj"), "thoai")
+        # Short words only match through folding
+        self.assertIsNone(self.index.closest("kp"))
+        self.assertIsNone(self.index.closest("hol"))
+        self.assertEqual(self.index.closest("hol", max_distance=1), "hok")
+        self.assertIsNone(self.index.closest("xyzxyz"))
+
+    def test_add(self):
+        self.assertIsNone(self.index.closest("csvc"))
+        self.index.add("csvc")
+        self.assertEqual(self.index.closest("csvcc"), "csvc")
+
+class TestFuzzySearch(TestCase):
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        json_path = os.path.join(tmpdir, 'dictionary.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({"bánh": {"response": "<p>bánh</p>"}}, f, ensure_ascii=False)
+        # Dictionary is a singleton, build an independent instance on the temporary file
+        self.dictionary = Dictionary._decorated(filepath=json_path)
+        self.dictionary.search_chatgpt = lambda nsw, *args: "GPT-4: " + nsw
+
+    def test_accent_neighbour(self):
+        # "bành" is a different word, only used in place of "bánh" when asked for
+        self.assertEqual(self.dictionary.search("bành"), "GPT-4: bành")
+        self.assertEqual(self.dictionary.search("bành", fuzzy=True), render_entry({"response": "<p>bánh</p>"}))
+        self.assertEqual(self.dictionary.search("bành", fuzzy=True, add_to_dict=True), "GPT-4: bành")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+from visolex.global_variables import DICT_PATH
+from visolex.dictionary.index import DictionaryIndex, DictionaryStore, build_index, render_entry
+
+ENTRIES = {
+    "ko": {"normalized": ["không"], "response": {"nsw": "ko", "normalized": [
+        {"word": "không", "definition": "phủ định", "abbreviations": "k", "example": "Tôi ko biết."}
+    ]}},
+    "đc": {"normalized": ["được"], "response": "<p>được</p>"},
+    "a": {"normalized": ["anh"], "response": {}},
+    "zz": {"normalized": []},
+}
+
+class TestDictionaryIndex(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.json_path = os.path.join(self.tmpdir, 'dictionary.json')
+        self.index_path = os.path.join(self.tmpdir, 'dictionary.idx')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(ENTRIES, f, ensure_ascii=False)
+
+    def test_lookup(self):
+        index = DictionaryIndex.open(self.json_path, self.index_path)
+        self.assertEqual(len(index), len(ENTRIES))
+        self.assertEqual(sorted(index), sorted(ENTRIES))
+        for key, entry in ENTRIES.items():
+            self.assertIn(key, index)
+            self.assertEqual(index[key], entry)
+            self.assertEqual(index.get_text(key), render_entry(entry))
+        for key in ["k", "đ", "zzz", "", 1]:
+            self.assertNotIn(key, index)
+        with self.assertRaises(KeyError):
+            index["khong"]
+        index.close()
+
+    def test_rebuild_when_outdated(self):
+        DictionaryIndex.open(self.json_path, self.index_path).close()
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({"hok": {"normalized": ["không"]}}, f)
+        os.utime(self.json_path, ns=(0, 0))
+        index = DictionaryIndex.open(self.json_path, self.index_path)
+        self.assertEqual(list(index), ["hok"])
+        index.close()
+
+    def test_store_overlay(self):
+        store = DictionaryStore(DictionaryIndex.open(self.json_path, self.index_path))
+        store["hok"] = {"response": "không"}
+        store["ko"] = {"response": "không"}
+        del store["a"]
+        self.assertEqual(len(store), len(ENTRIES))
+        self.assertEqual(store.to_dict(), {**{k: v for k, v in ENTRIES.items() if k != "a"}, "hok": {"response": "không"}, "ko": {"response": "không"}})
+        self.assertEqual(store.get_text("ko"), render_entry({"response": "không"}))
+        self.assertNotIn("a", store)
+
+    def test_packaged_dictionary(self):
+        # Same entries as json.load on the shipped dictionary
+        build_index(DICT_PATH, self.index_path)
+        index = DictionaryIndex(self.index_path)
+        with open(DICT_PATH, 'r', encoding='utf-8') as f:
+            nsw_dict = json.load(f)
+        self.assertEqual(len(index), len(nsw_dict))
+        for key in list(nsw_dict)[::97]:
+            self.assertEqual(index[key], nsw_dict[key])
+            self.assertEqual(index.get_text(key), render_entry(nsw_dict[key]))
+        index.close()
+
+if __name__ == '__main__':
+    unittest.main()
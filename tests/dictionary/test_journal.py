@@ -0,0 +1,108 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from unittest import TestCase
+from visolex.dictionary import Dictionary
+from visolex.dictionary.journal import DictionaryJournal
+
+ENTRIES = {
+    "ko": {"normalized": ["không"], "response": "<p>không</p>"},
+    "đc": {"normalized": ["được"], "response": "<p>được</p>"},
+}
+
+def append_entries(journal_path, worker, num_entries):
+    journal = DictionaryJournal(journal_path, fsync=False)
+    for i in range(num_entries):
+        journal.append("w{}_{}".format(worker, i), {"response": "x" * 1000})
+
+class TestDictionaryJournal(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.json_path = os.path.join(self.tmpdir, 'dictionary.json')
+        self.journal_path = os.path.join(self.tmpdir, 'dictionary.journal.jsonl')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(ENTRIES, f, ensure_ascii=False, indent=4)
+
+    def new_dictionary(self, compact_every=1000):
+        # Dictionary is a singleton, build independent instances on the temporary files
+        return Dictionary._decorated(filepath=self.json_path, compact_every=compact_every)
+
+    def test_replay(self):
+        journal = DictionaryJournal(self.journal_path)
+        journal.append("hok", {"response": "không"})
+        with open(self.journal_path, 'ab') as f:
+            f.write(b'{"nsw": "cut sh')  # crashed writer
+        self.assertEqual(journal.read_new(), ([("hok", {"response": "không"})], False))
+        journal.append("dc", {"response": "được"})
+        self.assertEqual(journal.read_new(), ([("dc", {"response": "được"})], False))
+
+    def test_concurrent_appends(self):
+        processes = [
+            multiprocessing.Process(target=append_entries, args=(self.journal_path, worker, 50))
+            for worker in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        entries, _ = DictionaryJournal(self.journal_path).read_new()
+        self.assertEqual(len(entries), 200)
+        self.assertEqual(len(set(nsw for nsw, _ in entries)), 200)
+
+    def test_durable_vocab(self):
+        dictionary = self.new_dictionary()
+        dictionary.add_vocab("csvc", "cơ sở vật chất")
+        self.assertIn("csvc", dictionary.nsw_dict)
+        # Another process (or a restart) sees the new word
+        other = self.new_dictionary()
+        self.assertIn("csvc", other.nsw_dict)
+        self.assertEqual(other.nsw_dict["csvc"], {"response": "cơ sở vật chất"})
+        self.assertEqual(other.size(), 3)
+        # ... and words added afterwards, lazily
+        dictionary.add_vocab("đcs", "đảng cộng sản")
+        self.assertIn("đcs", other.nsw_dict)
+
+    def test_throttled_sync(self):
+        dictionary = self.new_dictionary()
+        other = self.new_dictionary()
+        self.assertIn("ko", other.nsw_dict)
+        calls = []
+        read_new = other.journal.read_new
+        other.journal.read_new = lambda: calls.append(1) or read_new()
+        # Misses do not re-read an unchanged journal
+        for i in range(100):
+            self.assertNotIn("miss{}".format(i), other.nsw_dict)
+        self.assertEqual(len(calls), 0)
+        # ... but one that changed
+        dictionary.add_vocab("csvc", "cơ sở vật chất")
+        self.assertIn("csvc", other.nsw_dict)
+        self.assertNotIn("miss", other.nsw_dict)
+        self.assertEqual(len(calls), 1)
+
+    def test_compaction(self):
+        dictionary = self.new_dictionary(compact_every=3)
+        other = self.new_dictionary()
+        for i in range(3):
+            dictionary.add_vocab("nsw{}".format(i), "response {}".format(i))
+        self.assertEqual(os.path.getsize(self.journal_path), 0)
+        with open(self.json_path, encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), 5)
+        self.assertEqual(dictionary.size(), 5)
+        self.assertEqual(other.size(), 5)
+        self.assertEqual(other.nsw_dict["nsw2"], {"response": "response 2"})
+        self.assertEqual(self.new_dictionary().size(), 5)
+
+    def test_save_dict(self):
+        dictionary = self.new_dictionary()
+        dictionary.add_vocab("csvc", "cơ sở vật chất")
+        filepath = os.path.join(self.tmpdir, 'new_dictionary.json')
+        dictionary.save_dict(filepath=filepath)
+        with open(filepath, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {**ENTRIES, "csvc": {"response": "cơ sở vật chất"}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import logging
+import unittest
+from unittest import TestCase
+from statistics import mean
+import attridict
+import numpy as np
+import torch
+from visolex.framework_components.evaluator import Evaluator, MetricAccumulator, flatten_segments
+from visolex.framework_components.normalizer.trainer_methods import predict
+
+def evaluate_loop(preds, targets, sources):
+    # Reference implementation: per-element Python loop
+    metrics = {'precision': [], 'recall': [], 'normed_recall': [], 'f1_score': [], 'accuracy': []}
+    for pred, target, source in zip(preds, targets, sources):
+        pred, target, source = np.array(pred), np.array(target), np.array(source)
+        normed = source == target
+        need_norm = source != target
+        pred_need_norm = np.sum(source != pred).item()
+        tp = np.sum(target[need_norm] == pred[need_norm]).item()
+        fp = np.sum(target[need_norm] != pred[need_norm]).item()
+        tn = np.sum(target[normed] == pred[normed]).item()
+        fn = np.sum(target[normed] != pred[normed]).item()
+        r = tp/(tp+fp) if (tp+fp) > 0 else 0
+        p = tp/pred_need_norm if pred_need_norm > 0 else 0
+        norm_r = tn/(tn+fn) if (tn+fn) > 0 else 0
+        f1 = (2*p*r)/(p+r) if (p+r) > 0 else 0
+        metrics['precision'].append(p)
+        metrics['recall'].append(r)
+        metrics['normed_recall'].append(norm_r)
+        metrics['f1_score'].append(f1)
+        metrics['accuracy'].append(np.sum(pred == target).item()/pred.size)
+    return {name: 100 * mean(values) for name, values in metrics.items()}
+
+def random_batches(num_batches, seed=0, vocab_size=6):
+    # [batch_size, sent_len] batches as returned by predict
+    rng = np.random.default_rng(seed)
+    preds, targets, sources = [], [], []
+    for _ in range(num_batches):
+        shape = (rng.integers(1, 5), rng.integers(1, 12))
+        sources.append(rng.integers(0, vocab_size, size=shape))
+        targets.append(np.where(rng.random(shape) < 0.7, sources[-1], rng.integers(0, vocab_size, size=shape)))
+        preds.append(np.where(rng.random(shape) < 0.6, targets[-1], rng.integers(0, vocab_size, size=shape)))
+    return preds, targets, sources
+
+class TestEvaluator(TestCase):
+    def setUp(self):
+        self.evaluator = Evaluator(attridict({'metric': 'f1_score'}), logging.getLogger(__name__))
+
+    def test_equivalence(self):
+        for seed in range(5):
+            preds, targets, sources = random_batches(50, seed=seed)
+            expected = evaluate_loop(preds, targets, sources)
+            res = self.evaluator.evaluate(preds, targets, sources)
+            for name, value in expected.items():
+                self.assertEqual(res[name], value, name)
+            self.assertEqual(res['perf'], expected['f1_score'])
+
+    def test_sentences(self):
+        sources = [[1, 2, 3], [4, 5], [6]]
+        targets = [[1, 7, 3], [4, 5], [8]]
+        preds = [[1, 7, 9], [4, 4], [6]]
+        res = self.evaluator.evaluate(preds, targets, sources)
+        self.assertEqual(res, {**evaluate_loop(preds, targets, sources), 'perf': res['f1_score']})
+        self.assertAlmostEqual(res['precision'], 100 * (1/2) / 3)
+        self.assertAlmostEqual(res['accuracy'], 100 * (2/3 + 1/2 + 0) / 3)
+
+    def test_flat_arrays(self):
+        preds, targets, sources = random_batches(20, seed=7)
+        expected = self.evaluator.evaluate(preds, targets, sources)
+        flat_preds, lengths = flatten_segments(preds)
+        res = self.evaluator.evaluate(
+            flat_preds, flatten_segments(targets)[0], flatten_segments(sources)[0], lengths=lengths
+        )
+        self.assertEqual(res, expected)
+
+class CopyModel(torch.nn.Module):
+    # Predicts the input token, except for token 1 which is normalized to 2
+    def __init__(self, vocab_size=6):
+        super().__init__()
+        self.vocab_size = vocab_size
+
+    def forward(self, input_ids, input_mask):
+        pred = torch.where(input_ids == 1, torch.full_like(input_ids, 2), input_ids)
+        logits = torch.nn.functional.one_hot(pred, self.vocab_size).float()
+        return None, {"logits_norm": logits, "logits_nsw_detection": logits[..., :2]}, logits
+
+class TestMetricAccumulator(TestCase):
+    def setUp(self):
+        self.evaluator = Evaluator(attridict({'metric': 'f1_score'}), logging.getLogger(__name__))
+
+    def test_streaming(self):
+        preds, targets, sources = random_batches(30, seed=3)
+        accumulator = MetricAccumulator()
+        for pred, target, source in zip(preds, targets, sources):
+            accumulator.update([pred], [target], [source])
+        self.assertEqual(self.evaluator.report(accumulator), self.evaluator.evaluate(preds, targets, sources))
+        with self.assertRaises(ValueError):
+            MetricAccumulator().result()
+
+    def test_predict(self):
+        _, targets, sources = random_batches(10, seed=5)
+        batches = [
+            {'id': list(range(len(source))), 'input_ids': source.tolist(), 'output_ids': target.tolist(),
+             'align_index': source.tolist(), 'weak_labels': np.stack([source, source], -1).tolist()}
+            for source, target in zip(sources, targets)
+        ]
+        accumulator = MetricAccumulator()
+        pred_dict = predict(
+            CopyModel(), batch_size=None, use_gpu=False, nsw_detect=True, data=None,
+            inference_mode=False, dataIter=iter(batches), accumulator=accumulator
+        )
+        self.assertEqual(
+            self.evaluator.report(accumulator),
+            self.evaluator.evaluate(pred_dict['preds'], pred_dict['output_ids'], pred_dict['input_ids'])
+        )
+        streamed = MetricAccumulator()
+        self.assertIsNone(predict(
+            CopyModel(), batch_size=None, use_gpu=False, nsw_detect=True, data=None,
+            inference_mode=False, dataIter=iter(batches), accumulator=streamed, return_outputs=False
+        ))
+        self.assertEqual(streamed.result(), accumulator.result())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,32 @@
+import random
 import unittest
 from visolex.lexnorm.basic_normalizer import BasicNormalizer
+from visolex.framework_components.regex_expression import Protected, emoji_pattern, emoji_list, tone_dict_map
+from visolex.framework_components.preprocessing import tone_normalization, split_emoji_text, split_emoji_emoji, simple_tokenize
+
+def basic_normalizer_reference(input_str, lowercase=False):
+    # Pipeline of the individual preprocessing functions
+    text = input_str.lower() if lowercase else input_str
+    text = tone_normalization(text, tone_dict_map)
+    text = split_emoji_text(text, emoji_list)
+    tokens = simple_tokenize(text, [Protected], emoji_pattern)
+    tokens = split_emoji_emoji(tokens, emoji_list)
+    return ' '.join(filter(str.strip, tokens))
+
+def random_corpus(num_sents, seed=0):
+    rng = random.Random(seed)
+    pieces = [
+        "hoà", "Hoà", "HOÀ", "khoẻ", "thuỷ", "Thuý", "quỵ", "oà", "uỳa", "tiếng", "Việt", "caí",
+        "😊", "🌟", "😊🌟", "ab😊cd", "🇻🇳", "❤️", "👍🏻", "...", "!", "?!", ",", "(", ")", "\"\"",
+        "http://vnexpress.net/abc", "www.google.com", "a@b.vn", "12:30", "1.000.000", "3.5",
+        "10/12/2023", ":)", ":-(", "<3", "^_^", "file.pdf", "\t", "  ", "\n",
+    ]
+    sents = []
+    for _ in range(num_sents):
+        words = rng.choices(pieces, k=rng.randint(0, 12))
+        seps = rng.choices(["", " ", "  "], weights=[1, 6, 1], k=len(words))
+        sents.append(''.join(sep + word for sep, word in zip(seps, words)))
+    return sents
 
 class TestBasicNormalizer(unittest.TestCase):
     def setUp(self):
@@ -55,5 +82,23 @@ class TestBasicNormalizer(unittest.TestCase):
         result = self.normalizer.basic_normalizer(input_str, lowercase=False)
         self.assertEqual(result, expected_output)
 
+    def test_same_as_preprocessing_functions(self):
+        """Test that the compiled pipeline matches the individual preprocessing functions."""
+        for input_str in random_corpus(500):
+            for lowercase in [False, True]:
+                self.assertEqual(
+                    self.normalizer.basic_normalizer(input_str, lowercase=lowercase),
+                    basic_normalizer_reference(input_str, lowercase=lowercase)
+                )
+
+    def test_normalize_many(self):
+        """Test that normalize_many keeps the input order, in-process and with workers."""
+        corpus = random_corpus(300, seed=1)
+        expected = [self.normalizer.basic_normalizer(input_str, lowercase=True) for input_str in corpus]
+        for workers, chunksize in [(1, 16), (2, 16), (2, 1000)]:
+            results = self.normalizer.normalize_many(iter(corpus), workers=workers, chunksize=chunksize, lowercase=True)
+            self.assertEqual(list(results), expected)
+        self.assertEqual(list(self.normalizer.normalize_many([], workers=2)), [])
+
 if __name__ == "__main__":
     unittest.main()
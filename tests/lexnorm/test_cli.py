@@ -0,0 +1,82 @@
+import io
+import json
+import unittest
+from unittest import TestCase
+from visolex.cli import read_records, normalize_stream
+
+class FakeTokenizer:
+    # Splits words into 2-character pieces, ids are assigned on first use
+    def __init__(self):
+        self.vocab = {'<s>': 0, '</s>': 1}
+
+    def tokenize(self, word):
+        return [word[i:i+2] for i in range(0, len(word), 2)]
+
+    def convert_tokens_to_ids(self, tokens):
+        return [self.vocab.setdefault(token, len(self.vocab)) for token in tokens]
+
+    def convert_ids_to_tokens(self, ids):
+        id_to_token = {id: token for token, id in self.vocab.items()}
+        return [id_to_token[id] for id in ids]
+
+    def convert_tokens_to_string(self, tokens):
+        return ' '.join(tokens)
+
+class UpperNormalizer:
+    # Predicts the upper-cased version of every token
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.batch_sizes = []
+        self.input_lengths = []
+
+    def batch_inference(self, user_inputs, batch_size=None):
+        self.batch_sizes.append(len(user_inputs))
+        self.input_lengths.extend(len(tokens) for tokens in user_inputs)
+        outputs = []
+        for tokens in user_inputs:
+            pred = [token if token in ['<s>', '</s>'] else token.upper() for token in tokens]
+            outputs.append({'source_tokens': tokens, 'pred': self.tokenizer.convert_tokens_to_ids(pred),
+                            'proba': [1.0]*len(tokens), 'is_nsw': [0]*len(tokens)})
+        return outputs
+
+class TestNormalizeCli(TestCase):
+    def test_read_records(self):
+        jsonl = io.StringIO('{"id": "a", "text": "xin chao"}\n\n{"text": "ok"}\n')
+        self.assertEqual(list(read_records(jsonl, 'jsonl')), [('a', 'xin chao'), (2, 'ok')])
+        csv_file = io.StringIO('id,text\n7,"xin, chao"\n')
+        self.assertEqual(list(read_records(csv_file, 'csv')), [('7', 'xin, chao')])
+        txt = io.StringIO('xin chao\n\nok\n')
+        self.assertEqual(list(read_records(txt, 'txt')), [(0, 'xin chao'), (2, 'ok')])
+
+    def test_normalize_stream(self):
+        tokenizer = FakeTokenizer()
+        normalizer = UpperNormalizer(tokenizer)
+        records = ((i, 'xin chao ban') for i in range(5))
+        results = list(normalize_stream(records, tokenizer, normalizer, batch_size=2))
+        self.assertEqual(normalizer.batch_sizes, [2, 2, 1])
+        self.assertEqual([res['id'] for res in results], list(range(5)))
+        res = results[0]
+        self.assertEqual(res['source_tokens'], ['xi', 'n', 'ch', 'ao', 'ba', 'n'])
+        self.assertEqual(res['prediction_tokens'], ['XI', 'N', 'CH', 'AO', 'BA', 'N'])
+        self.assertEqual(res['aligned_index'], [0, 0, 1, 1, 2, 2])
+        self.assertEqual(set(res), {'id', 'source_text', 'prediction_text', 'source_tokens',
+                                    'prediction_tokens', 'aligned_index', 'is_nsw'})
+        json.dumps(res)
+
+    def test_max_length(self):
+        # Long sentences are normalized in chunks of max_length tokens, no word is dropped
+        tokenizer = FakeTokenizer()
+        normalizer = UpperNormalizer(tokenizer)
+        records = [(0, 'xin chao ban'), (1, 'ok')]
+        results = list(normalize_stream(records, tokenizer, normalizer, batch_size=4, max_length=6))
+        self.assertEqual(normalizer.batch_sizes, [3])
+        self.assertEqual(normalizer.input_lengths, [6, 4, 3])
+        res = results[0]
+        self.assertEqual(res['source_tokens'], ['xi', 'n', 'ch', 'ao', 'ba', 'n'])
+        self.assertEqual(res['prediction_tokens'], ['XI', 'N', 'CH', 'AO', 'BA', 'N'])
+        self.assertEqual(res['aligned_index'], [0, 0, 1, 1, 2, 2])
+        self.assertEqual(len(res['is_nsw']), 8)
+        self.assertEqual(results[1]['prediction_tokens'], ['OK'])
+
+if __name__ == '__main__':
+    unittest.main()
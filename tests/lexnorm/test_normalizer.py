@@ -1,7 +1,11 @@
+import os
+import shutil
+import tempfile
 import unittest
 from unittest import TestCase
 import attridict
 from visolex import ViSoLexNormalizer
+from visolex.framework_components.log import get_logger
 
 ARGS = {
     "student_name": "visobert",
@@ -41,8 +45,8 @@ class TestViSoLexNormalizer(TestCase):
         args.ckpt_dir = os.path.join(
             os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'model_checkpoints'
         )
-        args.logdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'logs')
-        os.makedirs(args.logdir, exist_ok=True)
+        args.logdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, args.logdir, ignore_errors=True)
         logger = get_logger(logfile=os.path.join(args.logdir, 'test_normalizer_1.log'))
 
         normalizer = ViSoLexNormalizer(args, logger)
@@ -60,8 +64,8 @@ class TestViSoLexNormalizer(TestCase):
         args.ckpt_dir = os.path.join(
             os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'model_checkpoints'
         )
-        args.logdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'logs')
-        os.makedirs(args.logdir, exist_ok=True)
+        args.logdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, args.logdir, ignore_errors=True)
         logger = get_logger(logfile=os.path.join(args.logdir, 'test_normalizer_1.log'))
         
         normalizer = ViSoLexNormalizer(args, logger)
@@ -82,5 +86,29 @@ class TestViSoLexNormalizer(TestCase):
             self.assertDictEqual(nsw_spans[i]['nsw'], expected_nsw_spans[i]['nsw'])
             self.assertDictEqual(nsw_spans[i]['prediction'], expected_nsw_spans[i]['prediction'])
 
+    def test_3(self):
+        # Normalize a batch of sentences, which must match sentence-by-sentence normalization
+        args = ARGS
+        args = attridict(args)
+        args.ckpt_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'model_checkpoints'
+        )
+        args.logdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, args.logdir, ignore_errors=True)
+        logger = get_logger(logfile=os.path.join(args.logdir, 'test_normalizer_3.log'))
+
+        normalizer = ViSoLexNormalizer(args, logger)
+        normalizer.load()
+        input_strs = [
+            "sao lỗi j mà khó chệu dzô cùng",
+            "trong phần kết luận nếu có thể thì em nen tóm luoc lại",
+            "ko",
+        ]
+        pred_strs = normalizer.normalize_batch(input_strs, batch_size=2)
+        self.assertEqual(len(pred_strs), len(input_strs))
+        for input_str, pred_str in zip(input_strs, pred_strs):
+            self.assertEqual(pred_str, normalizer.normalize_sentence(input_str))
+        self.assertEqual(pred_strs[0], "Sao lỗi gì mà khó chịu vô cùng.")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
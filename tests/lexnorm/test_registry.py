@@ -0,0 +1,66 @@
+import threading
+import unittest
+from unittest import TestCase, mock
+import attridict
+from visolex.lexnorm.registry import ModelRegistry
+
+ARGS = {
+    "student_name": "visobert",
+    "training_mode": "weakly_supervised",
+    "rm_accent_ratio": 0.0,
+}
+
+class FakeStudent:
+    num_loads = 0
+
+    def __init__(self, args, tokenizer, logger=None):
+        self.tokenizer = tokenizer
+
+    def load(self, name='student', best=False):
+        FakeStudent.num_loads += 1
+        self.version = f"{name}_best" if best else f"{name}_last"
+
+class TestModelRegistry(TestCase):
+    def setUp(self):
+        FakeStudent.num_loads = 0
+        self.registry = ModelRegistry.Instance()
+        self.registry.evict()
+        patcher_student = mock.patch('visolex.lexnorm.registry.Student', FakeStudent)
+        patcher_tokenizer = mock.patch('visolex.lexnorm.registry.get_tokenizer', lambda name: object())
+        patcher_student.start()
+        patcher_tokenizer.start()
+        self.addCleanup(patcher_student.stop)
+        self.addCleanup(patcher_tokenizer.stop)
+        self.addCleanup(self.registry.evict)
+
+    def test_load_once(self):
+        args = attridict(ARGS)
+        tokenizer, normalizer = self.registry.get(args)
+        self.assertIs(self.registry.get(args)[1], normalizer)
+        self.assertIs(normalizer.tokenizer, tokenizer)
+        self.assertEqual(normalizer.version, 'student_best')
+        self.assertEqual(FakeStudent.num_loads, 1)
+
+    def test_concurrent_get(self):
+        args = attridict(ARGS)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get(args))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(FakeStudent.num_loads, 1)
+        self.assertTrue(all(res is results[0] for res in results))
+
+    def test_warm_up_and_evict(self):
+        args = attridict(ARGS)
+        self.registry.warm_up(args, versions=('student_best', 'student_last'))
+        self.assertEqual(FakeStudent.num_loads, 2)
+        evicted = self.registry.evict(args, version='student_last')
+        self.assertEqual(evicted, [self.registry.make_key(args, 'student_last')])
+        self.assertEqual(self.registry.loaded(), [self.registry.make_key(args)])
+        self.registry.get(args, version='student_last')
+        self.assertEqual(FakeStudent.num_loads, 3)
+
+if __name__ == '__main__':
+    unittest.main()
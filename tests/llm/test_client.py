@@ -0,0 +1,102 @@
+import os
+import json
+import asyncio
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+from visolex.dictionary import Dictionary
+from visolex.llm.client import AsyncLLMClient, ResponseCache
+
+class StubBackend:
+    # Answers after a short delay and records the prompts and the peak concurrency
+    model = "stub"
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.prompts = []
+        self.running = 0
+        self.max_running = 0
+
+    async def complete(self, prompt):
+        self.prompts.append(prompt)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return "normalized({})".format(prompt)
+
+class TestAsyncLLMClient(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.cache_path = os.path.join(self.tmpdir, 'responses.sqlite')
+
+    def test_concurrency_and_order(self):
+        backend = StubBackend()
+        client = AsyncLLMClient(backend, max_concurrency=4)
+        nsws = ["nsw{}".format(i) for i in range(20)]
+        responses = client.run(nsws, prompt_tmpl="{nsw}")
+        self.assertEqual(responses, ["normalized({})".format(nsw) for nsw in nsws])
+        self.assertEqual(backend.max_running, 4)
+
+    def test_in_flight_deduplication(self):
+        backend = StubBackend()
+        client = AsyncLLMClient(backend, max_concurrency=8)
+        responses = client.run(["ko", "hok", "ko", "ko", "hok"], prompt_tmpl="{nsw}?")
+        self.assertEqual(sorted(backend.prompts), ["hok?", "ko?"])
+        self.assertEqual(responses[0], responses[2])
+
+    def test_persistent_cache(self):
+        backend = StubBackend()
+        cache = ResponseCache(self.cache_path)
+        AsyncLLMClient(backend, cache=cache).run(["ko", "hok"], prompt_tmpl="{nsw}")
+        cache.close()
+
+        cache = ResponseCache(self.cache_path)
+        self.assertEqual(len(cache), 2)
+        backend = StubBackend()
+        client = AsyncLLMClient(backend, cache=cache)
+        self.assertEqual(client.run(["ko"], prompt_tmpl="{nsw}"), ["normalized(ko)"])
+        self.assertEqual(backend.prompts, [])
+        # Another template is another cache entry
+        client.run(["ko"], prompt_tmpl="{nsw} có nghĩa là gì?")
+        self.assertEqual(backend.prompts, ["ko có nghĩa là gì?"])
+        cache.close()
+
+    def test_positional_template(self):
+        backend = StubBackend()
+        AsyncLLMClient(backend).run(["ko"], prompt_tmpl="Chuẩn hóa từ {}")
+        self.assertEqual(backend.prompts, ["Chuẩn hóa từ ko"])
+
+    def test_default_prompt(self):
+        backend = StubBackend()
+        AsyncLLMClient(backend).run(["ko"])
+        self.assertIn("Hãy chuẩn hóa từ ko thành dạng chuẩn", backend.prompts[0])
+
+class TestDictionarySearchMany(TestCase):
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        json_path = os.path.join(tmpdir, 'dictionary.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({}, f)
+        # Dictionary is a singleton, build an independent instance on the temporary file
+        self.dictionary = Dictionary._decorated(filepath=json_path)
+        self.dictionary._llm_cache = ResponseCache(':memory:')
+        self.added = []
+        self.dictionary.add_vocab = lambda nsw, response: self.added.append(nsw)
+
+    def test_add_once(self):
+        nsws = ["ko", "hok", "ko", "ko"]
+        responses = self.dictionary.search_many_chatgpt(nsws, prompt_tmpl="{}", add_to_dict=True, backend=StubBackend())
+        self.assertEqual(responses, ["normalized({})".format(nsw) for nsw in nsws])
+        self.assertEqual(self.added, ["ko", "hok"])
+
+    def test_running_loop(self):
+        async def search():
+            return await self.dictionary.asearch_many_chatgpt(["ko"], prompt_tmpl="{nsw}", backend=StubBackend())
+        self.assertEqual(asyncio.run(search()), ["normalized(ko)"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from unittest import TestCase
+import numpy as np
+import torch
+from datasets import Dataset
+from visolex.utils import pad_batch
+from visolex.framework_components.evaluator import MetricAccumulator
+from visolex.framework_components.normalizer.trainer_methods import epoch_run, predict
+from tests.data_handler.test_preprocessing_cache import build_tokenizer
+
+class RecordingModel(torch.nn.Module):
+    # Records its inputs, the loss is the mean of a dummy parameter
+    def __init__(self):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(1))
+        self.calls = []
+
+    def forward(self, input_ids, input_mask, labels=None, labels_n_masks=None, standard_labels=None, **kwargs):
+        self.calls.append({'input_mask': input_mask, 'labels': labels, 'labels_n_masks': labels_n_masks,
+                           'standard_labels': standard_labels})
+        loss = self.weight.sum()
+        return {'loss': loss, 'loss_norm': loss, 'loss_n_masks_pred': loss, 'loss_nsw_detection': loss}, None, None
+
+class TokenModel(torch.nn.Module):
+    # Logits of every token only depend on the token, unless it attends to a padded one
+    def __init__(self, num_labels, pad_id):
+        super().__init__()
+        self.logits = torch.tensor(np.random.default_rng(0).normal(size=(num_labels, num_labels)), dtype=torch.float32)
+        self.pad_id = pad_id
+
+    def forward(self, input_ids, input_mask, **kwargs):
+        assert not ((input_ids == self.pad_id) & (input_mask == 1)).any(), "padded token attended"
+        logits = self.logits[input_ids]
+        return None, {'logits_norm': logits, 'logits_nsw_detection': logits[..., :2]}, logits
+
+class TestEpochRun(TestCase):
+    def setUp(self):
+        self.tokenizer = build_tokenizer()
+        self.pad_id = self.tokenizer.pad_token_id
+
+    def test_padded_batch(self):
+        batch = pad_batch({
+            'input_ids': [[0, 7, 8, 2], [0, 9, 2]],
+            'output_ids': [[0, 7, 5, 2], [0, 6, 2]],
+            'align_index': [[0, 1], [0]],
+            'weak_labels': [[[0, 0], [7, 7], [8, 8], [2, 2]], [[0, 0], [9, 9], [2, 2]]],
+        }, self.pad_id)
+        model = RecordingModel()
+        epoch_run(
+            tokenizer=self.tokenizer, model=model, use_gpu=False, append_n_mask=True, nsw_detect=True,
+            soft_labels=False, loss_weights=False, batchIter=iter([batch]), mode='dev', epoch=1, n_epochs=1
+        )
+        call, = model.calls
+        self.assertEqual(call['input_mask'].tolist(), [[1, 1, 1, 1], [1, 1, 1, 0]])
+        self.assertEqual(call['labels'].tolist(), [[0, 7, 5, 2], [0, 6, 2, -1]])
+        self.assertEqual(call['standard_labels'].tolist(), [[0, 0, 1, 0], [0, 1, 0, -1]])
+        self.assertEqual(call['labels_n_masks'][1, 3].item(), -1)
+
+    def test_padded_pseudo_labels(self):
+        input_ids = [[0, 7, 8, 2], [0, 9, 2, self.pad_id]]
+        for soft_labels in [False, True]:
+            if soft_labels:
+                labels = {'proba': [np.full((2, 4, 10), 0.1, dtype=np.float32)]}
+            else:
+                labels = {'labels': [np.array([[0, 7, 5, 2], [0, 6, 2, -1]])]}
+            model = RecordingModel()
+            epoch_run(
+                tokenizer=self.tokenizer, model=model, use_gpu=False, append_n_mask=True, nsw_detect=True,
+                soft_labels=soft_labels, loss_weights=False, batchIter=dict(labels, id=[[0, 1]], input_ids=[input_ids]),
+                mode='train_pseudo', epoch=1, n_epochs=1, optimizer=[]
+            )
+            call, = model.calls
+            self.assertEqual(call['input_mask'].tolist(), [[1, 1, 1, 1], [1, 1, 1, 0]])
+            self.assertEqual(call['standard_labels'][1, 3].item(), -1)
+            self.assertEqual(call['labels_n_masks'][1, 3].item(), -1)
+            if not soft_labels:
+                self.assertEqual(call['labels'][1, 3].item(), -1)
+
+    def test_predict_token_budget(self):
+        rng = np.random.default_rng(0)
+        sent_lens = rng.integers(3, 9, size=20)
+        num_labels = len(self.tokenizer)
+        data = Dataset.from_dict({
+            'id': list(range(20)),
+            'input_ids': [rng.integers(2, len(self.tokenizer), size=n).tolist() for n in sent_lens],
+            'output_ids': [rng.integers(2, len(self.tokenizer), size=n).tolist() for n in sent_lens],
+            'align_index': [list(range(n - 2)) for n in sent_lens],
+            'weak_labels': [[[0]] * n for n in sent_lens],
+            'sent_len': sent_lens.tolist(),
+        }).sort('sent_len')
+        kwargs = dict(model=TokenModel(num_labels, self.pad_id), batch_size=8, use_gpu=False, nsw_detect=True,
+                      inference_mode=False, dataIter=None)
+        accumulator = MetricAccumulator()
+        res = predict(data=data, accumulator=accumulator, max_tokens=32, pad_id=self.pad_id, **kwargs)
+        self.assertTrue(any(len(set(sent_lens[batch_ids].tolist())) > 1 for batch_ids in res['id']))
+        for batch_ids, input_ids, preds, is_nsw in zip(res['id'], res['input_ids'], res['preds'], res['is_nsw']):
+            self.assertLessEqual(input_ids.size, 32)
+            for sent_id, sent, pred, nsw in zip(batch_ids, input_ids, preds, is_nsw.tolist()):
+                num_tokens = sent_lens[sent_id]
+                self.assertEqual(sent[:num_tokens].tolist(), data[data['id'].index(sent_id)]['input_ids'])
+                self.assertTrue((sent[num_tokens:] == self.pad_id).all())
+                self.assertTrue((pred[num_tokens:] == -1).all() and (pred[:num_tokens] >= 0).all())
+                self.assertEqual(nsw[num_tokens:], [-1] * (len(nsw) - num_tokens))
+        # Metrics only count the sentence tokens
+        expected = MetricAccumulator()
+        unpadded = predict(data=data, accumulator=expected, **kwargs)
+        self.assertEqual(expected.count, len(unpadded['preds']))
+        preds = np.concatenate([pred.reshape(-1) for pred in res['preds']])
+        self.assertEqual(np.sort(preds[preds != -1]).tolist(),
+                         np.sort(np.concatenate([pred.reshape(-1) for pred in unpadded['preds']])).tolist())
+        self.assertEqual(accumulator.count, len(res['preds']))
+
+if __name__ == '__main__':
+    unittest.main()
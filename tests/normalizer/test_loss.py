@@ -0,0 +1,60 @@
+import unittest
+from unittest import TestCase
+import torch
+from visolex.framework_components.normalizer.model_construction.loss import token_loss
+
+NUM_LABELS = 5
+SENT_LENS = [4, 2, 3]
+
+class TestTokenLoss(TestCase):
+    def setUp(self):
+        generator = torch.Generator().manual_seed(0)
+        max_len = max(SENT_LENS)
+        self.mask = torch.tensor([[1] * n + [0] * (max_len - n) for n in SENT_LENS])
+        self.logits = torch.randn(len(SENT_LENS), max_len, NUM_LABELS, generator=generator)
+        self.proba = torch.softmax(torch.randn(len(SENT_LENS), max_len, NUM_LABELS, generator=generator), dim=-1)
+        self.labels = torch.randint(0, NUM_LABELS, (len(SENT_LENS), max_len), generator=generator)
+        self.labels[self.mask == 0] = -1
+        self.weights = torch.rand(len(SENT_LENS), max_len, generator=generator)
+        # Padded positions hold arbitrary values
+        self.proba[self.mask == 0] = 1.0
+        self.weights[self.mask == 0] = 1.0
+
+    def unpadded(self, values):
+        # Tokens of all sentences as one unpadded sentence
+        return values[self.mask.bool()].unsqueeze(0)
+
+    def assert_same_loss(self, labels, **kwargs):
+        unpadded_kwargs = {key: self.unpadded(value) for key, value in kwargs.items()}
+        padded = token_loss(self.logits, labels, self.mask, **kwargs, soft_labels=labels.dim() == 3)
+        unpadded = token_loss(
+            self.unpadded(self.logits), self.unpadded(labels), torch.ones(1, sum(SENT_LENS)),
+            **unpadded_kwargs, soft_labels=labels.dim() == 3
+        )
+        self.assertAlmostEqual(padded.item(), unpadded.item(), places=5)
+
+    def test_hard_labels(self):
+        self.assert_same_loss(self.labels)
+        self.assert_same_loss(self.labels, sample_weights=self.weights)
+
+    def test_soft_labels(self):
+        self.assert_same_loss(self.proba)
+        self.assert_same_loss(self.proba, sample_weights=self.weights)
+
+    def test_weighted_mean(self):
+        loss = token_loss(self.logits, self.labels, self.mask, sample_weights=self.weights)
+        token_losses = torch.nn.functional.cross_entropy(
+            self.unpadded(self.logits)[0], self.unpadded(self.labels)[0], reduction='none'
+        )
+        expected = (token_losses * self.unpadded(self.weights)[0]).mean()
+        self.assertAlmostEqual(loss.item(), expected.item(), places=5)
+
+    def test_unit_weights(self):
+        # Ignored labels inside sentences do not count in the weighted average
+        self.labels[0, 1] = -1
+        unweighted = token_loss(self.logits, self.labels, self.mask)
+        weighted = token_loss(self.logits, self.labels, self.mask, sample_weights=torch.ones_like(self.weights))
+        self.assertAlmostEqual(weighted.item(), unweighted.item(), places=5)
+
+if __name__ == '__main__':
+    unittest.main()
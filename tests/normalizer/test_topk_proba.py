@@ -0,0 +1,89 @@
+import unittest
+from unittest import TestCase
+import attridict
+import numpy as np
+import torch
+from visolex.framework_components.topk_proba import TopKProba
+from visolex.framework_components.rule_attention_network import RAN
+from visolex.framework_components.normalizer.trainer_methods import epoch_run, predict
+from tests.normalizer.test_epoch_run import RecordingModel
+from tests.teacher.test_rule_attention_network import ARGS
+from tests.data_handler.test_preprocessing_cache import build_tokenizer
+
+NUM_LABELS = 6
+
+def random_proba(shape, seed=0):
+    logits = torch.tensor(np.random.default_rng(seed).normal(size=shape + (NUM_LABELS,)), dtype=torch.float32)
+    return torch.softmax(logits, dim=-1)
+
+class LogitsModel(torch.nn.Module):
+    # Fixed normalization logits for every batch
+    def __init__(self, logits):
+        super().__init__()
+        self.logits = logits
+
+    def forward(self, input_ids, input_mask, **kwargs):
+        logits = self.logits[:input_ids.shape[0], :input_ids.shape[1]]
+        return None, {'logits_norm': logits, 'logits_nsw_detection': torch.zeros(logits.shape[:-1] + (2,))}, logits
+
+class TestTopKProba(TestCase):
+    def test_dense(self):
+        proba = random_proba((3, 4))
+        full = TopKProba.from_proba(proba, NUM_LABELS)
+        np.testing.assert_allclose(full.dense(), proba.numpy(), atol=1e-6)
+        np.testing.assert_allclose(full.residual, 0, atol=1e-6)
+
+        topk = TopKProba.from_proba(proba, 2)
+        self.assertEqual(topk.shape, (3, 4, NUM_LABELS))
+        self.assertEqual(topk.ids.shape, (3, 4, 2))
+        np.testing.assert_array_equal(np.argmax(topk, axis=-1), proba.argmax(dim=-1).numpy())
+        np.testing.assert_allclose(np.max(topk, axis=-1), proba.max(dim=-1)[0].numpy())
+        dense = topk.dense()
+        np.testing.assert_allclose(dense.sum(axis=-1), 1, atol=1e-6)
+        np.testing.assert_array_equal(np.argmax(dense, axis=-1), np.argmax(topk, axis=-1))
+        # Rows
+        np.testing.assert_array_equal(topk[np.array([2, 0])].dense(), dense[[2, 0]])
+
+    def test_predict(self):
+        logits = torch.tensor(np.random.default_rng(1).normal(size=(2, 5, NUM_LABELS)), dtype=torch.float32)
+        batches = [{'id': [0, 1], 'input_ids': [[0, 1, 2, 3, 4]] * 2, 'align_index': [[0, 1, 2]] * 2,
+                    'weak_labels': [[[0, 0]] * 5] * 2}]
+        kwargs = dict(model=LogitsModel(logits), batch_size=2, use_gpu=False, nsw_detect=True, data=None, inference_mode=False)
+        dense = predict(dataIter=iter(batches), **kwargs)
+        topk = predict(dataIter=iter(batches), proba_topk=3, **kwargs)
+        proba, = topk['proba']
+        self.assertIsInstance(proba, TopKProba)
+        np.testing.assert_allclose(np.max(proba, axis=-1), np.max(dense['proba'][0], axis=-1))
+        np.testing.assert_array_equal(topk['preds'][0], dense['preds'][0])
+
+    def test_soft_pseudo_labels(self):
+        proba = TopKProba.from_proba(random_proba((2, 4)), 2)
+        batchIter = {'id': [[0, 1]], 'input_ids': [[[0, 5, 6, 2]] * 2], 'proba': [proba]}
+        model = RecordingModel()
+        epoch_run(
+            tokenizer=build_tokenizer(), model=model, use_gpu=False, append_n_mask=False, nsw_detect=False,
+            soft_labels=True, loss_weights=False, batchIter=batchIter, mode='train_pseudo', epoch=1, n_epochs=1,
+            optimizer=[]
+        )
+        call, = model.calls
+        np.testing.assert_allclose(call['labels'].numpy(), proba.dense())
+
+    def test_ran_student_rule(self):
+        rule_pred = np.random.default_rng(2).integers(-1, NUM_LABELS, size=(2, 4, 2))
+        student_pred = random_proba((2, 4), seed=3)
+        for hard_student_rule in [0, 1]:
+            ran = RAN(attridict(dict(ARGS, hard_student_rule=hard_student_rule)), num_rules=2, num_labels=NUM_LABELS)
+            expected = ran.postprocess_rule_preds(rule_pred, student_pred.numpy())
+            outputs = list(ran.postprocess_rule_preds(rule_pred, TopKProba.from_proba(student_pred, NUM_LABELS)))
+            if not hard_student_rule:
+                # The soft Student stays in top-k form
+                self.assertIsInstance(outputs[-1], TopKProba)
+                outputs[-1] = outputs[-1].dense()
+            for array, expected_array in zip(outputs, expected):
+                if expected_array is None:
+                    self.assertIsNone(array)
+                else:
+                    np.testing.assert_allclose(array, expected_array, atol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
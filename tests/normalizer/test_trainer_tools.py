@@ -0,0 +1,51 @@
+import unittest
+from unittest import TestCase
+import torch
+from visolex.global_variables import NUM_LABELS_N_MASKS
+from visolex.framework_components.normalizer.trainer_tools import get_label_n_masks
+
+def get_label_n_masks_loop(input, num_labels_n_masks):
+    # Reference implementation: per-position Python loop
+    output = torch.empty_like(input).long()
+    for ind_sent in range(input.size(0)):
+        count = 0
+        for ind_word in range(input.size(1)):
+            if input[ind_sent, ind_word] == 1:
+                output[ind_sent, ind_word] = -1
+                if count == 0:
+                    ind_multi_bpe = ind_word - 1
+                count += 1
+            elif input[ind_sent, ind_word] == 0:
+                if ind_word > 0 and input[ind_sent, ind_word -1] == 1:
+                    output[ind_sent, ind_multi_bpe] = min(count, num_labels_n_masks-1)
+                    count = 0
+                output[ind_sent, ind_word] = 0
+    return output
+
+class TestGetLabelNMasks(TestCase):
+    def test_examples(self):
+        input = torch.tensor([
+            [0, 0, 1, 1, 0, 0],
+            [0, 1, 1, 1, 1, 1],
+            [1, 1, 0, 0, 1, 0],
+            [0, 1, 1, 1, 1, 1],
+        ]).bool()
+        input[3, 5] = False
+        expected = torch.tensor([
+            [0, 2, -1, -1, 0, 0],
+            [0, -1, -1, -1, -1, -1],
+            [-1, -1, 0, 1, -1, 0],
+            [4, -1, -1, -1, -1, 0],
+        ])
+        self.assertTrue(torch.equal(get_label_n_masks(input, NUM_LABELS_N_MASKS), expected))
+
+    def test_equivalence(self):
+        generator = torch.Generator().manual_seed(0)
+        for batch_size, seq_len, mask_ratio in [(1, 1, 0.5), (1, 2, 0.5), (4, 7, 0.3), (16, 40, 0.5), (32, 64, 0.8)]:
+            input = torch.rand(batch_size, seq_len, generator=generator) < mask_ratio
+            expected = get_label_n_masks_loop(input, NUM_LABELS_N_MASKS)
+            output = get_label_n_masks(input, NUM_LABELS_N_MASKS)
+            self.assertTrue(torch.equal(output, expected), "batch shape {}".format((batch_size, seq_len)))
+
+if __name__ == '__main__':
+    unittest.main()
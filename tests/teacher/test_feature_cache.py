@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+import attridict
+import numpy as np
+import torch
+from datasets import Dataset
+from visolex.framework_components.feature_cache import FeatureCache
+from visolex.framework_components.teacher import Teacher
+from visolex.framework_components.topk_proba import TopKProba
+from visolex.utils import gen_dataIter
+from tests.teacher.test_rule_attention_network import ARGS
+
+NUM_LABELS = 7
+
+def random_dataset(num_sents, seed=0):
+    rng = np.random.default_rng(seed)
+    sent_lens = rng.integers(3, 6, size=num_sents)
+    return Dataset.from_dict({
+        'id': list(range(num_sents)),
+        'input_ids': [rng.integers(0, NUM_LABELS, size=n).tolist() for n in sent_lens],
+        'output_ids': [rng.integers(0, NUM_LABELS, size=n).tolist() for n in sent_lens],
+        'align_index': [list(range(n - 2)) for n in sent_lens],
+        'weak_labels': [rng.integers(-1, NUM_LABELS, size=(n, 2)).tolist() for n in sent_lens],
+        'sent_len': sent_lens.tolist(),
+    })
+
+class FakeStudent:
+    # Outputs of every sentence only depend on its tokens and on the weights version
+    def __init__(self):
+        self.version = 0
+        self.num_batches = 0
+
+    def predict(self, dataset, dataIter):
+        res = {key: [] for key in ['id', 'input_ids', 'output_ids', 'align_index', 'preds', 'proba', 'features', 'weak_labels', 'is_nsw']}
+        for batch in dataIter:
+            self.num_batches += 1
+            input_ids = np.array(batch['input_ids'])
+            proba = np.random.default_rng(self.version).random((NUM_LABELS, NUM_LABELS))[input_ids]
+            res['id'].append(batch['id'])
+            res['input_ids'].append(input_ids)
+            res['output_ids'].append(np.array(batch['output_ids']))
+            res['align_index'].append(batch['align_index'])
+            res['preds'].append(proba.argmax(-1))
+            res['proba'].append(proba)
+            res['features'].append(np.stack([proba, proba + self.version], axis=-1).astype(np.float32))
+            res['weak_labels'].append(np.array(batch['weak_labels']))
+            res['is_nsw'].append(input_ids % 2)
+        return res
+
+class TestFeatureCache(TestCase):
+    def test_put_get(self):
+        cache = FeatureCache()
+        features = np.arange(12, dtype=np.float32).reshape(3, 2, 2)
+        cache.put(1, 'dev', [10, 11, 12], {'features': features, 'proba': None})
+        self.assertEqual(len(cache), 3)
+        np.testing.assert_array_equal(cache.get(1, 'dev', [11, 12])['features'], features[1:])
+        np.testing.assert_array_equal(cache.get(1, 'dev', [12, 10])['features'], features[[2, 0]])
+        self.assertNotIn('proba', cache.get(1, 'dev', [10]))
+        self.assertIsNone(cache.get(1, 'dev', [10, 13]))
+        self.assertIsNone(cache.get(1, 'test', [10]))
+        self.assertIsNone(cache.get(2, 'dev', [10]))
+        # A new version drops the older one
+        cache.put(2, 'dev', [13], {'features': features[:1]})
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(1, 'dev', [10]))
+
+    def test_memory_mapped_fp16(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache = FeatureCache(cache_dir=cache_dir, fp16=True)
+        features = np.random.default_rng(0).random((4, 3, 5)).astype(np.float32)
+        cache.put(0, 'unlabeled', [0, 1, 2, 3], {'features': features, 'preds': np.ones((4, 3), dtype=np.int64)})
+        self.assertEqual(cache.blocks[0]['features'].dtype, np.float16)
+        self.assertIsInstance(cache.blocks[0]['features'], np.memmap)
+        cached = cache.get(0, 'unlabeled', [1, 2])
+        self.assertEqual(cached['features'].dtype, np.float32)
+        np.testing.assert_allclose(cached['features'], features[1:3], rtol=1e-3)
+        self.assertEqual(cached['preds'].dtype, np.int64)
+        cache.clear()
+        self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_topk_proba(self):
+        cache = FeatureCache(fp16=True)
+        proba = TopKProba.from_proba(torch.softmax(torch.randn(3, 2, NUM_LABELS), dim=-1), 2)
+        cache.put(0, 'unlabeled', [5, 6, 7], {'proba': proba})
+        cached = cache.get(0, 'unlabeled', [7, 5])['proba']
+        self.assertIsInstance(cached, TopKProba)
+        self.assertEqual(cached.num_labels, NUM_LABELS)
+        np.testing.assert_array_equal(cached.ids, proba.ids[[2, 0]])
+        np.testing.assert_allclose(cached.dense(), proba[np.array([2, 0])].dense(), rtol=1e-3)
+
+class TestTeacherStudentPredict(TestCase):
+    def setUp(self):
+        args = attridict(dict(ARGS, teacher_name='ran', num_rules=2))
+        self.teacher = Teacher(args, tokenizer=list(range(NUM_LABELS - 1)), logger=None)
+        self.student = FakeStudent()
+        self.teacher.student = self.student
+        self.dataset = random_dataset(40).sort('sent_len')
+
+    def data_iter(self, shuffle=False, seed=None):
+        return gen_dataIter(self.dataset, 8, sorted(set(self.dataset['sent_len'])), shuffle=shuffle, seed=seed)
+
+    def assert_same_outputs(self, res, expected):
+        self.assertEqual(sorted(res), sorted(expected))
+        for key, values in expected.items():
+            self.assertEqual(len(res[key]), len(values))
+            for batch, expected_batch in zip(res[key], values):
+                np.testing.assert_array_equal(batch, expected_batch)
+
+    def test_one_student_pass(self):
+        expected = self.student.predict(None, self.data_iter())
+        self.student.num_batches = 0
+        self.assert_same_outputs(self.teacher.student_predict(self.data_iter(), 'dev'), expected)
+        num_batches = self.student.num_batches
+        # Same sentences in other batches: nothing is predicted again
+        shuffled = self.teacher.student_predict(self.data_iter(shuffle=True, seed=1), 'dev')
+        self.assertEqual(self.student.num_batches, num_batches)
+        self.assert_same_outputs(shuffled, self.student.predict(None, self.data_iter(shuffle=True, seed=1)))
+
+        self.student.num_batches = 0
+        self.teacher.student_predict(self.data_iter(), 'test')
+        self.assertEqual(self.student.num_batches, num_batches)
+
+    def test_new_weights(self):
+        self.teacher.student_predict(self.data_iter(), 'dev')
+        self.student.version += 1
+        expected = self.student.predict(None, self.data_iter())
+        self.assert_same_outputs(self.teacher.student_predict(self.data_iter(), 'dev'), expected)
+
+    def test_disabled(self):
+        self.teacher.feature_cache = None
+        self.teacher.student_predict(self.data_iter(), 'dev')
+        num_batches = self.student.num_batches
+        self.teacher.student_predict(self.data_iter(), 'dev')
+        self.assertEqual(self.student.num_batches, 2 * num_batches)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+from unittest import TestCase
+import attridict
+import numpy as np
+import torch
+from visolex.framework_components.topk_proba import TopKProba
+from visolex.framework_components.rule_attention_network import (
+    RAN, RuleAttentionNetwork, l1_normalize, sparse_to_dense, sparse_max, MinEntropyLoss, RuleCrossEntropyLoss,
+    student_proba_tensors
+)
+
+ARGS = {
+    "seed": 42,
+    "logdir": "logs",
+    "train_batch_size": 16,
+    "eval_batch_size": 128,
+    "unsup_batch_size": 128,
+    "num_epochs": 1,
+    "num_unsup_epochs": 1,
+    "device": "cpu",
+    "hard_student_rule": 1,
+}
+
+def postprocess_rule_preds_onehot(ran, rule_pred, student_pred=None):
+    # Reference implementation with dense one-hot rule predictions
+    N, M = rule_pred.shape[0], rule_pred.shape[1]
+    rule_mask = (rule_pred != -1).astype(int)
+    fired_rule_ids = [[(np.nonzero(x)[0] + 1).tolist() for x in line] for line in rule_mask]
+    non_zero_rule_pred = []
+    for i in range(N):
+        preds_i = []
+        for j, fired_rules in enumerate(fired_rule_ids[i]):
+            preds_i_j = [rule_pred[i, j, id-1] for id in fired_rules]
+            preds_i_j = preds_i_j + [ran.num_labels] * (ran.num_rules-1 - len(preds_i_j))
+            preds_i.append(preds_i_j)
+        non_zero_rule_pred.append(preds_i)
+    one_hot_rule_pred = np.eye(ran.num_labels + 1)[np.array(non_zero_rule_pred)][:, :, :, :-1]
+    fired_rule_ids = np.array([[x + [0] * (ran.num_rules-1 - len(x)) for x in sent] for sent in fired_rule_ids])
+    if student_pred is not None:
+        if ran.hard_student_rule:
+            student_pred = np.eye(ran.num_labels)[np.argmax(student_pred, axis=-1)]
+        one_hot_rule_pred = np.concatenate([student_pred[..., np.newaxis, :], one_hot_rule_pred], axis=2)
+        rule_mask = np.concatenate([np.ones((N, M, 1)), rule_mask], axis=2)
+        fired_rule_ids = np.concatenate([np.ones((N, M, 1)) * ran.student_rule_id, fired_rule_ids], axis=-1)
+    return rule_mask, fired_rule_ids, one_hot_rule_pred
+
+def forward_onehot(model, student_embeddings, rule_ids, rule_preds_onehot):
+    # Reference forward pass aggregating rules with a matmul over one-hot predictions
+    x_hidden = model.dense(student_embeddings)
+    rule_embeddings = model.rule_embed(rule_ids)
+    rule_biases = model.rule_bias(rule_ids).squeeze(-1)
+    att_scores = torch.matmul(x_hidden.unsqueeze(2), rule_embeddings.transpose(2, 3)).squeeze(2) + rule_biases
+    att_sigmoid_proba = torch.sigmoid(att_scores)
+    outputs = torch.matmul(att_sigmoid_proba.unsqueeze(2), rule_preds_onehot.float()).squeeze(2)
+    sum_prob = torch.sum(rule_preds_onehot, dim=-1)
+    num_rules = torch.sum(sum_prob, dim=-1).float()
+    uniform = num_rules - torch.sum(att_sigmoid_proba * (sum_prob > 0).float(), dim=-1)
+    outputs = outputs + uniform.unsqueeze(-1) / model.num_labels
+    return l1_normalize(outputs, model.num_labels), att_sigmoid_proba
+
+class TestRuleAttentionNetwork(TestCase):
+    def setUp(self):
+        self.num_rules, self.num_labels = 2, 11
+        rng = np.random.RandomState(0)
+        self.rule_pred = rng.randint(0, self.num_labels - 1, size=(4, 6, self.num_rules))
+        self.rule_pred[rng.rand(4, 6, self.num_rules) < 0.4] = -1
+        self.rule_pred[0, :3, 1] = self.rule_pred[0, :3, 0]  # rules agreeing on a label
+        student_pred = rng.rand(4, 6, self.num_labels)
+        self.student_pred = (student_pred / student_pred.sum(-1, keepdims=True)).astype(np.float32)
+        self.features = torch.tensor(rng.rand(4, 6, 8), dtype=torch.float32)
+
+    def build(self, hard_student_rule):
+        args = attridict(ARGS)
+        args.hard_student_rule = hard_student_rule
+        ran = RAN(args, num_rules=self.num_rules, num_labels=self.num_labels)
+        ran.xdim = 8
+        ran.init_model()
+        ran.model.eval()
+        return ran
+
+    def test_postprocess_rule_preds(self):
+        ran = self.build(hard_student_rule=1)
+        for student_pred in [None, self.student_pred]:
+            rule_mask, fired_rule_ids, rule_label_ids, _ = ran.postprocess_rule_preds(self.rule_pred, student_pred)
+            ref_mask, ref_ids, ref_onehot = postprocess_rule_preds_onehot(ran, self.rule_pred, student_pred)
+            self.assertTrue(np.array_equal(rule_mask, ref_mask))
+            self.assertTrue(np.array_equal(fired_rule_ids, ref_ids))
+            onehot = np.eye(self.num_labels + 1)[rule_label_ids][..., :-1]
+            self.assertTrue(np.array_equal(onehot, ref_onehot))
+
+    def test_forward(self):
+        for hard_student_rule in [1, 0]:
+            ran = self.build(hard_student_rule)
+            for student_pred in [None, self.student_pred]:
+                _, fired_rule_ids, rule_label_ids, student_proba = ran.postprocess_rule_preds(self.rule_pred, student_pred)
+                student_proba = torch.tensor(student_proba) if student_proba is not None else None
+                with torch.no_grad():
+                    outputs, att = ran.model(
+                        self.features, torch.LongTensor(fired_rule_ids), torch.LongTensor(rule_label_ids), student_proba
+                    )
+                    _, ref_ids, ref_onehot = postprocess_rule_preds_onehot(ran, self.rule_pred, student_pred)
+                    ref_outputs, ref_att = forward_onehot(
+                        ran.model, self.features, torch.LongTensor(ref_ids), torch.tensor(ref_onehot)
+                    )
+                self.assertTrue(torch.allclose(att, ref_att))
+                self.assertTrue(torch.allclose(outputs, ref_outputs, atol=1e-6))
+
+    def test_sparse_forward(self):
+        ran = self.build(hard_student_rule=1)
+        y = torch.LongTensor(np.random.RandomState(1).randint(0, self.num_labels + 1, size=(4, 6)))
+        for student_pred in [None, self.student_pred]:
+            _, fired_rule_ids, rule_label_ids, _ = ran.postprocess_rule_preds(self.rule_pred, student_pred)
+            inputs = (self.features, torch.LongTensor(fired_rule_ids), torch.LongTensor(rule_label_ids))
+            with torch.no_grad():
+                dense, _ = ran.model(*inputs)
+                sparse, _ = ran.model(*inputs, return_proba=False)
+            self.assertTrue(torch.allclose(sparse_to_dense(sparse, self.num_labels), dense, atol=1e-6))
+
+            max_proba, preds = sparse_max(sparse, self.num_labels)
+            self.assertTrue(torch.equal(preds, torch.argmax(dense, dim=-1)))
+            self.assertTrue(torch.allclose(max_proba, torch.max(dense, dim=-1)[0], atol=1e-6))
+
+            entropy = MinEntropyLoss(self.num_labels)
+            self.assertTrue(torch.allclose(entropy(sparse), entropy(dense), atol=1e-6))
+            cross_entropy = RuleCrossEntropyLoss(self.num_labels, ignore_index=self.num_labels)
+            self.assertTrue(torch.allclose(cross_entropy(sparse, y), cross_entropy(dense, y), atol=1e-6))
+
+    def test_sparse_forward_soft_student(self):
+        # Top-k Student probabilities are aggregated without the dense distribution
+        ran = self.build(hard_student_rule=0)
+        y = torch.LongTensor(np.random.RandomState(2).randint(0, self.num_labels + 1, size=(4, 6)))
+        for k in [1, 3, self.num_labels]:
+            student_pred = TopKProba.from_proba(torch.tensor(self.student_pred), k)
+            _, fired_rule_ids, rule_label_ids, student_proba = ran.postprocess_rule_preds(self.rule_pred, student_pred)
+            self.assertIsInstance(student_proba, TopKProba)
+            inputs = (self.features, torch.LongTensor(fired_rule_ids), torch.LongTensor(rule_label_ids))
+            with torch.no_grad():
+                dense, _ = ran.model(*inputs, torch.tensor(student_pred.dense()))
+                sparse, _ = ran.model(*inputs, student_proba_tensors(student_proba), return_proba=False)
+                from_topk, _ = ran.model(*inputs, student_proba_tensors(student_proba))
+            self.assertTrue(torch.allclose(from_topk, dense, atol=1e-6))
+            self.assertTrue(torch.allclose(sparse_to_dense(sparse, self.num_labels), dense, atol=1e-6))
+
+            max_proba, preds = sparse_max(sparse, self.num_labels)
+            self.assertTrue(torch.equal(preds, torch.argmax(dense, dim=-1)))
+            self.assertTrue(torch.allclose(max_proba, torch.max(dense, dim=-1)[0], atol=1e-6))
+
+            entropy = MinEntropyLoss(self.num_labels)
+            self.assertTrue(torch.allclose(entropy(sparse), entropy(dense), atol=1e-6))
+            cross_entropy = RuleCrossEntropyLoss(self.num_labels, ignore_index=self.num_labels)
+            self.assertTrue(torch.allclose(cross_entropy(sparse, y), cross_entropy(dense, y), atol=1e-6))
+
+if __name__ == '__main__':
+    unittest.main()
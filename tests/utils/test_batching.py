@@ -0,0 +1,61 @@
+import unittest
+from unittest import TestCase
+import numpy as np
+from datasets import Dataset
+from visolex.utils import gen_dataIter, gen_bucketIter, get_length_buckets, pad_batch
+
+def build_dataset(num_samples=200, seed=0):
+    sent_lens = np.random.RandomState(seed).randint(3, 12, size=num_samples).tolist()
+    return Dataset.from_dict({
+        'id': list(range(num_samples)),
+        'input_ids': [list(range(5, 5 + n)) for n in sent_lens],
+        'align_index': [list(range(n)) for n in sent_lens],
+        'weak_labels': [[[i, i] for i in range(n)] for n in sent_lens],
+        'sent_len': sent_lens,
+    }).sort('sent_len')
+
+class TestBatching(TestCase):
+    def test_same_length_batches(self):
+        dataset = build_dataset()
+        len_list = list(set(dataset['sent_len']))
+        ids = []
+        for batch in gen_dataIter(dataset, 16, len_list, shuffle=True, seed=42):
+            self.assertLessEqual(len(batch['id']), 16)
+            self.assertEqual(len(set(batch['sent_len'])), 1)
+            ids.extend(batch['id'])
+        self.assertEqual(sorted(ids), list(range(len(dataset))))
+
+    def test_length_buckets_budgets(self):
+        sent_lens = np.random.RandomState(1).randint(1, 40, size=500)
+        batches = get_length_buckets(sent_lens, batch_size=32, max_tokens=256, bucket_width=4, shuffle=True, seed=1)
+        self.assertEqual(sorted(np.concatenate(batches).tolist()), list(range(len(sent_lens))))
+        for batch in batches:
+            self.assertLessEqual(len(batch), 32)
+            self.assertTrue(len(batch) == 1 or len(batch) * sent_lens[batch].max() <= 256)
+            self.assertEqual(len(set((sent_lens[batch] // 4).tolist())), 1)
+
+    def test_padded_batches(self):
+        dataset = build_dataset()
+        pad_id = 1
+        for batch in gen_bucketIter(dataset, pad_id, max_tokens=100, bucket_width=3):
+            max_len = max(batch['sent_len'])
+            for i, sent_len in enumerate(batch['sent_len']):
+                self.assertEqual(batch['attention_mask'][i], [1] * sent_len + [0] * (max_len - sent_len))
+                self.assertEqual(batch['input_ids'][i][sent_len:], [pad_id] * (max_len - sent_len))
+                self.assertEqual(batch['align_index'][i][sent_len:], [-1] * (max_len - sent_len))
+                self.assertEqual(len(batch['weak_labels'][i]), max_len)
+
+    def test_pad_empty_sentence(self):
+        batch = pad_batch({
+            'input_ids': [[], [5, 6]],
+            'align_index': [[], [0, 1]],
+            'weak_labels': [[], [[5, 5], [6, 6]]],
+        }, pad_id=1)
+        self.assertEqual(batch['input_ids'], [[1, 1], [5, 6]])
+        self.assertEqual(batch['weak_labels'][0], [[-1, -1], [-1, -1]])
+        self.assertEqual(batch['attention_mask'], [[0, 0], [1, 1]])
+        batch = pad_batch({'input_ids': [[], [5]], 'weak_labels': [[], [[7, 7, 7]]]}, pad_id=1, num_rules=3)
+        self.assertEqual(batch['weak_labels'], [[[-1, -1, -1]], [[7, 7, 7]]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -41,7 +41,8 @@ from .dictionary import Dictionary
 optional_imports = {
     'NswDetector': 'visolex.lexnorm.detect',
     'ViSoLexNormalizer': 'visolex.lexnorm.normalize',
-    'BasicNormalizer': 'visolex.lexnorm.basic_normalizer'
+    'BasicNormalizer': 'visolex.lexnorm.basic_normalizer',
+    'ModelRegistry': 'visolex.lexnorm.registry'
 }
 
 @lru_cache(maxsize=None)
@@ -70,5 +71,6 @@ __all__ = [
     'Dictionary',
     'NswDetector',
     'ViSoLexNormalizer',
-    'BasicNormalizer'
+    'BasicNormalizer',
+    'ModelRegistry'
 ]
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Command line interface.
+
+    visolex normalize INPUT [-o OUTPUT] [--format jsonl|csv|txt] [--batch-size N]
+
+normalizes a corpus with the Student. The input (JSONL, CSV or plain text, '-' for
+stdin) is read record by record and pushed through the model in fixed-size batches;
+every prediction is written as soon as its batch is done, as one JSON line with the
+same fields as `write_predictions`. Memory use only depends on the batch size.
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+import itertools
+import torch
+from visolex.utils import get_arguments, add_special_token, prediction_row
+
+INPUT_FORMATS = {'.jsonl': 'jsonl', '.json': 'jsonl', '.csv': 'csv'}
+
+def guess_format(path):
+    return INPUT_FORMATS.get(os.path.splitext(path)[1].lower(), 'txt')
+
+def read_records(file, input_format, text_field='text', id_field='id'):
+    """Yields (id, text) pairs; records without an id are numbered by their position."""
+    if input_format == 'jsonl':
+        for line_no, line in enumerate(file):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield record.get(id_field, line_no), record[text_field]
+    elif input_format == 'csv':
+        for row_no, row in enumerate(csv.DictReader(file)):
+            yield row.get(id_field) or row_no, row[text_field]
+    else:
+        for line_no, line in enumerate(file):
+            line = line.rstrip('\r\n')
+            if line.strip():
+                yield line_no, line
+
+def batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def tokenize_words(tokenizer, words, max_length=None):
+    """
+    Same word-by-word tokenization as `aligned_tokenize`. Sentences that do not fit in
+    `max_length` tokens (special tokens included) are split between words into chunks
+    that do: returns one (tokens, align_index) pair per chunk, align_index holding the
+    positions of the words in the whole sentence. A single word longer than a chunk is
+    truncated.
+    """
+    chunks = []
+    tokens = []
+    align_index = []
+    for idx, word in enumerate(words):
+        word_tokens = tokenizer.tokenize(word)
+        if max_length is not None:
+            word_tokens = word_tokens[:max_length - 2]
+            if tokens and len(tokens) + len(word_tokens) + 2 > max_length:
+                add_special_token(tokens)
+                chunks.append((tokens, align_index))
+                tokens, align_index = [], []
+        tokens.extend(word_tokens)
+        align_index.extend([idx]*len(word_tokens))
+    add_special_token(tokens)
+    chunks.append((tokens, align_index))
+    return chunks
+
+def join_chunks(chunks, outputs):
+    # Tokens and predictions of the chunks of one sentence, with a single BOS/EOS pair
+    tokens = [chunks[0][0][0]]
+    align_index = []
+    pred = [outputs[0]['pred'][0]]
+    is_nsw = [outputs[0]['is_nsw'][0]] if outputs[0]['is_nsw'] is not None else None
+    for (chunk_tokens, chunk_align_index), output in zip(chunks, outputs):
+        tokens.extend(chunk_tokens[1:-1])
+        align_index.extend(chunk_align_index)
+        pred.extend(output['pred'][1:-1])
+        if is_nsw is not None:
+            is_nsw.extend(output['is_nsw'][1:-1])
+    tokens.append(chunks[-1][0][-1])
+    pred.append(outputs[-1]['pred'][-1])
+    if is_nsw is not None:
+        is_nsw.append(outputs[-1]['is_nsw'][-1])
+    return tokens, align_index, pred, is_nsw
+
+def normalize_stream(records, tokenizer, normalizer, batch_size, lowercase=False, max_length=None):
+    """
+    Normalizes (id, text) records lazily, yielding one output record per input. Long
+    records are normalized chunk by chunk (see tokenize_words) and joined back.
+    """
+    for batch in batched(records, batch_size):
+        sent_ids, sent_chunks = [], []
+        for sent_id, text in batch:
+            words = text if isinstance(text, list) else text.split()
+            if lowercase:
+                words = [word.lower() for word in words]
+            sent_ids.append(sent_id)
+            sent_chunks.append(tokenize_words(tokenizer, words, max_length))
+
+        outputs = iter(normalizer.batch_inference(
+            [tokens for chunks in sent_chunks for tokens, _ in chunks], batch_size=batch_size
+        ))
+        for sent_id, chunks in zip(sent_ids, sent_chunks):
+            tokens, align_index, pred, is_nsw = join_chunks(chunks, [next(outputs) for _ in chunks])
+            # Keep the best candidate when the normalizer returns topk > 1 predictions
+            pred = [p[0] if isinstance(p, list) else p for p in pred]
+            yield prediction_row(
+                tokenizer, sent_id,
+                source=tokenizer.convert_tokens_to_ids(tokens),
+                pred=pred,
+                align_index=align_index,
+                is_nsw=is_nsw,
+            )
+
+def run_normalize(cli_args):
+    from visolex.lexnorm import _get_logger
+    from visolex.lexnorm.registry import ModelRegistry
+
+    args = get_arguments()
+    if cli_args.student_name is not None:
+        args.student_name = cli_args.student_name
+    args.device = cli_args.device or getattr(args, 'device', None) or ('cuda' if torch.cuda.is_available() else 'cpu')
+    batch_size = cli_args.batch_size or args.eval_batch_size
+    input_format = cli_args.format or guess_format(cli_args.input)
+
+    logger = _get_logger(os.path.join(args.logdir, 'normalize.log'))
+    tokenizer, normalizer = ModelRegistry.Instance().get(args, logger, version=cli_args.version)
+    max_length = tokenizer.model_max_length if tokenizer.model_max_length < 100000 else None
+
+    infile = sys.stdin if cli_args.input == '-' else open(cli_args.input, 'r', encoding='utf-8', newline='')
+    outfile = sys.stdout if cli_args.output == '-' else open(cli_args.output, 'w', encoding='utf-8')
+    num_records = 0
+    try:
+        records = read_records(infile, input_format, cli_args.text_field, cli_args.id_field)
+        for res in normalize_stream(records, tokenizer, normalizer, batch_size, cli_args.lowercase, max_length):
+            outfile.write(json.dumps(res, ensure_ascii=False) + '\n')
+            num_records += 1
+            if num_records % batch_size == 0:
+                outfile.flush()
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    logger.info("Normalized {} records".format(num_records))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='visolex', description='ViSoLex command line tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    normalize = subparsers.add_parser('normalize', help='normalize a corpus into JSONL predictions')
+    normalize.add_argument('input', help="JSONL, CSV or plain text file, '-' for stdin")
+    normalize.add_argument('-o', '--output', default='-', help="JSONL output file, '-' for stdout")
+    normalize.add_argument('--format', choices=['jsonl', 'csv', 'txt'], default=None,
+                           help='input format (default: guessed from the file extension)')
+    normalize.add_argument('--text-field', default='text', help='JSONL key / CSV column with the text')
+    normalize.add_argument('--id-field', default='id', help='JSONL key / CSV column with the record id')
+    normalize.add_argument('--batch-size', type=int, default=None, help='default: eval_batch_size')
+    normalize.add_argument('--student-name', default=None, help='default: student_name in arguments.json')
+    normalize.add_argument('--version', default='student_best', help='checkpoint version to load')
+    normalize.add_argument('--device', default=None, help='cpu or cuda (default: cuda when available)')
+    normalize.add_argument('--lowercase', action='store_true')
+
+    cli_args = parser.parse_args(argv)
+    if cli_args.command == 'normalize':
+        return run_normalize(cli_args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,15 @@
+import os
 import json
+import asyncio
+import sqlite3
 from bs4 import BeautifulSoup
 from visolex.utils import Singleton
-from visolex.global_variables import DICT_PATH
+from visolex.global_variables import DICT_PATH, DICT_INDEX_PATH, DICT_JOURNAL_PATH, OPENAI_MODEL
+from visolex.dictionary.index import DictionaryIndex, DictionaryStore, build_index
+from visolex.dictionary.journal import DictionaryJournal, write_json
+from visolex.dictionary.fuzzy import FuzzyIndex
 from visolex.llm.gpt import run_chatgpt
+from visolex.llm.client import AsyncLLMClient, OpenAIBackend, ResponseCache
 from visolex.llm.prompts import DEFAULT_NSW_SEARCH_PROMPT
 
 def parse_html_to_string(html_content):
@@ -13,13 +20,35 @@ def parse_html_to_string(html_content):
 
 @Singleton
 class Dictionary:
-    def __init__(self, filepath=None):
+    def __init__(self, filepath=None, index_path=None, journal_path=None, compact_every=1000):
         """ contains 13k words in this version
+        Words are looked up in a memory-mapped index built from the json file on first
+        use (see visolex.dictionary.index), so the json is not loaded into memory.
+        New words are appended to a journal (see visolex.dictionary.journal) that is
+        merged back into the json file every `compact_every` entries.
         """
         if filepath is None:
             filepath = DICT_PATH
-        with open(filepath, 'r', encoding='utf-8') as f:
-            self.nsw_dict = json.load(f)
+        if index_path is None:
+            index_path = DICT_INDEX_PATH if filepath == DICT_PATH else os.path.splitext(filepath)[0] + '.idx'
+        if journal_path is None:
+            journal_path = DICT_JOURNAL_PATH if filepath == DICT_PATH else os.path.splitext(filepath)[0] + '.journal.jsonl'
+        self.filepath = filepath
+        self.index_path = index_path
+        self.journal = DictionaryJournal(journal_path)
+        self.compact_every = compact_every
+        self.nsw_dict = DictionaryStore(self.open_base(), journal=self.journal, open_base=self.open_base)
+        self._fuzzy_index = None
+        self._llm_cache = None
+
+    def open_base(self):
+        try:
+            return DictionaryIndex.open(self.filepath, self.index_path)
+        except OSError:
+            # The index cannot be written (e.g. read-only installation): use the json file
+            print(f"Cannot build dictionary index at {self.index_path}. Loading {self.filepath} instead")
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
 
     def size(self):
         """Returns the number of words in the dictionary."""
@@ -27,49 +56,127 @@ class Dictionary:
 
     def add_vocab(self, nsw, response):
         print(f"Dictionary size before adding new vocab: {self.size()}")
-        self.nsw_dict[nsw] = {}
-        self.nsw_dict[nsw]['response'] = response
+        entry = {'response': response}
+        try:
+            self.journal.append(nsw, entry)
+        except OSError:
+            print(f"Cannot write to {self.journal.path}. {nsw} is only kept in memory")
+        self.nsw_dict[nsw] = entry
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.add(nsw)
         print(f"Dictionary size after adding new vocab: {self.size()}")
+        self.nsw_dict.sync()
+        if self.compact_every and self.journal.num_entries >= self.compact_every:
+            try:
+                self.compact()
+            except OSError:
+                print(f"Cannot compact {self.journal.path} into {self.filepath}")
+
+    def compact(self):
+        """Merges the journal into the json file and its index, then empties the journal."""
+        def merge(entries):
+            if not entries:
+                return
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                nsw_dict = json.load(f)
+            for nsw, entry in entries:
+                nsw_dict[nsw] = entry
+            write_json(self.filepath, nsw_dict)
+            build_index(self.filepath, self.index_path)
+
+        print(f"Compacting {self.journal.path} into {self.filepath}")
+        self.journal.compact(merge)
+        self.nsw_dict.sync()
+
+    def save_dict(self, filepath=None):
+        """Writes the whole dictionary, new words included, to `filepath` (default: its json file)."""
+        if filepath is None or os.path.abspath(filepath) == os.path.abspath(self.filepath):
+            self.compact()
+        else:
+            write_json(filepath, self.nsw_dict.to_dict())
+
+    @property
+    def fuzzy_index(self):
+        # Built in memory, from every key, on the first fuzzy search that misses the dictionary
+        if self._fuzzy_index is None:
+            self._fuzzy_index = FuzzyIndex(self.nsw_dict)
+        return self._fuzzy_index
+
+    def search_fuzzy(self, nsw, max_distance=None):
+        """Closest dictionary word to `nsw` ignoring accents, case and repeated letters, or None."""
+        return self.fuzzy_index.closest(nsw, max_distance=max_distance)
 
     def search_dict(self, nsw):
-        normalized_data = self.nsw_dict[nsw]
-        result = normalized_data
-        try:
-            normalized_data = result['response']['normalized'][0]
-            response = {
-                'word': normalized_data['word'],
-                'definition': normalized_data['definition'],
-                'abbreviation': normalized_data.get('abbreviations', ''),
-                'example': normalized_data.get('example', '')
-            }
-            response_str = ""
-            for key, value in response.items():
-                string = "- " + key.upper() + ": " + value + "\n"
-                response_str += string
-        except:
-            response_str = json.dumps(result)
-        return response_str
+        return self.nsw_dict.get_text(nsw)
 
-    def search_chatgpt(self, nsw, openai_api_key, prompt_tmpl, add_to_dict):
-        prompt = DEFAULT_NSW_SEARCH_PROMPT.format(nsw) if prompt_tmpl is None else prompt_tmpl.format(nsw)
-        response = run_chatgpt(nsw, openai_api_key, prompt)
+    @property
+    def llm_cache(self):
+        # GPT-4 responses are kept across runs, keyed by (prompt template, nsw, model)
+        if self._llm_cache is None:
+            try:
+                self._llm_cache = ResponseCache()
+            except sqlite3.OperationalError:
+                self._llm_cache = ResponseCache(':memory:')
+        return self._llm_cache
+
+    def process_chatgpt_response(self, nsw, response, add_to_dict):
         response = response.replace("```html\n", "").replace("\n```", "")
         if add_to_dict:
             self.add_vocab(nsw, response)
-        if prompt is None:
-            response_str = parse_html_to_string(response)
-        else:
-            response_str = response
-        return response_str
+        return response
+
+    def search_chatgpt(self, nsw, openai_api_key, prompt_tmpl, add_to_dict):
+        template = DEFAULT_NSW_SEARCH_PROMPT if prompt_tmpl is None else prompt_tmpl
+        response = self.llm_cache.get(template, nsw, OPENAI_MODEL)
+        if response is None:
+            # Templates may use a positional {} or a named {nsw} placeholder
+            response = run_chatgpt(nsw, openai_api_key, template.format(nsw, nsw=nsw))
+            self.llm_cache.set(template, nsw, OPENAI_MODEL, response)
+        return self.process_chatgpt_response(nsw, response, add_to_dict)
+
+    async def asearch_many_chatgpt(self, nsws, openai_api_key=None, prompt_tmpl=None, add_to_dict=False,
+                                   max_concurrency=8, backend=None):
+        """
+        Searches many NSWs with GPT-4 concurrently (at most `max_concurrency` requests at
+        a time, duplicates sent once, cached responses reused). `backend` replaces the
+        OpenAI backend, see visolex.llm.client. Coroutine version of `search_many_chatgpt`,
+        for callers already running an event loop.
+        """
+        if backend is None:
+            backend = OpenAIBackend(api_key=openai_api_key)
+        client = AsyncLLMClient(backend, cache=self.llm_cache, max_concurrency=max_concurrency)
+        responses = await client.search_many(nsws, prompt_tmpl=prompt_tmpl)
+        processed = {
+            (nsw, response): self.process_chatgpt_response(nsw, response, add_to_dict)
+            for nsw, response in dict.fromkeys(zip(nsws, responses))
+        }
+        return [processed[(nsw, response)] for nsw, response in zip(nsws, responses)]
+
+    def search_many_chatgpt(self, nsws, openai_api_key=None, prompt_tmpl=None, add_to_dict=False,
+                            max_concurrency=8, backend=None):
+        """Blocking version of `asearch_many_chatgpt`, for use outside of an event loop."""
+        return asyncio.run(self.asearch_many_chatgpt(
+            nsws, openai_api_key=openai_api_key, prompt_tmpl=prompt_tmpl, add_to_dict=add_to_dict,
+            max_concurrency=max_concurrency, backend=backend
+        ))
 
-    def search(self, nsw, search_dict=True, add_to_dict=False, openai_api_key=None, prompt_tmpl=None):
+    def search(self, nsw, search_dict=True, add_to_dict=False, openai_api_key=None, prompt_tmpl=None, fuzzy=False):
+        """
+        With `fuzzy`, an NSW missing from the dictionary gets the entry of its closest
+        word (see `search_fuzzy`) instead of a GPT-4 search, unless it should be added.
+        """
         if search_dict:
             print("Searching in Dictionary")
             if nsw in self.nsw_dict:
                 response_str = self.search_dict(nsw)
             else:
-                print(f"{nsw} does not exist in Dictionary. Search using GPT-4 instead")
-                response_str = self.search_chatgpt(nsw, openai_api_key, prompt_tmpl, add_to_dict)
+                closest = self.search_fuzzy(nsw) if fuzzy and not add_to_dict else None
+                if closest is not None:
+                    print(f"{nsw} does not exist in Dictionary. Using the closest word {closest} instead")
+                    response_str = self.search_dict(closest)
+                else:
+                    print(f"{nsw} does not exist in Dictionary. Search using GPT-4 instead")
+                    response_str = self.search_chatgpt(nsw, openai_api_key, prompt_tmpl, add_to_dict)
         else:
             print("Searching using GPT-4")
             response_str = self.search_chatgpt(nsw, openai_api_key, prompt_tmpl, add_to_dict)
@@ -0,0 +1,114 @@
+import re
+from itertools import combinations
+from visolex.global_variables import RM_ACCENTS_DICT
+
+REPEATED_CHARS = re.compile(r'(.)\1+')
+
+def fold(word):
+    """Lowercases, strips accents and collapses repeated characters: "Khôngggg" -> "khong"."""
+    return REPEATED_CHARS.sub(r'\1', word.lower().translate(RM_ACCENTS_DICT))
+
+def deletes(word, distance):
+    """All strings obtained by deleting exactly `distance` characters from `word`."""
+    return {
+        ''.join(char for i, char in enumerate(word) if i not in indices)
+        for indices in combinations(range(len(word)), distance)
+    }
+
+def edit_distance(a, b, max_distance):
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+class FuzzyIndex:
+    """
+    Accent-insensitive, bounded edit distance lookup over dictionary keys
+    (SymSpell-style deletion index). Keys and queries are compared in their folded
+    form (see `fold`). The distance allowed for a query grows with its length: up to
+    3 characters (mostly abbreviations such as "ko", "đcs") words only match through
+    folding, then 1 edit up to 6 characters and `max_distance` beyond.
+    """
+
+    def __init__(self, keys=(), max_distance=2, cache_size=100000):
+        self.max_distance = max_distance
+        self.cache_size = cache_size
+        self.folded = {}   # folded form -> dictionary keys
+        # deletes[d]: string obtained by deleting d characters of folded forms -> folded forms
+        self.deletes = [{} for _ in range(max_distance + 1)]
+        self.cache = {}    # query -> lookup results, NSWs tend to repeat
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        self.cache.clear()
+        folded = fold(key)
+        if folded in self.folded:
+            if key not in self.folded[folded]:
+                self.folded[folded].append(key)
+            return
+        self.folded[folded] = [key]
+        for distance in range(1, self.max_distance + 1):
+            for deletion in deletes(folded, distance):
+                self.deletes[distance].setdefault(deletion, set()).add(folded)
+
+    def allowed_distance(self, folded):
+        return min(self.max_distance, max(0, (len(folded) - 1) // 3))
+
+    def lookup(self, word, max_distance=None):
+        """
+        Returns (key, distance) pairs of the dictionary keys closest to `word`: keys with
+        the same folded form (distance 0) if any, otherwise those at the smallest
+        distance within the allowed one.
+        """
+        if (word, max_distance) in self.cache:
+            return self.cache[(word, max_distance)]
+        folded = fold(word)
+        query_distance = self.allowed_distance(folded) if max_distance is None else min(max_distance, self.max_distance)
+        results = self._lookup(folded, query_distance)
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[(word, max_distance)] = results
+        return results
+
+    def _lookup(self, folded, max_distance):
+        if max_distance == 0 or folded in self.folded:
+            return [(key, 0) for key in self.folded.get(folded, [])]
+        # Candidates share a deletion with the query, each side deleting at most max_distance
+        # characters (a substitution is one deletion on both sides)
+        query_deletes = {folded}
+        for distance in range(1, max_distance + 1):
+            query_deletes |= deletes(folded, distance)
+        candidates = set(deletion for deletion in query_deletes if deletion in self.folded)
+        for distance in range(1, max_distance + 1):
+            for deletion in query_deletes:
+                candidates.update(self.deletes[distance].get(deletion, ()))
+        matches = []
+        for candidate in candidates:
+            distance = edit_distance(folded, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, abs(len(candidate) - len(folded)), candidate))
+        if not matches:
+            return []
+        min_distance = min(matches)[0]
+        return [
+            (key, distance) for distance, _, candidate in sorted(matches) if distance == min_distance
+            for key in self.folded[candidate]
+        ]
+
+    def closest(self, word, max_distance=None):
+        """The closest dictionary key to `word`, or None."""
+        results = self.lookup(word, max_distance)
+        return results[0][0] if results else None
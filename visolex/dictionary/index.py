@@ -0,0 +1,270 @@
+import os
+import json
+import mmap
+import time
+import struct
+import tempfile
+from bisect import bisect_left
+from collections.abc import Mapping, MutableMapping
+import numpy as np
+
+# Index file layout (little endian):
+#   header: magic, number of keys, size and mtime_ns of the source json
+#   key_offsets, entry_offsets, text_offsets: (n + 1) uint64 offsets into the data blob
+#   data blob: sorted utf-8 keys, json-encoded entries, rendered search results
+# Keys are sorted by their utf-8 bytes so that lookups bisect the raw key table.
+MAGIC = b'VSLXDIX1'
+HEADER = struct.Struct('<8sQQq')
+
+def render_entry(entry):
+    """Formats a dictionary entry as returned by `Dictionary.search_dict`."""
+    try:
+        normalized_data = entry['response']['normalized'][0]
+        response = {
+            'word': normalized_data['word'],
+            'definition': normalized_data['definition'],
+            'abbreviation': normalized_data.get('abbreviations', ''),
+            'example': normalized_data.get('example', '')
+        }
+        response_str = ""
+        for key, value in response.items():
+            string = "- " + key.upper() + ": " + value + "\n"
+            response_str += string
+    except:
+        response_str = json.dumps(entry)
+    return response_str
+
+def source_stamp(json_path):
+    stat = os.stat(json_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def build_index(json_path, index_path):
+    """
+    Builds the index of `json_path` at `index_path`. The file is written next to its
+    destination and moved in place, so readers never see a partial index.
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        nsw_dict = json.load(f)
+    size, mtime_ns = source_stamp(json_path)
+
+    keys = sorted(nsw_dict, key=lambda key: key.encode('utf-8'))
+    columns = [
+        [key.encode('utf-8') for key in keys],
+        [json.dumps(nsw_dict[key], ensure_ascii=False).encode('utf-8') for key in keys],
+        [render_entry(nsw_dict[key]).encode('utf-8') for key in keys],
+    ]
+    offsets = []
+    start = 0
+    for column in columns:
+        lengths = np.fromiter((len(value) for value in column), dtype=np.uint64, count=len(keys))
+        offsets.append(np.concatenate([[0], np.cumsum(lengths, dtype=np.uint64)]).astype('<u8') + start)
+        start += int(lengths.sum())
+
+    index_dir = os.path.dirname(os.path.abspath(index_path))
+    fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix='.dictionary-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(keys), size, mtime_ns))
+            for column_offsets in offsets:
+                f.write(column_offsets.tobytes())
+            for column in columns:
+                f.writelines(column)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates private files; the index is shared
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class _SortedKeys:
+    # Sequence view over the raw key table, for bisect
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        return self.index._slice(self.index.key_offsets, i)
+
+class DictionaryIndex(Mapping):
+    """
+    Read-only, memory-mapped view of a dictionary index: lookups bisect the key table
+    and only decode the requested entry. The mapping is shared between processes
+    through the page cache.
+    """
+
+    def __init__(self, index_path, json_path=None):
+        self.index_path = index_path
+        self.json_path = json_path
+        with open(index_path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_keys, self.source_size, self.source_mtime_ns = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a dictionary index".format(index_path))
+        n = self.num_keys + 1
+        self.key_offsets, self.entry_offsets, self.text_offsets = (
+            np.frombuffer(self.mm, dtype='<u8', count=n, offset=HEADER.size + i * 8 * n) for i in range(3)
+        )
+        self.data_start = HEADER.size + 3 * 8 * n
+        self._keys = _SortedKeys(self)
+
+    @classmethod
+    def open(cls, json_path, index_path):
+        """Opens the index of `json_path`, (re)building it when missing or out of date."""
+        try:
+            index = cls(index_path, json_path)
+            if not index.is_stale():
+                return index
+            index.close()
+        except (OSError, ValueError, struct.error):
+            pass
+        build_index(json_path, index_path)
+        return cls(index_path, json_path)
+
+    def is_stale(self):
+        """True if the source json changed since the index was built."""
+        try:
+            return (self.source_size, self.source_mtime_ns) != source_stamp(self.json_path)
+        except OSError:
+            return False
+
+    def close(self):
+        # Offsets are views of the mapping and must go first
+        self.key_offsets = self.entry_offsets = self.text_offsets = None
+        self.mm.close()
+
+    def _slice(self, offsets, i):
+        return self.mm[self.data_start + int(offsets[i]):self.data_start + int(offsets[i + 1])]
+
+    def _find(self, key):
+        if not isinstance(key, str):
+            return -1
+        encoded = key.encode('utf-8')
+        i = bisect_left(self._keys, encoded)
+        if i < self.num_keys and self._keys[i] == encoded:
+            return i
+        return -1
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __getitem__(self, key):
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return json.loads(self._slice(self.entry_offsets, i))
+
+    def get_text(self, key):
+        """Rendered search result of `key`, see `render_entry`."""
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._slice(self.text_offsets, i).decode('utf-8')
+
+    def __len__(self):
+        return self.num_keys
+
+    def __iter__(self):
+        for i in range(self.num_keys):
+            yield self._keys[i].decode('utf-8')
+
+class DictionaryStore(MutableMapping):
+    """
+    NSW dictionary backed by a DictionaryIndex (or a plain dict), with an in-memory
+    overlay holding entries added or changed at runtime. With a `journal`
+    (see visolex.dictionary.journal), entries appended to it by any process are merged
+    into the overlay lazily: on first access and when a key is missing, if the journal
+    file changed (a single stat) or at most every `sync_interval` seconds otherwise (to
+    notice edits of the json file). When the journal has been compacted into the json
+    file, the base is reopened with `open_base()`.
+    """
+
+    def __init__(self, base, journal=None, open_base=None, sync_interval=1.0):
+        self.base = base
+        self.overlay = {}
+        self.deleted = set()
+        self.journal = journal
+        self.open_base = open_base
+        self.sync_interval = sync_interval
+        self._synced = False
+        self._last_sync = None
+
+    def sync(self):
+        if self.journal is None:
+            return
+        entries, reset = self.journal.read_new()
+        if isinstance(self.base, DictionaryIndex) and self.base.json_path is not None:
+            reset = reset or self.base.is_stale()
+        self._synced = True
+        self._last_sync = time.monotonic()
+        if reset:
+            if self.open_base is not None:
+                if isinstance(self.base, DictionaryIndex):
+                    self.base.close()
+                self.base = self.open_base()
+            self.overlay = {}
+            self.deleted = set()
+        for key, value in entries:
+            self.overlay[key] = value
+            self.deleted.discard(key)
+
+    def _lookup(self, key):
+        if key in self.overlay:
+            return True
+        return key not in self.deleted and key in self.base
+
+    def refresh(self):
+        # Syncs after a miss, unless nothing can have changed; returns whether it synced
+        if self.journal is None:
+            return False
+        if self.journal.changed() or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+            return True
+        return False
+
+    def __contains__(self, key):
+        if not self._synced:
+            self.sync()
+        if self._lookup(key):
+            return True
+        return self.refresh() and self._lookup(key)
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.overlay:
+            return self.overlay[key]
+        return self.base[key]
+
+    def get_text(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.overlay or not isinstance(self.base, DictionaryIndex):
+            return render_entry(self[key])
+        return self.base.get_text(key)
+
+    def __setitem__(self, key, value):
+        self.overlay[key] = value
+        self.deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.overlay.pop(key, None)
+        if key in self.base:
+            self.deleted.add(key)
+
+    def __iter__(self):
+        self.sync()
+        for key in self.base:
+            if key not in self.overlay and key not in self.deleted:
+                yield key
+        yield from self.overlay
+
+    def __len__(self):
+        self.sync()
+        return len(self.base) - len(self.deleted) + sum(1 for key in self.overlay if key not in self.base)
+
+    def to_dict(self):
+        return {key: self[key] for key in self}
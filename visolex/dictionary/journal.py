@@ -0,0 +1,134 @@
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked
+    fcntl = None
+
+def write_json(filepath, data):
+    """Writes `data` in the format of dictionary.json, atomically."""
+    dirname = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.dictionary-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class DictionaryJournal:
+    """
+    Append-only log of dictionary entries (one json line per entry) sitting next to
+    dictionary.json. Each append is a single locked, fsync'ed write, so several
+    processes can grow the dictionary concurrently and an entry is durable once
+    `append` returns; a line cut short by a crash is ignored on replay.
+    Compaction replaces the journal by an empty file, which readers detect through
+    the change of inode.
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self.offset = 0
+        self.inode = None
+        self.num_entries = 0  # entries read from the current journal file
+
+    @contextmanager
+    def locked(self):
+        """Opens the current journal file for appending, under an exclusive lock."""
+        while True:
+            f = open(self.path, 'a+b')
+            if fcntl is None:
+                break
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            # The journal may have been compacted while waiting for the lock
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+        try:
+            yield f
+        finally:
+            f.close()
+
+    def append(self, nsw, entry):
+        line = json.dumps({'nsw': nsw, 'entry': entry}, ensure_ascii=False) + '\n'
+        with self.locked() as f:
+            # Terminate a line left incomplete by a crashed writer
+            size = os.fstat(f.fileno()).st_size
+            if size > 0 and os.pread(f.fileno(), 1, size - 1) != b'\n':
+                line = '\n' + line
+            f.write(line.encode('utf-8'))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def parse(data):
+        entries = []
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+                entries.append((record['nsw'], record['entry']))
+            except (ValueError, KeyError, TypeError):
+                continue
+        return entries
+
+    def read_new(self):
+        """
+        Returns (entries appended since the last call, reset). `reset` is True when the
+        journal was compacted in the meantime: entries read before are then part of the
+        base dictionary.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            reset = self.offset > 0
+            self.offset, self.inode, self.num_entries = 0, None, 0
+            return [], reset
+        reset = (self.inode is not None and stat.st_ino != self.inode) or stat.st_size < self.offset
+        if reset:
+            self.offset, self.num_entries = 0, 0
+        self.inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return [], reset
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        # Only complete lines are consumed, a partial one is read again next time
+        data = data[:data.rfind(b'\n') + 1]
+        self.offset += len(data)
+        entries = self.parse(data.decode('utf-8', errors='replace'))
+        self.num_entries += len(entries)
+        return entries, reset
+
+    def changed(self):
+        """True if the journal was appended to or replaced since the last `read_new` (one stat)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.inode is not None
+        return stat.st_ino != self.inode or stat.st_size != self.offset
+
+    def compact(self, merge):
+        """
+        Calls `merge(entries)` with every entry of the journal while holding its lock,
+        then replaces the journal by an empty one.
+        """
+        with self.locked() as f:
+            with open(self.path, 'rb') as reader:
+                entries = self.parse(reader.read().decode('utf-8', errors='replace'))
+            merge(entries)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), prefix='.journal-')
+            os.close(fd)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
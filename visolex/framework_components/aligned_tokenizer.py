@@ -1,111 +1,109 @@
-from visolex.utils import run_strip_accents
-from visolex.global_variables import MASK_TOKEN, NULL_STR
-
-def remove_diacritics(sent_list, rm_accent_ratio):
-    new_sent_list = []
-    for sent in sent_list:
-        word_list = []
-        for word in sent:
-            new_word = run_strip_accents(word, rm_accent_ratio)
-            word_list.append(new_word)
-        new_sent_list.append(word_list)
-    return new_sent_list
-
-def aligned_tokenize(data, tokenizer, method, lower_case, rm_accent_ratio, strip_accents):
-    tokenized_src_ls = []
-    tokenized_tgt_ls = [] if method != "unlabeled" else None
-    aligned_idx_ls = []
-    weak_label_ls = []
-    sent_len_ls = []
+import numpy as np
+from itertools import chain
+from visolex.utils import pad_batch
+from visolex.global_variables import MASK_TOKEN, NULL_STR, BOS_TOKEN, EOS_TOKEN, PAD_TOKEN
+from visolex.framework_components.augmentation import AccentStripper
 
+def remove_diacritics(sent_list, rm_accent_ratio, rng=None):
+    # rng: numpy Generator (default: unseeded)
+    return AccentStripper(rm_accent_ratio).strip_sentences(sent_list, rng)
+
+def tokenize_words(tokenizer, words):
+    """
+    Token ids of every word (as tokenizer.tokenize then convert_tokens_to_ids), as a
+    flat array with word offsets. Fast tokenizers encode all words in one batch.
+    """
+    if getattr(tokenizer, 'is_fast', False) and words:
+        encodings = tokenizer(words, add_special_tokens=False)
+        tokenized = [encodings.tokens(i) for i in range(len(words))]
+    else:
+        tokenized = [tokenizer.tokenize(word) for word in words]
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum([len(tokens) for tokens in tokenized], out=offsets[1:])
+    token_ids = np.array(tokenizer.convert_tokens_to_ids(list(chain.from_iterable(tokenized))), dtype=np.int64)
+    return token_ids, offsets
+
+def aligned_token_ids(token_ids, offsets, word_ids, num_tokens, pad_id):
+    """
+    Token ids of the words `word_ids` (indices in tokenize_words), each one truncated or
+    padded with `pad_id` to `num_tokens` tokens. Returns a flat array of sum(num_tokens).
+    """
+    lengths = offsets[word_ids + 1] - offsets[word_ids]
+    starts = np.repeat(np.cumsum(num_tokens) - num_tokens, num_tokens)
+    position = np.arange(num_tokens.sum()) - starts  # position of the token inside its word
+    word = np.repeat(np.arange(len(word_ids)), num_tokens)
+    padded = position >= lengths[word]
+    # Padded positions read a dummy token, then replaced by pad_id
+    index = np.where(padded, len(token_ids), offsets[word_ids][word] + position)
+    return np.where(padded, pad_id, np.append(token_ids, pad_id)[index])
+
+def split_sentences(values, sent_lens, bos_id=None, eos_id=None):
+    # Flat token level array -> list of sentences (lists), with optional BOS/EOS values
+    bounds = np.concatenate([[0], np.cumsum(sent_lens)]).tolist()
+    values = values.tolist()
+    if bos_id is None:
+        return [values[bounds[i]:bounds[i + 1]] for i in range(len(sent_lens))]
+    return [[bos_id] + values[bounds[i]:bounds[i + 1]] + [eos_id] for i in range(len(sent_lens))]
+
+def aligned_tokenize(data, tokenizer, method, lower_case, rm_accent_ratio, strip_accents, seed=None):
+    # Every distinct word (sources, targets and rule predictions) is tokenized once,
+    # then words are aligned to the number of tokens of their source with array operations:
+    #   * labeled data: the shorter of source/target is padded with <mask>/<space>,
+    #   * rule predictions are padded with <space> or truncated to the (padded) source.
+    labeled = method != "unlabeled"
     ids = data['id'].tolist()
     inputs = remove_diacritics(
-        data['input'].tolist(), rm_accent_ratio
+        data['input'].tolist(), rm_accent_ratio, np.random.default_rng(seed)
     ) if strip_accents else data['input'].tolist()
-    outputs = data['output'].tolist() if method != "unlabeled" else None
+    outputs = data['output'].tolist() if labeled else None
     weak_rules = [col for col in data.columns if col.startswith("rule")]
     weak_labels = data[weak_rules].values
     num_sents = len(data)
     num_rules = weak_labels.shape[1]
 
-    for i in range(num_sents):
-        tokenized_src = []
-        tokenized_tgt = []
-        aligned_idx = []
-        tokenized_rule_preds = []
-
-        input_seq = inputs[i]
-        output_seq = outputs[i] if method != "unlabeled" else None
-        rule_preds = weak_labels[i]
-        if lower_case:
-            input_seq = [token.lower() for token in input_seq]
-            output_seq = [token.lower() for token in output_seq] if method != "unlabeled" else None
-            for j, preds in enumerate(rule_preds):
-                rule_preds[j] = [token.lower() for token in preds]
-        aligned = 0
-        for idx, source_token in enumerate(input_seq):
-            target_token = output_seq[idx] if method != "unlabeled" else None
-            rule_pred = [pred[idx] for pred in rule_preds]
-            tokenized_source = tokenizer.tokenize(source_token)
-            tokenized_target = tokenizer.tokenize(target_token) if method != "unlabeled" else None
- 
-            if method != "unlabeled":
-                len_diff = len(tokenized_source) - len(tokenized_target)
-                if len_diff < 0:
-                    tokenized_source.extend([MASK_TOKEN]*abs(len_diff))
-                elif len_diff > 0:
-                    tokenized_target.extend([NULL_STR]*len_diff)
-                
-            tokenized_rule_pred = [tokenizer.tokenize(token) for token in rule_pred]
-            for j, pred in enumerate(tokenized_rule_pred):
-                if len(pred) < len(tokenized_source):
-                    tokenized_rule_pred[j].extend([NULL_STR]*(len(tokenized_source)-len(pred)))
-                elif len(pred) > len(tokenized_source):
-                    tokenized_rule_pred[j] = pred[:len(tokenized_source)]
-
-            tokenized_src.extend(tokenized_source)
-            if method != "unlabeled":
-                tokenized_tgt.extend(tokenized_target)
-            aligned_idx.extend([aligned]*len(tokenized_source))
-            aligned += 1
-
-            if not tokenized_rule_preds:
-                tokenized_rule_preds = tokenized_rule_pred
-            else:
-                for j in range(num_rules):
-                    tokenized_rule_preds[j].extend(tokenized_rule_pred[j])
-
-        add_special_token(tokenized_src)
-        if method != "unlabeled":
-            add_special_token(tokenized_tgt)
-        for j in range(len(tokenized_rule_preds)):
-            add_special_token(tokenized_rule_preds[j])
-
-        sent_len = len(tokenized_src)
-            
-        tokenized_src_ls.append(tokenized_src)
-        if method != "unlabeled":
-            tokenized_tgt_ls.append(tokenized_tgt)
-        aligned_idx_ls.append(aligned_idx)
-        weak_label_ls.append(tokenized_rule_preds)
-        sent_len_ls.append(sent_len)
-
-    # Converts tokens to ids
-    input_ids = [tokenizer.convert_tokens_to_ids(sent) for sent in tokenized_src_ls]
-    output_ids = [tokenizer.convert_tokens_to_ids(sent) for sent in tokenized_tgt_ls] if method != "unlabeled" else None
-    for i, weak_labels in enumerate(weak_label_ls):
-        weak_label_ls[i] = [tokenizer.convert_tokens_to_ids(sent) for sent in weak_labels]
-
-    reshaped_weak_label = []
-    for i, sent in enumerate(weak_label_ls):
-        num_rules = len(sent)
-        num_words = len(sent[0])
-        new_sent = []
-        for j in range(num_words):
-            new_sent.append([rule[j] for rule in sent])
-        reshaped_weak_label.append(new_sent)
-    reshaped_weak_label
-          
+    word_lens = np.array([len(sent) for sent in inputs], dtype=np.int64)
+    source_words = list(chain.from_iterable(inputs))
+    target_words = [sent[idx] for sent, n in zip(outputs, word_lens) for idx in range(n)] if labeled else []
+    rule_words = [
+        [weak_labels[i][j][idx] for i in range(num_sents) for idx in range(word_lens[i])]
+        for j in range(num_rules)
+    ]
+    if lower_case:
+        source_words = [word.lower() for word in source_words]
+        target_words = [word.lower() for word in target_words]
+        rule_words = [[word.lower() for word in words] for words in rule_words]
+
+    vocab = {}
+    def word_ids(words):
+        return np.array([vocab.setdefault(word, len(vocab)) for word in words], dtype=np.int64)
+    source_ids = word_ids(source_words)
+    target_ids = word_ids(target_words) if labeled else None
+    rule_ids = [word_ids(words) for words in rule_words]
+    token_ids, offsets = tokenize_words(tokenizer, list(vocab))
+    num_tokens = offsets[source_ids + 1] - offsets[source_ids]
+    if labeled:
+        num_tokens = np.maximum(num_tokens, offsets[target_ids + 1] - offsets[target_ids])
+
+    mask_id, null_id, bos_id, eos_id = tokenizer.convert_tokens_to_ids([MASK_TOKEN, NULL_STR, BOS_TOKEN, EOS_TOKEN])
+    word_sent = np.repeat(np.arange(num_sents), word_lens)  # sentence of every word
+    sent_num_tokens = np.bincount(word_sent, weights=num_tokens, minlength=num_sents).astype(np.int64)
+
+    input_ids = split_sentences(
+        aligned_token_ids(token_ids, offsets, source_ids, num_tokens, mask_id), sent_num_tokens, bos_id, eos_id
+    )
+    output_ids = split_sentences(
+        aligned_token_ids(token_ids, offsets, target_ids, num_tokens, null_id), sent_num_tokens, bos_id, eos_id
+    ) if labeled else None
+    # weak labels: one [num_rules] list per token
+    rule_token_ids = np.stack(
+        [aligned_token_ids(token_ids, offsets, ids_j, num_tokens, null_id) for ids_j in rule_ids], axis=-1
+    )
+    reshaped_weak_label = split_sentences(rule_token_ids, sent_num_tokens, [bos_id] * num_rules, [eos_id] * num_rules)
+    # Index of the source word of every token
+    word_index = np.arange(len(source_ids)) - np.repeat(np.cumsum(word_lens) - word_lens, word_lens)
+    aligned_idx_ls = split_sentences(np.repeat(word_index, num_tokens), sent_num_tokens)
+    sent_len_ls = (sent_num_tokens + 2).tolist()
+
     if method == "unlabeled":
         preprocessed_dataset = {
             'id': ids,
@@ -126,4 +124,116 @@ def aligned_tokenize(data, tokenizer, method, lower_case, rm_accent_ratio, strip
             'weak_labels': reshaped_weak_label,
             'sent_len': sent_len_ls,
         }
-    return preprocessed_dataset
\ No newline at end of file
+    return preprocessed_dataset
+
+def trim_padding(token_ids, pad_id):
+    # Removes the trailing padding of one aligned word
+    end = len(token_ids)
+    while end > 0 and token_ids[end - 1] == pad_id:
+        end -= 1
+    return token_ids[:end]
+
+class AccentAugmenter:
+    """
+    On-the-fly diacritic augmentation of training batches: sentences flagged by the
+    'augment' column get some of their accents stripped (AccentStripper, a new draw per
+    epoch), and only the words that changed are re-tokenized (token ids of stripped word
+    forms are cached) and re-aligned to their target and rule predictions as in
+    aligned_tokenize. Rule predictions are taken from the stored alignment, so a
+    prediction that was truncated there stays truncated.
+    """
+
+    def __init__(self, tokenizer, ratio, seed=None, lower_case=True):
+        self.tokenizer = tokenizer
+        self.lower_case = lower_case
+        self.stripper = AccentStripper(ratio, seed)
+        self.epoch = 0
+        self.token_cache = {}  # word form -> token ids
+        self.mask_id, self.null_id, self.pad_id = tokenizer.convert_tokens_to_ids([MASK_TOKEN, NULL_STR, PAD_TOKEN])
+
+    def tokenize(self, words):
+        missing = list(set(word for word in words if word not in self.token_cache))
+        if missing:
+            token_ids, offsets = tokenize_words(self.tokenizer, missing)
+            token_ids, offsets = token_ids.tolist(), offsets.tolist()
+            for i, word in enumerate(missing):
+                self.token_cache[word] = token_ids[offsets[i]:offsets[i + 1]]
+        return [self.token_cache[word] for word in words]
+
+    def augment_iter(self, dataIter):
+        """Augments the batches of dataIter, with a new draw at every call (epoch)."""
+        rng = self.stripper.rng(self.epoch)
+        self.epoch += 1
+        for batch in dataIter:
+            yield self.augment_batch(batch, rng)
+
+    def augment_batch(self, batch, rng):
+        rows = [i for i, augment in enumerate(batch.get('augment', [])) if augment]
+        if not rows:
+            # Unpadded batches of a token budget (gen_bucketIter) hold sentences of different lengths
+            return pad_batch(batch, self.pad_id) if len(set(batch['sent_len'])) > 1 else batch
+        batch = {key: list(values) for key, values in batch.items()}
+        labeled = batch.get('output_ids') is not None
+        words = [word for i in rows for word in batch['input'][i]]
+        stripped = self.stripper.strip_words(words, rng)
+        # Token ids of the changed words, in order
+        tokenized = iter(self.tokenize([
+            new_word.lower() if self.lower_case else new_word for word, new_word in zip(words, stripped) if new_word != word
+        ]))
+        start = 0
+        for i in rows:
+            num_words = len(batch['input'][i])
+            new_words = stripped[start:start + num_words]
+            start += num_words
+            sent = self.realign(batch, i, new_words, tokenized, labeled)
+            batch['input'][i] = new_words
+            for key, values in sent.items():
+                batch[key][i] = values
+            batch['sent_len'][i] = len(sent['input_ids'])
+        if len(set(batch['sent_len'])) > 1:
+            batch = pad_batch(batch, self.pad_id)
+        return batch
+
+    def realign(self, batch, i, new_words, tokenized, labeled):
+        words = batch['input'][i]
+        input_ids, weak_labels = batch['input_ids'][i], batch['weak_labels'][i]
+        output_ids = batch['output_ids'][i] if labeled else None
+        align_index = batch['align_index'][i]
+        num_rules = len(weak_labels[0])
+        # Tokens of word j are at positions bounds[j] + 1 ... bounds[j + 1] (after BOS)
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(align_index, minlength=len(words)))]).tolist()
+        sent = {
+            'input_ids': [input_ids[0]], 'align_index': [],
+            'weak_labels': [weak_labels[0]], 'output_ids': [output_ids[0]] if labeled else None,
+        }
+        for j, (word, new_word) in enumerate(zip(words, new_words)):
+            segment = slice(bounds[j] + 1, bounds[j + 1] + 1)
+            if new_word == word:
+                source = input_ids[segment]
+                target = output_ids[segment] if labeled else None
+                rules = weak_labels[segment]
+            else:
+                source = next(tokenized)
+                target = trim_padding(output_ids[segment], self.null_id) if labeled else None
+                num_tokens = max(len(source), len(target)) if labeled else len(source)
+                source = source + [self.mask_id] * (num_tokens - len(source))
+                if labeled:
+                    target = target + [self.null_id] * (num_tokens - len(target))
+                rule_tokens = [
+                    trim_padding([labels[r] for labels in weak_labels[segment]], self.null_id)[:num_tokens]
+                    for r in range(num_rules)
+                ]
+                rule_tokens = [tokens + [self.null_id] * (num_tokens - len(tokens)) for tokens in rule_tokens]
+                rules = [list(labels) for labels in zip(*rule_tokens)] if num_rules else [[] for _ in range(num_tokens)]
+            sent['input_ids'].extend(source)
+            sent['weak_labels'].extend(rules)
+            sent['align_index'].extend([j] * len(source))
+            if labeled:
+                sent['output_ids'].extend(target)
+        sent['input_ids'].append(input_ids[-1])
+        sent['weak_labels'].append(weak_labels[-1])
+        if labeled:
+            sent['output_ids'].append(output_ids[-1])
+        else:
+            del sent['output_ids']
+        return sent
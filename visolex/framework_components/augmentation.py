@@ -0,0 +1,60 @@
+import unicodedata
+import numpy as np
+from visolex.global_variables import RM_ACCENTS_DICT
+
+class AccentStripper:
+    """
+    Diacritic augmentation: removes the accents of `ratio` of the characters (rounded
+    down) of every word, chosen at random, as `utils.run_strip_accents` does for one
+    word. Whole batches of words are processed at once on their code points, with a
+    NumPy Generator: `rng(epoch)` draws a new, reproducible augmentation per epoch.
+    """
+
+    def __init__(self, ratio, seed=None):
+        self.ratio = ratio
+        self.seed = seed
+        # code point -> code point without accent
+        self.table = np.arange(max(RM_ACCENTS_DICT) + 1, dtype=np.uint32)
+        for char, stripped in RM_ACCENTS_DICT.items():
+            self.table[char] = stripped
+
+    def rng(self, epoch=None):
+        if self.seed is None:
+            return np.random.default_rng()
+        return np.random.default_rng([self.seed] if epoch is None else [self.seed, epoch])
+
+    def strip_words(self, words, rng=None):
+        """Words with some of their accents removed, in the same order."""
+        if rng is None:
+            rng = self.rng()
+        if not words:
+            return []
+        text = ''.join(words)
+        if not unicodedata.is_normalized("NFC", text):
+            words = [unicodedata.normalize("NFC", word) for word in words]
+            text = ''.join(words)
+        lengths = np.fromiter((len(word) for word in words), dtype=np.int64, count=len(words))
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).copy()
+        word_of_char = np.repeat(np.arange(len(words)), lengths)
+        num_remove = (self.ratio * lengths).astype(np.int64)
+
+        # Characters of every word in random order: the first num_remove ones are stripped
+        order = np.argsort(word_of_char + rng.random(len(codes)), kind='stable')
+        rank = np.arange(len(codes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        selected = order[rank < num_remove[word_of_char]]
+        selected = selected[codes[selected] < len(self.table)]
+        codes[selected] = self.table[codes[selected]]
+
+        stripped = codes.tobytes().decode('utf-32-le')
+        bounds = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+        return [stripped[bounds[i]:bounds[i + 1]] for i in range(len(words))]
+
+    def strip_sentences(self, sents, rng=None):
+        """Same as strip_words, for a list of sentences (lists of words)."""
+        words = self.strip_words([word for sent in sents for word in sent], rng)
+        sentences = []
+        start = 0
+        for sent in sents:
+            sentences.append(words[start:start + len(sent)])
+            start += len(sent)
+        return sentences
@@ -0,0 +1,226 @@
+from collections.abc import Mapping
+import numpy as np
+import pyarrow as pa
+
+# Columns holding one value per token, stored as flat int32 arrays with sentence offsets
+TOKEN_COLUMNS = ['input_ids', 'output_ids', 'align_index', 'weak_labels']
+# Columns holding one word (str) per source word
+WORD_COLUMNS = ['input', 'output']
+
+def to_ragged(sents, dtype=np.int32):
+    # list of sentences (lists of ids, of per-rule id lists or of words) -> (values, offsets)
+    offsets = np.zeros(len(sents) + 1, dtype=np.int64)
+    np.cumsum([len(sent) for sent in sents], out=offsets[1:])
+    values = np.array([token for sent in sents for token in sent], dtype=dtype)
+    return values, offsets
+
+def from_ragged(values, offsets):
+    flat = values.tolist()
+    offsets = offsets.tolist()
+    return [flat[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+def select_rows(rows, num_rows, indices):
+    """
+    Composes a row selection (None for all `num_rows` rows, a range or an index array)
+    with `indices` (a slice or integer indices into the selection).
+    """
+    if rows is None:
+        rows = range(num_rows)
+    if isinstance(indices, slice):
+        return rows[indices]
+    indices = np.asarray(indices, dtype=np.int64)
+    indices = np.where(indices < 0, indices + len(rows), indices)
+    if isinstance(rows, range):
+        return rows.start + rows.step * indices
+    return rows[indices]
+
+class RaggedArray:
+    """
+    Rows of variable length (e.g. the token ids of every sentence) stored as one flat
+    `values` array and `offsets`: row i is values[offsets[i]:offsets[i + 1]], a list
+    when accessed. `rows` selects the visible rows (a range or an index array), so that
+    slicing or taking rows returns a view over the same values.
+    """
+
+    def __init__(self, values, offsets, rows=None):
+        self.values = values
+        self.offsets = offsets
+        self.rows = rows
+
+    @classmethod
+    def from_lists(cls, sents, dtype=np.int32):
+        return cls(*to_ragged(sents, dtype=dtype))
+
+    @classmethod
+    def concatenate(cls, arrays):
+        parts = [array.compact() for array in arrays]
+        sizes = np.cumsum([0] + [len(values) for values, _ in parts[:-1]])
+        offsets = np.concatenate(
+            [parts[0][1][:1]] + [offsets[1:] - offsets[0] + size for (_, offsets), size in zip(parts, sizes)]
+        )
+        return cls(np.concatenate([values for values, _ in parts]), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1 if self.rows is None else len(self.rows)
+
+    def row_indices(self):
+        return np.arange(len(self)) if self.rows is None else np.asarray(self.rows)
+
+    def lengths(self):
+        return np.diff(self.offsets)[self.row_indices()]
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            if not -len(self) <= item < len(self):
+                raise IndexError("row index {} out of range".format(item))
+            row = item % len(self) if self.rows is None else self.rows[item]
+            return self.values[self.offsets[row]:self.offsets[row + 1]].tolist()
+        return RaggedArray(self.values, self.offsets, select_rows(self.rows, len(self.offsets) - 1, item))
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __eq__(self, other):
+        if isinstance(other, RaggedArray):
+            other = other.tolist()
+        return self.tolist() == list(other)
+
+    def tolist(self):
+        return from_ragged(*self.compact())
+
+    def compact(self):
+        """(values, offsets) of the visible rows only, offsets starting at 0."""
+        if self.rows is None:
+            return self.values, self.offsets - self.offsets[0]
+        if isinstance(self.rows, range) and self.rows.step == 1:
+            start, end = self.offsets[self.rows.start], self.offsets[self.rows.stop]
+            return self.values[start:end], self.offsets[self.rows.start:self.rows.stop + 1] - start
+        rows = np.asarray(self.rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Position of every value of the visible rows in self.values
+        index = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return self.values[index], offsets
+
+    def to_arrow(self):
+        """The rows as an Arrow list array, sharing the values when they are contiguous."""
+        values, offsets = self.compact()
+        if values.ndim == 2:
+            flat = pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), values.shape[1])
+        else:
+            flat = pa.array(values)
+        return pa.ListArray.from_arrays(pa.array(offsets.astype(np.int32)), flat)
+
+class ColumnStore(Mapping):
+    """
+    Columns of a dataset (dictionary: column - one value per sentence). Token and word
+    columns are RaggedArrays, the other ones (id, sent_len) 1D arrays. `take` selects
+    sentences without copying the token data, so several datasets can share one store.
+    """
+
+    def __init__(self, columns):
+        self.columns = dict(columns)
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, ColumnStore):
+            return data
+        columns = {}
+        for column, values in data.items():
+            if isinstance(values, (RaggedArray, np.ndarray)):
+                columns[column] = values
+            elif column in WORD_COLUMNS:
+                columns[column] = RaggedArray.from_lists(values, dtype=object)
+            elif column in TOKEN_COLUMNS:
+                columns[column] = RaggedArray.from_lists(values)
+            else:
+                columns[column] = np.asarray(values)
+        return cls(columns)
+
+    @classmethod
+    def concatenate(cls, stores):
+        columns = {}
+        for column, values in stores[0].items():
+            parts = [store[column] for store in stores]
+            if isinstance(values, RaggedArray):
+                columns[column] = RaggedArray.concatenate(parts)
+            else:
+                columns[column] = np.concatenate(parts)
+        return cls(columns)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        # Number of columns, as for a dictionary. See num_rows for the number of sentences.
+        return len(self.columns)
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping) or list(self) != list(other):
+            return False
+        for column, values in self.items():
+            if isinstance(values, RaggedArray):
+                if values != other[column]:
+                    return False
+            elif not np.array_equal(values, np.asarray(other[column])):
+                return False
+        return True
+
+    @property
+    def num_rows(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def take(self, indices):
+        """Sentences at `indices` (a slice or integer indices), as a view."""
+        return ColumnStore({column: values[indices] for column, values in self.columns.items()})
+
+    def to_arrow(self):
+        arrays = [
+            values.to_arrow() if isinstance(values, RaggedArray) else pa.array(np.asarray(values))
+            for values in self.columns.values()
+        ]
+        return pa.Table.from_arrays(arrays, names=list(self.columns))
+
+class BatchView:
+    """
+    Selected rows of a list of batches (e.g. the `predict` outputs, one array, tensor
+    or list per batch): item i is batches[b][indices] for the i-th (b, indices) of `selection`.
+    Rows are only gathered when a batch is accessed.
+    """
+
+    def __init__(self, batches, selection):
+        self.batches = batches
+        self.selection = selection
+
+    @classmethod
+    def keep(cls, batches, keep_indices):
+        # keep_indices: indices of the rows to keep in every batch, empty batches are dropped
+        if isinstance(batches, BatchView):
+            base = batches.selection
+            selection = [
+                (base[i][0], base[i][1][np.asarray(indices, dtype=np.int64)])
+                for i, indices in enumerate(keep_indices) if len(indices)
+            ]
+            return cls(batches.batches, selection)
+        selection = [
+            (i, np.asarray(indices, dtype=np.int64)) for i, indices in enumerate(keep_indices) if len(indices)
+        ]
+        return cls(batches, selection)
+
+    def __len__(self):
+        return len(self.selection)
+
+    def __getitem__(self, item):
+        batch_index, indices = self.selection[item]
+        batch = self.batches[batch_index]
+        if isinstance(batch, list):
+            return [batch[idx] for idx in indices.tolist()]
+        return batch[indices]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
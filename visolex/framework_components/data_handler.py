@@ -1,12 +1,21 @@
 import os
+import zlib
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from torch.utils.data import Dataset
 import numpy as np
 import pandas as pd
-from copy import deepcopy
 from ast import literal_eval
 from itertools import chain
-from visolex.utils import add_special_token
-from visolex.framework_components.aligned_tokenizer import aligned_tokenize
+from datasets import concatenate_datasets
+from visolex.utils import add_special_token, merge_dicts, arrow_dataset
+from visolex.framework_components.aligned_tokenizer import aligned_tokenize, AccentAugmenter
+from visolex.framework_components.preprocessing_cache import PreprocessingCache, cache_key, file_hash
+from visolex.framework_components.columnar import ColumnStore, BatchView
+
+# Number of sentences pre-processed by one task. Accents are stripped with one seed per
+# shard, so results do not depend on the number of workers.
+PREPROCESS_SHARD_SIZE = 10000
 
 
 class DataHandler:
@@ -18,21 +27,82 @@ class DataHandler:
         self.tokenizer = tokenizer
         self.datasets = {}
         self.seed = args.seed
+        # Number of processes pre-processing the data (1: in the main process)
+        self.workers = getattr(args, 'preprocess_workers', 1)
         np.random.seed(self.seed)
 
+    @contextmanager
+    def preprocessing_pool(self):
+        if self.workers <= 1:
+            yield None
+            return
+        with ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(self.tokenizer,)
+        ) as executor:
+            yield executor
+
     def load_dataset(self, method='train'):
-        dataset = WSDataset(self.args, method=method, tokenizer=self.tokenizer, logger=self.logger)
+        with self.preprocessing_pool() as executor:
+            dataset = WSDataset(self.args, method=method, tokenizer=self.tokenizer, logger=self.logger, executor=executor)
         self.datasets[method] = dataset
         return dataset
 
+    def load_datasets(self, methods=('train', 'dev', 'test', 'unlabeled')):
+        """
+        Loads several splits, with their shards pre-processed over a single pool of
+        workers: splits are pre-processed concurrently.
+        """
+        with self.preprocessing_pool() as executor:
+            if executor is None:
+                datasets = [
+                    WSDataset(self.args, method=method, tokenizer=self.tokenizer, logger=self.logger)
+                    for method in methods
+                ]
+            else:
+                with ThreadPoolExecutor(max_workers=len(methods)) as threads:
+                    futures = [
+                        threads.submit(WSDataset, self.args, method, self.tokenizer, self.logger, executor)
+                        for method in methods
+                    ]
+                    datasets = [future.result() for future in futures]
+        for method, dataset in zip(methods, datasets):
+            self.datasets[method] = dataset
+        return datasets
+
     def create_pseudodataset(self, wsdataset):
         dataset = PseudoDataset(self.args, wsdataset, self.logger)
         return dataset
 
 
+def shard_seed(seed, method, shard):
+    return int(np.random.SeedSequence([seed, zlib.crc32(method.encode('utf-8')), shard]).generate_state(1)[0])
+
+def preprocess_shard(data, tokenizer, method, lower_case, rm_accent_ratio, strip_accents, seed):
+    return aligned_tokenize(
+        data=data,
+        tokenizer=tokenizer,
+        method=method,
+        lower_case=lower_case,
+        rm_accent_ratio=rm_accent_ratio,
+        strip_accents=strip_accents,
+        seed=seed,
+    )
+
+_worker_tokenizer = None
+
+def _init_worker(tokenizer):
+    # The tokenizer is sent once to every worker
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+def _preprocess_shard(data, *args):
+    return preprocess_shard(data, _worker_tokenizer, *args)
+
+
 class WSDataset(Dataset):
     # WSDataset: Dataset for Weak Supervision.
-    def __init__(self, args, method, tokenizer, logger=None):
+    def __init__(self, args, method, tokenizer, logger=None, executor=None):
+        # executor: process pool from DataHandler.preprocessing_pool, or None
         super(WSDataset, self).__init__()
         self.args = args
         self.seed = args.seed
@@ -43,23 +113,70 @@ class WSDataset(Dataset):
         self.logger = logger
         self.remove_accents = args.remove_accents
         self.rm_accent_ratio = args.rm_accent_ratio
+        self.executor = executor
         self.data = {}
         self.no_accent_data = {}
+        # Training sentences without accents are drawn on the fly (AccentAugmenter) instead
+        # of being stored in no_accent_data, unless args.online_augmentation = 0
+        self.online_augmentation = bool(
+            self.remove_accents and self.method == 'train' and getattr(args, 'online_augmentation', 1)
+        )
+        self.augmenter = None
+        # Arrow datasets and length-sorted views, built at most once (see sorted_view)
+        self.arrow_datasets = {}
+        self.sorted_views = {}
+        # Preprocessed datasets are cached on disk, set args.preprocess_cache = 0 to disable
+        self.cache = PreprocessingCache(
+            getattr(args, 'preprocess_cache_dir', None) or os.path.join(args.datapath, 'cache')
+        ) if getattr(args, 'preprocess_cache', 1) else None
         self.load_dataset()
         self.num_labels = len(self.tokenizer)
     
     def preprocess(self, data, strip_accents=False):
-        preprocessed_dataset = aligned_tokenize(
-            data=data, 
-            tokenizer=self.tokenizer,
-            method=self.method,
-            lower_case=self.lower_case,
-            rm_accent_ratio=self.rm_accent_ratio,
-            strip_accents=strip_accents,
+        return self.submit_preprocess(data, strip_accents=strip_accents)()
+
+    def submit_preprocess(self, data, strip_accents=False):
+        """Starts pre-processing `data` (on the executor, if any), returns a function giving the result."""
+        starts = range(0, max(len(data), 1), PREPROCESS_SHARD_SIZE)
+        shards = [data.iloc[start:start + PREPROCESS_SHARD_SIZE] for start in starts]
+        shard_args = [
+            (self.method, self.lower_case, self.rm_accent_ratio, strip_accents, shard_seed(self.seed, self.method, i))
+            for i in range(len(shards))
+        ]
+        if self.executor is None:
+            results = [preprocess_shard(shard, self.tokenizer, *args) for shard, args in zip(shards, shard_args)]
+            futures = None
+        else:
+            futures = [self.executor.submit(_preprocess_shard, shard, *args) for shard, args in zip(shards, shard_args)]
+
+        def result():
+            shard_results = results if futures is None else [future.result() for future in futures]
+            # Shards are merged in order
+            return shard_results[0] if len(shard_results) == 1 else merge_dicts(shard_results)
+        return result
+
+    def cached_preprocess(self, raw_data, strip_accents=False):
+        # raw_data: callable returning the CSV data, only read on a cache miss.
+        # Returns a function giving the result, see submit_preprocess.
+        if self.cache is None:
+            return self.submit_preprocess(raw_data(), strip_accents=strip_accents)
+        key = cache_key(
+            self.csv_hash, self.tokenizer, self.method,
+            self.lower_case, self.rm_accent_ratio, self.seed, strip_accents
         )
-        return preprocessed_dataset
+        dataset = self.cache.load(key)
+        if dataset is not None:
+            self.logger.info("Loading pre-processed {} data from cache {}".format(self.method, self.cache.path(key)))
+            return lambda: dataset
+        pending = self.submit_preprocess(raw_data(), strip_accents=strip_accents)
 
-    def load_dataset(self):
+        def result():
+            dataset = pending()
+            self.cache.save(key, dataset)
+            return dataset
+        return result
+
+    def read_csv(self):
         if self.method == "unlabeled":
             converters = {'input': literal_eval, 'regrex_rule': literal_eval, 'dict_rule': literal_eval}
             data = pd.read_csv(self.datapath, converters=converters)
@@ -70,19 +187,81 @@ class WSDataset(Dataset):
             data = pd.read_csv(self.datapath, converters=converters)
             data.columns = ['id', 'original', 'normalized', 'input', 'output', 'rule_01', 'rule_02']
         data = data.dropna(ignore_index=True)
+        return data
+
+    def load_dataset(self):
+        csv_data = []
+        def raw_data():
+            if not csv_data:
+                csv_data.append(self.read_csv())
+            return csv_data[0]
+        if self.cache is not None:
+            self.csv_hash = file_hash(self.datapath)
 
         self.logger.info("Pre-processing {} data for student...".format(self.method))
-        self.data = self.preprocess(data) # dictionary: column - list of values (each_sentence)
-        if self.remove_accents and self.method != 'unlabeled':
+        store_no_accent = self.remove_accents and self.method != 'unlabeled' and not self.online_augmentation
+        data = self.cached_preprocess(raw_data)
+        if store_no_accent:
             self.logger.info("Removing accents of {} data for student...".format(self.method))
-            self.no_accent_data = self.preprocess(data, strip_accents=True)
-            new_dict = {}
-            for key, values in self.no_accent_data.items():
-                new_dict[key] = values + self.data[key]
-            self.no_accent_data = new_dict
+            no_accent_data = self.cached_preprocess(raw_data, strip_accents=True)
+        self.data = ColumnStore.from_dict(data()) # column - values (each_sentence)
+        if store_no_accent:
+            self.no_accent_data = ColumnStore.concatenate([ColumnStore.from_dict(no_accent_data()), self.data])
+
+    def accent_augmenter(self):
+        # Shared across trainings, so that every epoch draws new augmentations
+        if self.augmenter is None:
+            self.augmenter = AccentAugmenter(
+                self.tokenizer, self.rm_accent_ratio, seed=self.seed, lower_case=self.lower_case
+            )
+        return self.augmenter
+
+    def arrow_dataset(self, variant='data'):
+        """
+        Arrow Dataset of `data`, `no_accent_data` or 'augmented': `data` twice with an
+        'augment' column, True on the first copy whose sentences get their accents
+        stripped when drawn (see AccentAugmenter). Built once, then shared.
+        """
+        if variant not in self.arrow_datasets:
+            if variant == 'augmented':
+                original = self.arrow_dataset('data')
+                dataset = concatenate_datasets([
+                    original.add_column('augment', [True] * len(original)),
+                    original.add_column('augment', [False] * len(original)),
+                ])
+            else:
+                dataset = arrow_dataset(getattr(self, variant))
+            self.arrow_datasets[variant] = dataset
+        return self.arrow_datasets[variant]
+
+    def sorted_view(self, remove_accents=False, rows=None):
+        """
+        The dataset sorted by sentence length (stable, as Dataset.sort), as a view of the
+        cached Arrow Dataset through an indices mapping. `rows`: indices of the sentences
+        of `data` to keep (e.g. a PseudoDataset sample), all by default.
+        """
+        if remove_accents and self.online_augmentation:
+            variant = 'augmented'
+            sent_lens = np.tile(self.data['sent_len'], 2)
+            if rows is not None:
+                rows = np.concatenate([rows, np.asarray(rows) + len(self)])
+        elif remove_accents:
+            # Stripped copies are not sampled, as before
+            variant, rows = 'no_accent_data', None
+            sent_lens = self.no_accent_data['sent_len']
+        else:
+            variant = 'data'
+            sent_lens = self.data['sent_len']
+        if rows is None:
+            if variant not in self.sorted_views:
+                order = np.argsort(sent_lens, kind='stable')
+                self.sorted_views[variant] = self.arrow_dataset(variant).select(order)
+            return self.sorted_views[variant]
+        rows = np.asarray(rows, dtype=np.int64)
+        return self.arrow_dataset(variant).select(rows[np.argsort(sent_lens[rows], kind='stable')])
 
     def __len__(self):
-        return len(self.data['id'])
+        return self.data.num_rows
 
     def __getitem__(self, item):
         ret = {
@@ -107,49 +286,47 @@ class PseudoDataset(Dataset):
         self.method = wsdataset.method
         self.logger = logger
         self.num_labels = wsdataset.num_labels
-        self.logger.info("copying data from {} dataset".format(wsdataset.method))
-        self.original_data = deepcopy(wsdataset.data)
-        self.data = deepcopy(self.original_data)
-        self.no_accent_data = deepcopy(wsdataset.no_accent_data)
+        # Columns are shared with wsdataset, never modified: data is a view of the
+        # sentences selected by downsample / inference_downsample
+        self.wsdataset = wsdataset
+        self.original_data = wsdataset.data
+        self.data = self.original_data
+        self.rows = None  # indices of the sentences of original_data in data, None for all
+        self.no_accent_data = wsdataset.no_accent_data
+        self.online_augmentation = wsdataset.online_augmentation
         self.student_data = {}
         self.teacher_data = {}
-        self.logger.info("done")
 
     def keep(self, keep_indices, type='teacher'):
         self.logger.info("Creating Pseudo Dataset with {} items...".format(len(list(chain.from_iterable(keep_indices)))))
-        new_dict = {}
         data = self.teacher_data if type=='teacher' else self.student_data
-        for key, values in data.items():
-            keep_sents = []
-            for i, indices in enumerate(keep_indices):
-                if len(indices)==0:
-                    continue
-                if key in ['id', 'align_index']:
-                    keep_sent = [values[i][idx] for idx in indices]
-                else:
-                    keep_sent = values[i][np.array(indices)]
-                keep_sents.append(keep_sent)
-            new_dict[key] = keep_sents
+        # Rows are gathered batch by batch when accessed, see BatchView
+        new_dict = {key: BatchView.keep(values, keep_indices) for key, values in data.items()}
         if type=='teacher':
             self.teacher_data = new_dict
         else:
             self.student_data = new_dict
 
     def downsample(self, sample_size):
-        N = len(self.original_data['input'])
+        N = self.original_data.num_rows
         if sample_size > N:
             self.logger.info("[WARNING] sample size = {} > {}".format(sample_size, N))
             sample_size = N
         self.logger.info("Downsampling {} data".format(sample_size))
-        self.data = {}
-        keep_indices = np.random.choice(N, sample_size, replace=False)
-        for key, values in self.original_data.items():
-            self.data[key] = [values[i] for i in keep_indices]
+        self.rows = np.random.choice(N, sample_size, replace=False)
+        self.data = self.original_data.take(self.rows)
     
     def inference_downsample(self, start_idx, end_idx):
         # self.logger.info("Downsampling data from index {} to {}".format(start_idx, end_idx))
-        for key, values in self.original_data.items():
-            self.data[key] = values[start_idx:end_idx]
+        self.rows = np.arange(self.original_data.num_rows)[start_idx:end_idx]
+        self.data = self.original_data.take(self.rows)
+
+    def accent_augmenter(self):
+        return self.wsdataset.accent_augmenter()
+
+    def sorted_view(self, remove_accents=False):
+        # Views of the Arrow Dataset of the source WSDataset, shared across samples
+        return self.wsdataset.sorted_view(remove_accents=remove_accents, rows=self.rows)
 
     def drop(self, col='teacher_labels', value=-1, type='teacher'):
         indices = []
@@ -162,7 +339,7 @@ class PseudoDataset(Dataset):
         self.keep(indices, type=type)
 
     def __len__(self):
-        return len(self.data['id'])
+        return self.data.num_rows
 
     def __getitem__(self, item):
         ret = {
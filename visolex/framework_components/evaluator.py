@@ -1,6 +1,102 @@
 import numpy as np
-from statistics import mean
+from fractions import Fraction
 implemented_metrics = ['accuracy', 'f1_score', 'precision', 'recall']
+METRIC_NAMES = ['precision', 'recall', 'normed_recall', 'f1_score', 'accuracy']
+
+def flatten_segments(arrays):
+    """
+    Concatenates a list of arrays (sentences, or [batch_size, sent_len] batches as
+    returned by `predict`) into one flat array, with the size of every element.
+    """
+    flat = [np.asarray(array).ravel() for array in arrays]
+    lengths = np.fromiter((array.size for array in flat), dtype=np.int64, count=len(flat))
+    values = np.concatenate(flat) if flat else np.zeros(0, dtype=np.int64)
+    return values, lengths
+
+def segment_counts(preds, targets, sources, lengths):
+    """
+    Per segment TP/FP/TN/FN, number of words predicted as need norm and number of
+    correct predictions, for flat `preds`, `targets` and `sources` split in segments
+    of the given `lengths`.
+    """
+    segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+    need_norm = sources != targets
+    correct = preds == targets
+
+    def count(mask):
+        return np.bincount(segment_ids[mask], minlength=len(lengths))
+
+    # TP: number of need norm word are predicted correcly
+    # FP: number of need norm word are predicted wrongly
+    # TN: number of normed word are correcly predicted (not change)
+    # FN: number of normed word are converted to non-standared
+    return {
+        'tp': count(need_norm & correct),
+        'fp': count(need_norm & ~correct),
+        'tn': count(~need_norm & correct),
+        'fn': count(~need_norm & ~correct),
+        'pred_need_norm': count(sources != preds),
+        'correct': count(correct),
+        'total': np.asarray(lengths),
+    }
+
+def safe_divide(numerator, denominator):
+    # numerator / denominator, 0 where the denominator is 0
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+def segment_metrics(counts):
+    """Per segment metrics (in [0, 1]) from `segment_counts`."""
+    r = safe_divide(counts['tp'], counts['tp'] + counts['fp'])
+    p = safe_divide(counts['tp'], counts['pred_need_norm'])
+    return {
+        'precision': p,
+        'recall': r,
+        'normed_recall': safe_divide(counts['tn'], counts['tn'] + counts['fn']),
+        'f1_score': safe_divide(2 * p * r, p + r),
+        'accuracy': counts['correct'] / counts['total'],
+    }
+
+class MetricAccumulator:
+    """
+    Running sums of the per-element metrics, updated batch by batch (e.g. from
+    `predict`) so that no prediction has to be kept. Sums are exact, the result is
+    the same as averaging all per-element metrics at once with statistics.mean.
+    """
+
+    def __init__(self):
+        self.sums = {name: Fraction(0) for name in METRIC_NAMES}
+        self.count = 0
+
+    def update(self, preds, targets, sources, lengths=None):
+        # Same inputs as Evaluator.evaluate
+        if lengths is None:
+            assert len(preds) == len(targets), "pred should have same length as true: pred={} gt={}".format(
+                len(preds),
+                len(targets)
+            )
+            preds, lengths = flatten_segments(preds)
+            targets, target_lengths = flatten_segments(targets)
+            sources, _ = flatten_segments(sources)
+            assert np.array_equal(lengths, target_lengths), "pred and true elements should have the same sizes"
+        else:
+            preds, targets, sources = np.asarray(preds), np.asarray(targets), np.asarray(sources)
+            lengths = np.asarray(lengths)
+        metrics = segment_metrics(segment_counts(preds, targets, sources, lengths))
+        for name, values in metrics.items():
+            # Per-element metrics take few distinct values (ratios of small counts)
+            values, counts = np.unique(values, return_counts=True)
+            self.sums[name] += sum(
+                (Fraction(value) * count for value, count in zip(values.tolist(), counts.tolist())), Fraction(0)
+            )
+        self.count += len(lengths)
+
+    def result(self):
+        """Averaged metrics, in percent."""
+        if self.count == 0:
+            raise ValueError("No prediction to evaluate")
+        return {name: 100 * float(self.sums[name] / self.count) for name in METRIC_NAMES}
 
 class Evaluator:
     # A class that implements all evaluation metrics and prints relevant statistics
@@ -10,56 +106,20 @@ class Evaluator:
         self.metric = args.metric
         assert self.metric in implemented_metrics, "Evaluation metric not implemented: {}".format(self.metric)
 
-    def evaluate(self, preds, targets, sources, comment="", verbose=True):
-        assert len(preds) == len(targets), "pred should have same length as true: pred={} gt={}".format(
-            len(preds),
-            len(labels)
-        )
-        normed_recall = []
-        precision = []
-        recall = []
-        f1_score = []
-        accuracy = []
-
-        for i in range(len(preds)):
-            pred = np.array(preds[i])
-            source = np.array(sources[i])
-            target = np.array(targets[i])
-            total_num = pred.size
-
-            normed = source==target
-            need_norm = source!=target
-            pred_need_norm = np.sum(source!=pred).item()
-
-            # TP: number of need norm word are predicted correcly
-            # FP: number of need norm word are predicted wrongly
-            # TN: number of normed word are correcly predicted (not change)
-            # FN: number of normed word are converted to non-standared
-            tp = np.sum(target[need_norm]==pred[need_norm]).item()
-            fp = np.sum(target[need_norm]!=pred[need_norm]).item()
-            tn = np.sum(target[normed]==pred[normed]).item()
-            fn = np.sum(target[normed]!=pred[normed]).item()
-
-            r = tp/(tp+fp) if (tp+fp) > 0 else 0
-            p = tp/pred_need_norm if pred_need_norm > 0 else 0
-            norm_r = tn/(tn+fn) if (tn+fn) > 0 else 0
-            f1 = (2*p*r)/(p+r) if (p+r) > 0 else 0
-            acc = np.sum(pred==target).item()/total_num
+    def accumulator(self):
+        return MetricAccumulator()
 
-            precision.append(p)
-            recall.append(r)
-            f1_score.append(f1)
-            accuracy.append(acc)
-            normed_recall.append(norm_r)
+    def evaluate(self, preds, targets, sources, comment="", verbose=True, lengths=None):
+        # Metrics are computed for every element of preds (a sentence, or a batch from
+        # `predict`) then averaged. With `lengths`, preds/targets/sources are flat arrays
+        # holding the concatenated elements.
+        accumulator = self.accumulator()
+        accumulator.update(preds, targets, sources, lengths=lengths)
+        return self.report(accumulator, comment)
 
-        res = {
-            'precision': 100 * mean(precision),
-            'recall': 100 * mean(recall),
-            'normed_recall': 100 * mean(normed_recall),
-            'f1_score': 100 * mean(f1_score),
-            'accuracy': 100 * mean(accuracy),
-        }
+    def report(self, accumulator, comment=""):
+        res = accumulator.result()
         res["perf"] = res[self.metric]
 
         self.logger.info("{} performance: {} = {:.2f}%".format(comment, self.metric, res["perf"]))
-        return res
\ No newline at end of file
+        return res
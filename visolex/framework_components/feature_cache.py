@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from visolex.framework_components.topk_proba import TopKProba
+
+TOPK_FIELDS = ['ids', 'vals', 'residual']
+
+class FeatureCache:
+    """
+    Student outputs (encoder features, proba, ...) of every sentence, keyed by
+    (student weights version, dataset id, sentence id), so that the Teacher runs the
+    Student once per dataset as long as its weights do not change. Outputs are stored
+    by batch, in memory or as memory-mapped .npy files under `cache_dir`; with `fp16`,
+    floating point outputs are stored in float16 and returned in their original dtype.
+    TopKProba outputs are stored as their three arrays.
+    Only one version is kept: putting a new one drops the older entries.
+    """
+
+    def __init__(self, cache_dir=None, fp16=False):
+        self.cache_dir = cache_dir
+        self.fp16 = fp16
+        self.version = None
+        self.index = {}  # (dataset, sentence id) -> (block, row)
+        self.blocks = []  # one dictionary (output name - [batch_size, ...] array) per put
+        self.dtypes = {}
+        self.topk_num_labels = {}  # output name - num_labels of TopKProba outputs
+        self.tmp_dir = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def clear(self):
+        self.index = {}
+        self.blocks = []
+        if self.tmp_dir is not None:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            self.tmp_dir = None
+
+    def retain(self, version):
+        # Drops the entries of any other version
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def store(self, block, name, array):
+        self.dtypes[name] = array.dtype
+        if self.fp16 and np.issubdtype(array.dtype, np.floating):
+            array = array.astype(np.float16)
+        if self.cache_dir is None:
+            return array
+        if self.tmp_dir is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='features-')
+        path = os.path.join(self.tmp_dir, '{}.{}.npy'.format(block, name))
+        np.save(path, array)
+        return np.load(path, mmap_mode='r')
+
+    def put(self, version, dataset, sent_ids, outputs):
+        # outputs: output name - [len(sent_ids), ...] array, None values are skipped
+        self.retain(version)
+        block = len(self.blocks)
+        arrays = {}
+        for name, values in outputs.items():
+            if isinstance(values, TopKProba):
+                self.topk_num_labels[name] = values.num_labels
+                for field in TOPK_FIELDS:
+                    key = '{}.{}'.format(name, field)
+                    arrays[key] = self.store(block, key, getattr(values, field))
+            elif values is not None:
+                arrays[name] = self.store(block, name, np.asarray(values))
+        self.blocks.append(arrays)
+        for row, sent_id in enumerate(sent_ids):
+            self.index[(dataset, sent_id)] = (block, row)
+
+    def get(self, version, dataset, sent_ids):
+        """Outputs of the sentences (output name - stacked array), None unless all of them are cached."""
+        if version != self.version or len(sent_ids) == 0:
+            return None
+        locations = [self.index.get((dataset, sent_id)) for sent_id in sent_ids]
+        if any(location is None for location in locations):
+            return None
+        blocks = {block for block, _ in locations}
+        rows = [row for _, row in locations]
+        outputs = {}
+        for name in self.blocks[locations[0][0]]:
+            if len(blocks) == 1 and rows == list(range(rows[0], rows[0] + len(rows))):
+                # Same batch as when stored
+                array = self.blocks[locations[0][0]][name][rows[0]:rows[0] + len(rows)]
+            else:
+                array = np.stack([self.blocks[block][name][row] for block, row in locations])
+            outputs[name] = np.asarray(array, dtype=self.dtypes[name])
+        for name, num_labels in self.topk_num_labels.items():
+            if '{}.ids'.format(name) in outputs:
+                fields = [outputs.pop('{}.{}'.format(name, field)) for field in TOPK_FIELDS]
+                outputs[name] = TopKProba(*fields, num_labels)
+        return outputs
@@ -3,10 +3,10 @@ from collections import OrderedDict
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.nn import CrossEntropyLoss
 from transformers import BartConfig, AutoModel
 from visolex.global_variables import NUM_LABELS_N_MASKS
 from .nsw_detector import BinaryPredictor
+from .loss import token_loss
 
 def gelu(x):
     return x * 0.5 * (1.0 + torch.erf(x / math.sqrt(2.0)))
@@ -109,45 +109,19 @@ class BartPhoForMaskedLM(nn.Module):
         if labels is not None:
             if self.mask_n_predictor is not None:
                 assert labels_n_masks is not None, "ERROR : you provided labels for normalization and self.mask_n_predictor : so you should provide labels_n_mask_prediction"
-                if sample_weights is None:
-                    loss_fct_masks_pred = CrossEntropyLoss(ignore_index=-1)
-                    loss_dict["loss_n_masks_pred"] = loss_fct_masks_pred(
-                        logits_n_mask_prediction.view(-1, self.num_labels_n_mask), labels_n_masks.view(-1)
-                    )
-                else:
-                    loss_fct_masks_pred = CrossEntropyLoss(ignore_index=-1, reduce='none')
-                    loss_dict["loss_n_masks_pred"] = (loss_fct_masks_pred(
-                        logits_n_mask_prediction.view(-1, self.num_labels_n_mask), 
-                        labels_n_masks.view(-1)
-                    ) * sample_weights).mean()
+                loss_dict["loss_n_masks_pred"] = token_loss(
+                    logits_n_mask_prediction, labels_n_masks, attention_mask, sample_weights=sample_weights
+                )
 
             if self.nsw_detector is not None:
                 assert standard_labels is not None, "ERROR : you provided labels for normalization and self.nsw_detector : so you should provide standard_labels"
-                if sample_weights is None:
-                    loss_fct_nsw_pred = CrossEntropyLoss(ignore_index=-1)
-                    loss_dict["loss_nsw_detection"] = loss_fct_nsw_pred(
-                        standard_logits.view(-1, 2), standard_labels.view(-1)
-                    )
-                else:
-                    loss_fct_nsw_pred = CrossEntropyLoss(ignore_index=-1, reduce='none')
-                    loss_dict["loss_nsw_detection"] = (loss_fct_nsw_pred(
-                        standard_logits.view(-1, 2), standard_labels.view(-1)
-                    ) * sample_weights).mean()
-
-            num_labels = self.config.vocab_size + 1
-            masked_lm_labels = labels.view(-1, num_labels) if soft_labels else labels.view(-1)
-
-            if sample_weights is None:
-                loss_fct = CrossEntropyLoss(ignore_index=-1)
-                masked_lm_loss = loss_fct(
-                    prediction_scores.view(-1, num_labels), masked_lm_labels
+                loss_dict["loss_nsw_detection"] = token_loss(
+                    standard_logits, standard_labels, attention_mask, sample_weights=sample_weights
                 )
-            else:
-                loss_fct = CrossEntropyLoss(ignore_index=-1, reduce='none')
-                masked_lm_loss = (loss_fct(
-                    prediction_scores.view(-1, num_labels), masked_lm_labels
-                ) * sample_weights).mean()
-            loss_dict["loss_norm"] = masked_lm_loss
+
+            loss_dict["loss_norm"] = token_loss(
+                prediction_scores, labels, attention_mask, sample_weights=sample_weights, soft_labels=soft_labels
+            )
 
         loss_dict["loss"] = loss_dict["loss_norm"] + loss_dict["loss_n_masks_pred"] + loss_dict["loss_nsw_detection"]
 
@@ -0,0 +1,27 @@
+from torch.nn import CrossEntropyLoss
+
+def token_loss(logits, labels, attention_mask, sample_weights=None, soft_labels=False):
+    """
+    Cross-entropy of every token of a (padded) batch, averaged over its tokens only.
+
+    logits: [batch_size, seq_len, num_labels]; labels: [batch_size, seq_len] label ids
+    (-1: ignored, like padding), or [batch_size, seq_len, num_labels] probabilities with soft_labels;
+    sample_weights: optional [batch_size, seq_len] token weights. Padded positions
+    (attention_mask == 0) neither add to the loss nor count in the average, so a padded
+    batch has the same loss as its sentences without padding.
+    """
+    num_labels = logits.shape[-1]
+    logits = logits.reshape(-1, num_labels)
+    labels = labels.reshape(-1, num_labels) if soft_labels else labels.reshape(-1)
+    if sample_weights is None and not soft_labels:
+        # Padded positions are labeled -1
+        return CrossEntropyLoss(ignore_index=-1)(logits, labels)
+    # ignore_index does not apply to probabilities: padded positions are masked out
+    loss = CrossEntropyLoss(ignore_index=-1, reduction='none')(logits, labels)
+    mask = attention_mask.reshape(-1).to(loss.dtype)
+    if not soft_labels:
+        # Ignored (-1) labels do not count in the average either
+        mask = mask * (labels != -1).to(loss.dtype)
+    if sample_weights is not None:
+        loss = loss * sample_weights.reshape(-1).to(loss.dtype)
+    return (loss * mask).sum() / mask.sum().clamp(min=1)
@@ -3,7 +3,8 @@ import torch
 from .model_construction.bartpho import get_bartpho_normalizer
 from .model_construction.phobert import get_phobert_normalizer
 from .model_construction.visobert import get_visobert_normalizer
-from .trainer_methods import train, predict, inference
+from visolex.global_variables import PAD_TOKEN
+from .trainer_methods import train, predict, inference, batch_inference
 
 class Trainer:
     def __init__(self, args, tokenizer, logger=None):
@@ -47,8 +48,13 @@ class Trainer:
         self.append_n_mask = args.append_n_mask
         self.nsw_detect = args.nsw_detect
         self.topk = args.topk
+        # Keep the top-k Student probabilities of every token instead of the full distribution (0: full)
+        self.proba_topk = getattr(args, 'proba_topk', 0)
+        # Token budget of padded batches of sentences of different lengths (None: one length per batch)
+        self.max_tokens = getattr(args, 'max_tokens', None)
+        self.pad_id = self.tokenizer.convert_tokens_to_ids([PAD_TOKEN])[0]
 
-    def train(self, train_data, dev_data=None): 
+    def train(self, train_data, dev_data=None, augmenter=None): 
         losses, self.model = train(
             logger=self.logger,
             name=self.name,
@@ -66,11 +72,13 @@ class Trainer:
             manual_seed=self.manual_seed,
             use_gpu=self.use_gpu,
             train_data=train_data, 
-            dev_data=dev_data
+            dev_data=dev_data,
+            augmenter=augmenter,
+            max_tokens=self.max_tokens
         )
         return losses
 
-    def finetune(self, train_data, dev_data=None):
+    def finetune(self, train_data, dev_data=None, augmenter=None):
         # Similar to training but with smaller learning rate
         losses, self.model = train(
             logger=self.logger,
@@ -89,7 +97,9 @@ class Trainer:
             manual_seed=self.manual_seed,
             use_gpu=self.use_gpu,
             train_data=train_data, 
-            dev_data=dev_data
+            dev_data=dev_data,
+            augmenter=augmenter,
+            max_tokens=self.max_tokens
         )
         return losses
 
@@ -111,11 +121,12 @@ class Trainer:
             manual_seed=self.manual_seed,
             use_gpu=self.use_gpu,
             train_data=train_data, 
-            dev_data=dev_data
+            dev_data=dev_data,
+            max_tokens=self.max_tokens
         )
         return losses
 
-    def predict(self, data, inference_mode, dataIter=None):
+    def predict(self, data, inference_mode, dataIter=None, accumulator=None, return_outputs=True):
         res = predict(
             model=self.model,
             batch_size=self.eval_batch_size,
@@ -123,7 +134,12 @@ class Trainer:
             nsw_detect=self.nsw_detect,
             data=data, 
             inference_mode=inference_mode, 
-            dataIter=dataIter
+            dataIter=dataIter,
+            accumulator=accumulator,
+            return_outputs=return_outputs,
+            proba_topk=self.proba_topk,
+            max_tokens=self.max_tokens,
+            pad_id=self.pad_id
         )
         return res
 
@@ -137,6 +153,19 @@ class Trainer:
         )
         return output
 
+    def batch_inference(self, user_inputs, batch_size=None):
+        if batch_size is None:
+            batch_size = self.eval_batch_size
+        outputs = batch_inference(
+            tokenizer=self.tokenizer,
+            model=self.model,
+            topk=self.topk,
+            use_gpu=self.use_gpu,
+            user_inputs=user_inputs,
+            batch_size=batch_size
+        )
+        return outputs
+
     def load(self, savefolder):
         # savefolder = ./model_checkpoints/visobert/weakly_supervised_0.0/student_last
         model_file = os.path.join(savefolder, "final_model.pt")
@@ -1,6 +1,7 @@
 from visolex.global_variables import MASK_TOKEN, PAD_TOKEN, NUM_LABELS_N_MASKS
 from .trainer_tools import get_label_n_masks, apply_fine_tuning_strategy
-from visolex.utils import gen_dataIter, add_special_token
+from visolex.utils import gen_dataIter, gen_bucketIter, add_special_token
+from visolex.framework_components.topk_proba import TopKProba
 import torch
 import numpy as np
 
@@ -32,7 +33,11 @@ def epoch_run(
                 output_ids = batch['output_ids']
                 output_tokens_tensor = torch.LongTensor(output_ids)
 
-                input_mask = torch.ones_like(input_tokens_tensor)
+                # Batches are padded when their sentences have different lengths
+                if 'attention_mask' in batch:
+                    input_mask = torch.LongTensor(batch['attention_mask'])
+                else:
+                    input_mask = torch.ones_like(input_tokens_tensor)
                 if use_gpu:
                     input_tokens_tensor = input_tokens_tensor.cuda()
                     output_tokens_tensor = output_tokens_tensor.cuda()
@@ -48,9 +53,11 @@ def epoch_run(
                     labels_n_mask_prediction[input_tokens_tensor == pad_id] = -1
 
                 feeding_the_model_with_label = output_tokens_tensor.clone()
+                feeding_the_model_with_label[input_mask == 0] = -1
 
                 if nsw_detect:
                     standard_labels = (input_tokens_tensor != output_tokens_tensor).long()
+                    standard_labels[input_mask == 0] = -1
 
                     # Masking
                 if optimizer is not None:
@@ -91,8 +98,13 @@ def epoch_run(
         for i in range(num_batch):
             input_ids = batchIter['input_ids'][i]
             input_tokens_tensor = torch.LongTensor(input_ids)
-            output_tokens_tensor = torch.tensor(batchIter['proba'][i]) if soft_labels else torch.LongTensor(batchIter['labels'][i])
-            input_mask = torch.ones_like(input_tokens_tensor)
+            if soft_labels:
+                proba = batchIter['proba'][i]
+                output_tokens_tensor = torch.tensor(proba.dense() if isinstance(proba, TopKProba) else proba)
+            else:
+                output_tokens_tensor = torch.LongTensor(batchIter['labels'][i])
+            # Pseudo-labeled batches come from `predict`, padded under a token budget
+            input_mask = (input_tokens_tensor != pad_id).long()
             if use_gpu:
                 input_tokens_tensor = input_tokens_tensor.cuda()
                 output_tokens_tensor = output_tokens_tensor.cuda()
@@ -109,8 +121,12 @@ def epoch_run(
                     standard_labels = (input_tokens_tensor != output_tokens_tensor.argmax(dim=-1)).long()
                 else:
                     standard_labels = (input_tokens_tensor != output_tokens_tensor).long()
+                standard_labels[input_mask == 0] = -1
 
             feeding_the_model_with_label = output_tokens_tensor.clone()
+            # Padded tokens are left out of the loss through input_mask (see token_loss)
+            if not soft_labels:
+                feeding_the_model_with_label[input_mask == 0] = -1
 
             sample_weights = None
             if loss_weights:
@@ -151,8 +167,13 @@ def train(
     n_epochs, batch_size, fine_tuning_strategy, learning_rate,
     append_n_mask, nsw_detect, soft_labels, loss_weights,
     manual_seed, use_gpu,
-    train_data, dev_data
+    train_data, dev_data,
+    augmenter=None, max_tokens=None
 ): 
+    # augmenter: AccentAugmenter applied to the training batches (see sort_data)
+    # max_tokens: if given, batches hold sentences of close lengths padded to at most
+    #   max_tokens tokens (and at most batch_size sentences) instead of sentences of one length
+    pad_id = tokenizer.convert_tokens_to_ids([PAD_TOKEN])[0]
     if mode != "train_pseudo":
         train_sent_len_ls = list(set(train_data['sent_len']))
     dev_sent_len_ls = list(set(dev_data['sent_len']))
@@ -162,11 +183,23 @@ def train(
 
     for epoch in range(n_epochs):
         if mode != "train_pseudo":
-            trainIter = gen_dataIter(
-                train_data, batch_size, train_sent_len_ls, 
-                shuffle=True, seed=manual_seed
-            )
-        devIter = gen_dataIter(dev_data, batch_size, dev_sent_len_ls)
+            if max_tokens:
+                # Augmentation changes sentence lengths, batches are padded after it
+                trainIter = gen_bucketIter(
+                    train_data, pad_id, batch_size, max_tokens,
+                    shuffle=True, seed=manual_seed, pad=augmenter is None
+                )
+            else:
+                trainIter = gen_dataIter(
+                    train_data, batch_size, train_sent_len_ls, 
+                    shuffle=True, seed=manual_seed
+                )
+            if augmenter is not None:
+                trainIter = augmenter.augment_iter(trainIter)
+        if max_tokens:
+            devIter = gen_bucketIter(dev_data, pad_id, batch_size, max_tokens)
+        else:
+            devIter = gen_dataIter(dev_data, batch_size, dev_sent_len_ls)
 
         optimizer = apply_fine_tuning_strategy(
             name, fine_tuning_strategy, model, 
@@ -228,10 +261,21 @@ def train(
 def predict(
     model, batch_size,
     use_gpu, nsw_detect,
-    data, inference_mode, dataIter
+    data, inference_mode, dataIter,
+    accumulator=None, return_outputs=True, proba_topk=0,
+    max_tokens=None, pad_id=None
 ):
+    # accumulator: MetricAccumulator updated with every labeled batch
+    # return_outputs: with False nothing is kept across batches (returns None), for
+    #   evaluation through the accumulator in O(batch) memory
+    # proba_topk: if > 0, 'proba' holds the top-k labels of every token and the residual
+    #   mass (TopKProba) instead of the full [batch_size, seq_len, num_labels] distribution
+    # max_tokens, pad_id: batches of `data` padded under a token budget (see train). In
+    #   padded batches, preds and is_nsw are -1 at the padded positions
     label = False
-    if data is not None:
+    if data is not None and max_tokens:
+        dataIter = gen_bucketIter(data, pad_id, batch_size=batch_size, max_tokens=max_tokens)
+    elif data is not None:
         len_ls = list(set(data['sent_len']))
         dataIter = gen_dataIter(data, batch_size=batch_size, len_list=len_ls)
     preds = []
@@ -250,7 +294,11 @@ def predict(
                 batch = dataIter.__next__()
                 input_tokens_tensor = batch['input_ids']
                 input_tokens_tensor = torch.LongTensor(input_tokens_tensor)
-                input_mask = torch.ones_like(input_tokens_tensor)
+                padded = 'attention_mask' in batch
+                if padded:
+                    input_mask = torch.LongTensor(batch['attention_mask'])
+                else:
+                    input_mask = torch.ones_like(input_tokens_tensor)
                 if use_gpu:
                     input_tokens_tensor = input_tokens_tensor.cuda()
                     input_mask = input_mask.cuda()
@@ -258,12 +306,27 @@ def predict(
                 _, logits, feature = model(input_tokens_tensor, input_mask)
 
                 pred = torch.argmax(logits["logits_norm"], dim=-1) # [num_words]
+                pred[input_mask == 0] = -1
+                if accumulator is not None and 'output_ids' in batch:
+                    if padded:
+                        # The batch is one element, made of its tokens only
+                        keep = input_mask.bool().cpu().numpy()
+                        accumulator.update(
+                            pred.detach().cpu().numpy()[keep], np.array(batch['output_ids'])[keep],
+                            np.array(batch['input_ids'])[keep], lengths=[keep.sum()]
+                        )
+                    else:
+                        accumulator.update(
+                            [pred.detach().cpu().numpy()], [np.array(batch['output_ids'])], [np.array(batch['input_ids'])]
+                        )
+                if not return_outputs:
+                    continue
                 if not inference_mode:
                     proba = torch.softmax(logits["logits_norm"], dim=-1) # [num_words, num_labels]
 
                 preds.append(pred.detach().cpu().numpy())
                 if not inference_mode:
-                    probas.append(proba.detach().cpu().numpy())
+                    probas.append(TopKProba.from_proba(proba, proba_topk) if proba_topk else proba.detach().cpu().numpy())
                     features.append(feature.detach().cpu().numpy())
                     rule_pred.append(np.array(batch['weak_labels']))
                     if 'output_ids' in batch:
@@ -271,6 +334,7 @@ def predict(
                         output_ids.append(np.array(batch['output_ids']))
                 if nsw_detect:
                     norm_or_not_pred = torch.argmax(logits["logits_nsw_detection"], dim=-1)
+                    norm_or_not_pred[input_mask == 0] = -1
                 sent_ids.append(batch['id'])
                 input_ids.append(np.array(batch['input_ids']))
                 align_index.append(batch['align_index'])
@@ -279,6 +343,8 @@ def predict(
             print("BREAKING DATA ITERATION")
             break
         
+    if not return_outputs:
+        return None
     if inference_mode:
         return {
             "id": sent_ids,
@@ -303,33 +369,65 @@ def predict(
 def inference(
     tokenizer, model, topk, use_gpu, user_input
 ):
-    inputs = tokenizer(user_input, return_tensors="pt")
-    source_tokens = tokenizer.tokenize(user_input)
-    add_special_token(source_tokens)
-    
+    output = batch_inference(
+        tokenizer=tokenizer,
+        model=model,
+        topk=topk,
+        use_gpu=use_gpu,
+        user_inputs=[user_input],
+        batch_size=1
+    )
+    return output[0]
+
+def batch_inference(
+    tokenizer, model, topk, use_gpu, user_inputs, batch_size
+):
+    # Runs one forward pass per padded batch of sentences, then splits the outputs
+    # back per sentence with the same structure as `inference`. Sentences are either
+    # strings or lists of tokens (special tokens included), e.g. tokenized word by word
+    outputs = []
     model.eval()
-    with torch.no_grad():
+    for start_index in range(0, len(user_inputs), batch_size):
+        batch_inputs = user_inputs[start_index:start_index + batch_size]
+        if isinstance(batch_inputs[0], str):
+            inputs = tokenizer(batch_inputs, padding=True, return_tensors="pt")
+        else:
+            batch_ids = [tokenizer.convert_tokens_to_ids(tokens) for tokens in batch_inputs]
+            inputs = tokenizer.pad({'input_ids': batch_ids}, padding=True, return_tensors="pt")
+        input_tokens_tensor = inputs.input_ids
+        input_mask = inputs.attention_mask
         if use_gpu:
-            input_tokens_tensor = inputs.input_ids.cuda()
-            input_mask = inputs.attention_mask.cuda()
-        _, logits, feature = model(input_tokens_tensor, input_mask)
-        # torch.argsort: Returns the indices that sort a tensor along a given dimension in ascending order by value.
-        # sorted, indices = torch.sort(x)
-        # if topk == 1:
-        #     # pred = torch.argmax(logits["logits_norm"], dim=-1).squeeze()
-        #     proba = torch.softmax(logits["logits_norm"], dim=-1)
-        #     proba, pred = torch.sort(proba, descending=True)
-        # else:
-            # pred = torch.argsort(logits["logits_norm"], dim=-1, descending=True)[:, :, :topk].squeeze(0)
-        proba = torch.softmax(logits["logits_norm"], dim=-1)
-        proba, pred = torch.sort(proba, descending=True)
-        pred = pred[:, :, :topk].squeeze()
-        proba = proba[:, :, :topk].squeeze()
-        is_nsw = torch.argmax(logits["logits_nsw_detection"], dim=-1).squeeze()
+            input_tokens_tensor = input_tokens_tensor.cuda()
+            input_mask = input_mask.cuda()
 
-    return {
-        'source_tokens': source_tokens,
-        'pred': pred.cpu().tolist(),
-        'proba': proba.cpu().tolist(),
-        'is_nsw': is_nsw.cpu().tolist()
-    }
\ No newline at end of file
+        with torch.no_grad():
+            _, logits, _ = model(input_tokens_tensor, input_mask)
+            proba = torch.softmax(logits["logits_norm"], dim=-1)
+            proba, pred = torch.topk(proba, topk, dim=-1) # [batch_size, num_words, topk]
+            is_nsw = None
+            if logits["logits_nsw_detection"] is not None:
+                is_nsw = torch.argmax(logits["logits_nsw_detection"], dim=-1)
+
+        input_mask = input_mask.bool().cpu()
+        pred = pred.cpu()
+        proba = proba.cpu()
+        is_nsw = is_nsw.cpu() if is_nsw is not None else None
+        for i, user_input in enumerate(batch_inputs):
+            if isinstance(user_input, str):
+                source_tokens = tokenizer.tokenize(user_input)
+                add_special_token(source_tokens)
+            else:
+                source_tokens = list(user_input)
+            sent_mask = input_mask[i]
+            sent_pred = pred[i][sent_mask]
+            sent_proba = proba[i][sent_mask]
+            if topk == 1:
+                sent_pred = sent_pred.squeeze(-1)
+                sent_proba = sent_proba.squeeze(-1)
+            outputs.append({
+                'source_tokens': source_tokens,
+                'pred': sent_pred.tolist(),
+                'proba': sent_proba.tolist(),
+                'is_nsw': is_nsw[i][sent_mask].tolist() if is_nsw is not None else None
+            })
+    return outputs
@@ -47,18 +47,24 @@ def apply_fine_tuning_strategy(model_name, fine_tuning_strategy, model, lr_init,
     return optimizer
 
 def get_label_n_masks(input, num_labels_n_masks):
-    output = torch.empty_like(input).long()
-    for ind_sent in range(input.size(0)):
-        count = 0
-        for ind_word in range(input.size(1)):
-            if input[ind_sent, ind_word] == 1:
-                output[ind_sent, ind_word] = -1
-                if count == 0:
-                    ind_multi_bpe = ind_word - 1
-                count += 1
-            elif input[ind_sent, ind_word] == 0:
-                if ind_word > 0 and input[ind_sent, ind_word -1] == 1:
-                    output[ind_sent, ind_multi_bpe] = min(count, num_labels_n_masks-1)
-                    count = 0
-                output[ind_sent, ind_word] = 0
-    return output
\ No newline at end of file
+    # input: [batch_size, seq_len] boolean mask of <mask> tokens.
+    # Mask positions get -1; the token right before a run of masks gets the run length
+    # (clipped to num_labels_n_masks-1) when the run is closed by a non-mask token.
+    is_mask = input.bool()
+    output = torch.where(is_mask, -1, 0).long()
+    if is_mask.size(1) < 2:
+        return output
+
+    # Length of the run of masks ending at each position
+    cum_masks = torch.cumsum(is_mask.long(), dim=1)
+    last_non_mask = torch.cummax(torch.where(is_mask, 0, cum_masks), dim=1).values
+    run_lengths = cum_masks - last_non_mask
+
+    closed = is_mask[:, :-1] & ~is_mask[:, 1:]
+    ind_sent, ind_last_mask = closed.nonzero(as_tuple=True)
+    counts = run_lengths[ind_sent, ind_last_mask]
+    ind_multi_bpe = ind_last_mask - counts
+    # Runs starting at the first position have no preceding token to carry the label
+    keep = ind_multi_bpe >= 0
+    output[ind_sent[keep], ind_multi_bpe[keep]] = torch.clamp(counts[keep], max=num_labels_n_masks-1)
+    return output
@@ -0,0 +1,104 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from visolex.framework_components.columnar import (
+    TOKEN_COLUMNS, ColumnStore, RaggedArray, to_ragged
+)
+
+CACHE_VERSION = 3
+# Token-level columns, stored as flat NumPy shards (values + sentence offsets)
+RAGGED_COLUMNS = TOKEN_COLUMNS
+INT_COLUMNS = ['sent_len']
+
+def file_hash(path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def cache_key(csv_hash, tokenizer, method, lower_case, rm_accent_ratio, seed, strip_accents):
+    """Identifies the output of aligned_tokenize for one CSV file and one configuration."""
+    config = {
+        'version': CACHE_VERSION,
+        'csv': csv_hash,
+        'tokenizer': [type(tokenizer).__name__, tokenizer.name_or_path, len(tokenizer)],
+        'method': method,
+        'lower_case': bool(lower_case),
+        'rm_accent_ratio': float(rm_accent_ratio),
+        'seed': seed,
+        'strip_accents': bool(strip_accents),
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+class PreprocessingCache:
+    """
+    On-disk cache of preprocessed (aligned tokenized) datasets. Every entry is a
+    directory named by its `cache_key` with one `<column>.values.npy` and
+    `<column>.offsets.npy` pair per token-level column (memory-mappable), the
+    sentence lengths and the remaining columns (id, input, output) in json.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.path(key), 'columns.json'))
+
+    def load_arrays(self, key, column):
+        """(values, offsets) of a token-level column, memory-mapped."""
+        path = self.path(key)
+        return (
+            np.load(os.path.join(path, '{}.values.npy'.format(column)), mmap_mode='r'),
+            np.load(os.path.join(path, '{}.offsets.npy'.format(column)), mmap_mode='r'),
+        )
+
+    def load(self, key):
+        """The cached dataset (ColumnStore over the memory-mapped shards), or None."""
+        if key not in self:
+            return None
+        path = self.path(key)
+        with open(os.path.join(path, 'columns.json'), 'r', encoding='utf-8') as f:
+            columns = json.load(f)
+        dataset = {}
+        for column in columns['order']:
+            if column in RAGGED_COLUMNS:
+                dataset[column] = RaggedArray(*self.load_arrays(key, column))
+            elif column in INT_COLUMNS:
+                dataset[column] = np.load(os.path.join(path, '{}.npy'.format(column)))
+            else:
+                dataset[column] = columns['values'][column]
+        return ColumnStore.from_dict(dataset)
+
+    def save(self, key, dataset):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            columns = {'order': list(dataset), 'values': {}}
+            for column, values in dataset.items():
+                if column in RAGGED_COLUMNS:
+                    values, offsets = values.compact() if isinstance(values, RaggedArray) else to_ragged(values)
+                    np.save(os.path.join(tmp_path, '{}.values.npy'.format(column)), values)
+                    np.save(os.path.join(tmp_path, '{}.offsets.npy'.format(column)), offsets)
+                elif column in INT_COLUMNS:
+                    np.save(os.path.join(tmp_path, '{}.npy'.format(column)), np.array(values, dtype=np.int64))
+                else:
+                    columns['values'][column] = values if isinstance(values, list) else values.tolist()
+            # Written last: an entry is complete once columns.json exists
+            with open(os.path.join(tmp_path, 'columns.json'), 'w', encoding='utf-8') as f:
+                json.dump(columns, f, ensure_ascii=False)
+            os.chmod(tmp_path, 0o755)
+            try:
+                os.rename(tmp_path, self.path(key))
+            except OSError:
+                # Saved concurrently by another process
+                shutil.rmtree(tmp_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
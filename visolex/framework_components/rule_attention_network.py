@@ -5,6 +5,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
+from visolex.framework_components.topk_proba import TopKProba
 
 class RuleAttentionNetwork(nn.Module):
     def __init__(self, student_emb_dim, num_rules, num_labels, dense_dropout=0.3, device="cuda", seed=42):
@@ -31,7 +32,14 @@ class RuleAttentionNetwork(nn.Module):
         nn.init.xavier_uniform_(self.rule_embed.weight) # Xavier uniform initializer
         nn.init.uniform_(self.rule_bias.weight)
 
-    def forward(self, student_embeddings, rule_ids, rule_preds_onehot):
+    def forward(self, student_embeddings, rule_ids, rule_label_ids, student_proba=None, return_proba=True):
+        # rule_label_ids: batch_size x seq_len x max_rule_seq_length label index predicted by each rule,
+        #   self.num_labels for padded (not fired) rules
+        # student_proba: batch_size x seq_len x num_labels soft Student predictions, or their
+        #   top-k form (see student_proba_tensors), which then take the first rule slot
+        # return_proba: if False (and the Student is not a dense distribution), skip the dense
+        #   batch_size x seq_len x num_labels distribution and return its sparse form
+        #   (see sparse_rule_proba)
         # Process student embeddings
         x_hidden = self.dense(student_embeddings)  # batch_size x 128
         
@@ -44,13 +52,30 @@ class RuleAttentionNetwork(nn.Module):
         # att_scores = torch.bmm(x_hidden.unsqueeze(1), rule_embeddings.transpose(1, 2)).squeeze(1)
         att_scores += rule_biases
         att_sigmoid_proba = torch.sigmoid(att_scores)
+
+        rule_mask = rule_label_ids < self.num_labels
+        if student_proba is not None:
+            rule_mask = torch.cat([torch.ones_like(rule_mask[..., :1]), rule_mask[..., 1:]], dim=-1)
+        student_topk = student_proba if isinstance(student_proba, dict) else None
+        if not return_proba and (student_proba is None or student_topk is not None):
+            outputs = sparse_rule_proba(
+                rule_label_ids, att_sigmoid_proba, rule_mask, self.num_labels, student_topk=student_topk
+            )
+            return outputs, att_sigmoid_proba
+        if student_topk is not None:
+            student_proba = topk_to_dense(student_topk, self.num_labels)
         
-        # Compute raw outputs
-        outputs = torch.matmul(att_sigmoid_proba.float().unsqueeze(2), rule_preds_onehot.float()).squeeze(2)
-        # att_scores = torch.bmm(x_hidden.unsqueeze(1), rule_embeddings.transpose(1, 2)).squeeze(1)
+        # Compute raw outputs: scatter attention onto predicted labels (padded rules land
+        # in an extra column that is dropped) instead of a matmul with one-hot predictions
+        outputs = torch.zeros(
+            rule_label_ids.shape[:-1] + (self.num_labels + 1,), device=att_sigmoid_proba.device
+        )
+        outputs = outputs.scatter_add(-1, rule_label_ids, att_sigmoid_proba.float())[..., :-1]
+        if student_proba is not None:
+            outputs = outputs + att_sigmoid_proba[..., :1].float() * student_proba.float()
 
         # Normalize Outputs with random rule and L1 normalization
-        outputs = normalize_with_random_rule(outputs, att_sigmoid_proba, rule_preds_onehot)
+        outputs = normalize_with_random_rule(outputs, att_sigmoid_proba, rule_mask)
         outputs = l1_normalize(outputs, self.num_labels)
 
         return outputs, att_sigmoid_proba
@@ -84,37 +109,43 @@ class RAN:
         self.num_rules += 1
         self.student_rule_id = self.num_rules
         self.hard_student_rule = args.hard_student_rule
+        # Soft pseudo-labels keep the top-k labels of every token (0: full distribution)
+        self.proba_topk = getattr(args, 'proba_topk', 0)
         self.trained = False
         self.xdim = None
         self.ignore_student = False
 
     def postprocess_rule_preds(self, rule_pred, student_pred=None):
+        """
+        Turns rule predictions (N x M x num_rules token ids, -1 when a rule does not fire)
+        into index arrays: fired rules are moved to the front, `fired_rule_ids` holds their
+        ids (0 for padding) and `rule_label_ids` their predicted labels (self.num_labels
+        for padding). The Student is prepended as an extra rule: as a label index when
+        `hard_student_rule` is set, otherwise through the returned soft `student_proba`
+        (an array, or a TopKProba for top-k Student probabilities).
+        """
         N, M = rule_pred.shape[0], rule_pred.shape[1]
         rule_mask = (rule_pred != -1).astype(int) # Have applied rules
-        fired_rule_ids = [[(np.nonzero(x)[0] + 1).tolist() for x in line] for line in rule_mask]
-        non_zero_rule_pred = []
-        for i in range(N):
-            preds_i = []
-            for j, fired_rules in enumerate(fired_rule_ids[i]):
-                preds_i_j = [rule_pred[i, j, id-1] for id in fired_rules]
-                preds_i_j = preds_i_j + [self.num_labels] * (self.num_rules-1 - len(preds_i_j))
-                preds_i.append(preds_i_j)
-            non_zero_rule_pred.append(preds_i)
-        
-        one_hot_rule_pred = np.eye(self.num_labels + 1)[np.array(non_zero_rule_pred)]
-        one_hot_rule_pred = one_hot_rule_pred[:, :, :, :-1]
-        fired_rule_ids = [[x + [0] * (self.num_rules-1 - len(x)) for x in sent] for sent in fired_rule_ids]
-        fired_rule_ids = np.array(fired_rule_ids)
+        # Stable sort puts fired rules first while keeping their order
+        order = np.argsort(1 - rule_mask, axis=-1, kind='stable')
+        fired = np.take_along_axis(rule_mask, order, axis=-1).astype(bool)
+        fired_rule_ids = np.where(fired, order + 1, 0)
+        rule_label_ids = np.where(fired, np.take_along_axis(rule_pred, order, axis=-1), self.num_labels)
 
+        student_proba = None
         if student_pred is not None:
             mask_one = np.ones((N, M, 1))
+            # Top-k Student probabilities (predict's proba_topk) are kept in top-k form:
+            # np.argmax works on it and the RAN aggregates it sparsely
             if student_pred.ndim > 3:
                 student_pred = np.squeeze(student_pred, axis=None)
             if self.hard_student_rule:
                 # Convert Student's soft probabilities to hard labels
-                student_pred = np.eye(self.num_labels)[np.argmax(student_pred, axis=-1)]
-            student_pred = student_pred[..., np.newaxis, :]  # Add axis=2
-            one_hot_rule_pred = np.concatenate([student_pred, one_hot_rule_pred], axis=2)
+                student_label_ids = np.argmax(student_pred, axis=-1)[..., np.newaxis]
+            else:
+                student_label_ids = np.full((N, M, 1), self.num_labels)
+                student_proba = student_pred
+            rule_label_ids = np.concatenate([student_label_ids, rule_label_ids], axis=-1)
             rule_mask = np.concatenate([mask_one, rule_mask], axis=2)
             if not self.ignore_student:
                 student_rule_id = np.ones((N, M, 1)) * self.student_rule_id
@@ -122,7 +153,7 @@ class RAN:
                 student_rule_id = np.zeros((N, M, 1))
             fired_rule_ids = np.concatenate([student_rule_id, fired_rule_ids], axis=-1)
 
-        return rule_mask, fired_rule_ids, one_hot_rule_pred
+        return rule_mask, fired_rule_ids, rule_label_ids, student_proba
 
     def init_model(self):
         self.model = RuleAttentionNetwork(self.xdim,
@@ -140,27 +171,29 @@ class RAN:
             x = torch.tensor(data['features'][i])
             student_pred = data['proba'][i]
             rule_pred = data['weak_labels'][i]
-            rule_one_hot, fired_rule_ids, rule_pred = self.postprocess_rule_preds(rule_pred, student_pred)
+            _, fired_rule_ids, rule_label_ids, student_proba = self.postprocess_rule_preds(rule_pred, student_pred)
             fired_rule_ids = torch.LongTensor(fired_rule_ids)
-            rule_pred = torch.LongTensor(rule_pred)
+            rule_label_ids = torch.LongTensor(rule_label_ids)
+            if student_proba is not None:
+                student_proba = student_proba_tensors(student_proba, self.use_gpu)
             if self.use_gpu:
                 x = x.cuda()
                 fired_rule_ids = fired_rule_ids.cuda()
-                rule_pred = rule_pred.cuda()
+                rule_label_ids = rule_label_ids.cuda()
             if mode != 'unsup_train':
                 y = torch.tensor(data['output_ids'][i])
                 if self.use_gpu:
                     y = y.cuda()
             if mode in ['sup_train', 'unsup_train']:
                 optimizer.zero_grad()
-                outputs, _ = self.model(x, fired_rule_ids, rule_pred)
-                loss = loss_fn(outputs) if mode=='unsup_train' else loss_fn(outputs.view(-1, self.num_labels), y.view(-1))
+                outputs, _ = self.model(x, fired_rule_ids, rule_label_ids, student_proba, return_proba=False)
+                loss = loss_fn(outputs) if mode=='unsup_train' else loss_fn(outputs, y)
                 total_loss += loss.detach()
                 loss.backward()
                 optimizer.step()
             else:
-                outputs_dev, _ = self.model(x, fired_rule_ids, rule_pred)
-                dev_loss = loss_fn(outputs_dev.view(-1, self.num_labels), y.view(-1))
+                outputs_dev, _ = self.model(x, fired_rule_ids, rule_label_ids, student_proba, return_proba=False)
+                dev_loss = loss_fn(outputs_dev, y)
                 total_loss += dev_loss.detach()
         if mode == 'unsup_train':
             scheduler.step()
@@ -177,7 +210,7 @@ class RAN:
         
         self.logger.info("\n\n\t\t*** Training RAN ***")
 
-        loss_fn = MinEntropyLoss()
+        loss_fn = MinEntropyLoss(self.num_labels)
         optimizer = optim.Adam(self.model.parameters())
         scheduler = create_learning_rate_scheduler(optimizer,
                                                    max_learn_rate=1e-2,
@@ -194,7 +227,7 @@ class RAN:
             self.logger.info("Unsupervised trainning: EPOCH {}/{} - LOSS: {}".format(epoch+1, self.sup_epochs, unsup_loss))
 
         # Reinitialize loss function and optimizer for supervised training
-        loss_fn = nn.CrossEntropyLoss(ignore_index=self.num_labels)
+        loss_fn = RuleCrossEntropyLoss(self.num_labels, ignore_index=self.num_labels)
         optimizer = optim.Adam(self.model.parameters())
         scheduler = create_learning_rate_scheduler(optimizer,
                                                    max_learn_rate=1e-2,
@@ -228,10 +261,14 @@ class RAN:
             'best_dev_loss': best_val_loss.item(),
         }
 
-    def predict_ran(self, dataset, batch_size=128, inference_mode=False):
+    def predict_ran(self, dataset, batch_size=128, inference_mode=False, return_proba=False):
+        # return_proba: also return the dense num_labels distribution of every token
+        #   (e.g. for soft pseudo-labels), in top-k form with args.proba_topk; max_proba
+        #   is always returned
         y_preds = []
         att_scores = []
         soft_probas = []
+        max_probas = []
         rule_masks = []
 
         label = False
@@ -252,29 +289,39 @@ class RAN:
                 random_pred = torch.tensor(random_pred)
                 if self.use_gpu:
                     random_pred = random_pred.cuda()
-                rule_mask, fired_rule_ids, rule_pred_one_hot = self.postprocess_rule_preds(rule_pred_batch, student_pred_batch)
+                rule_mask, fired_rule_ids, rule_label_ids, student_proba = self.postprocess_rule_preds(rule_pred_batch, student_pred_batch)
                 fired_rule_ids = torch.LongTensor(fired_rule_ids)
-                rule_pred_one_hot = torch.LongTensor(rule_pred_one_hot)
+                rule_label_ids = torch.LongTensor(rule_label_ids)
+                if student_proba is not None:
+                    student_proba = student_proba_tensors(student_proba, self.use_gpu)
                 if self.use_gpu:
                     x_batch = x_batch.cuda()
                     fired_rule_ids = fired_rule_ids.cuda()
-                    rule_pred_one_hot = rule_pred_one_hot.cuda()
+                    rule_label_ids = rule_label_ids.cuda()
             
-                y_pred, att_score = self.model(x_batch, fired_rule_ids, rule_pred_one_hot)
+                y_pred, att_score = self.model(
+                    x_batch, fired_rule_ids, rule_label_ids, student_proba,
+                    return_proba=return_proba and not inference_mode
+                )
 
-                preds = torch.argmax(y_pred, dim=-1, keepdim=False)
-                max_proba = torch.max(y_pred, dim=-1)[0]
+                if isinstance(y_pred, dict):
+                    max_proba, preds = sparse_max(y_pred, self.num_labels)
+                else:
+                    preds = torch.argmax(y_pred, dim=-1, keepdim=False)
+                    max_proba = torch.max(y_pred, dim=-1)[0]
                 confidence_thres = 0.5
                 ignore_pred = max_proba < confidence_thres
                 random_pred[ignore_pred] = True
                 preds[random_pred] = -1
-                if not inference_mode:
-                    soft_proba = y_pred
 
                 y_preds.append(preds.detach().cpu().numpy())
                 if not inference_mode:
                     att_scores.append(att_score.detach().cpu().numpy())
-                    soft_probas.append(soft_proba.detach().cpu().numpy())
+                    max_probas.append(max_proba.detach().cpu().numpy())
+                    if return_proba:
+                        soft_probas.append(
+                            TopKProba.from_proba(y_pred, self.proba_topk) if self.proba_topk else y_pred.detach().cpu().numpy()
+                        )
                     rule_masks.append(rule_mask)
 
         if inference_mode:
@@ -293,7 +340,8 @@ class RAN:
             'align_index': dataset['align_index'],
             'preds': y_preds,
             'is_nsw': dataset['is_nsw'],
-            'proba': soft_probas,
+            'proba': soft_probas if return_proba else None,
+            'max_proba': max_probas,
             "att_scores": att_scores,
             "rule_mask": rule_masks,
         }
@@ -308,12 +356,6 @@ class RAN:
         return
 
 
-def MinEntropyLoss():
-    def loss(y_prob):
-        per_example_loss = -y_prob * torch.log(y_prob)
-        return torch.mean(per_example_loss)
-    return loss
-
 def create_learning_rate_scheduler(optimizer,
                                    max_learn_rate=1e-2,
                                    end_learn_rate=1e-5,
@@ -334,22 +376,149 @@ def create_learning_rate_scheduler(optimizer,
 
 def l1_normalize(x, num_labels):
     x = x + 1e-05  # Avoid stability issues
-    l1_norm = torch.sum(x, dim=-1, keepdim=True).detach()
-    l1_norm = torch.repeat_interleave(l1_norm, repeats=num_labels, dim=-1)  # Equivalent to tf.keras.backend.repeat_elements()
-
+    l1_norm = torch.sum(x, dim=-1, keepdim=True).detach()  # broadcast over the num_labels axis
     return x / l1_norm
 
-def normalize_with_random_rule(output, att_sigmoid_proba, rule_preds_onehot):
-    device=output.device
-    num_labels = rule_preds_onehot.shape[-1]
-    sum_prob = torch.sum(rule_preds_onehot, dim=-1).detach()
-    rule_mask = (sum_prob > 0).float()
-    num_rules = torch.sum(sum_prob, dim=-1).float()
-    masked_att_proba = att_sigmoid_proba * rule_mask
-    sum_masked_att_proba = torch.sum(masked_att_proba, dim=-1)
-    uniform_rule_att_proba = num_rules - sum_masked_att_proba
-    uniform_vec = torch.ones((uniform_rule_att_proba.shape[0], uniform_rule_att_proba.shape[1], num_labels)) / num_labels
-    uniform_vec = uniform_vec.to(device)
-    uniform_pred = torch.repeat_interleave(uniform_rule_att_proba.unsqueeze(-1), repeats=num_labels, dim=-1) * uniform_vec
-    output_with_uniform_rule = output + uniform_pred
-    return output_with_uniform_rule
\ No newline at end of file
+def random_rule_mass(att_sigmoid_proba, rule_mask):
+    """
+    Attention mass left over by the fired rules (num_rules - sum of their attention),
+    given to a random rule that spreads it uniformly over the labels. Returns one
+    scalar per token instead of a batch_size x seq_len x num_labels vector.
+    """
+    rule_mask = rule_mask.float()
+    num_rules = torch.sum(rule_mask, dim=-1)
+    sum_masked_att_proba = torch.sum(att_sigmoid_proba * rule_mask, dim=-1)
+    return num_rules - sum_masked_att_proba
+
+def normalize_with_random_rule(output, att_sigmoid_proba, rule_mask):
+    num_labels = output.shape[-1]
+    uniform_rule_att_proba = random_rule_mass(att_sigmoid_proba, rule_mask)
+    return output + (uniform_rule_att_proba / num_labels).unsqueeze(-1)
+
+def student_proba_tensors(student_proba, use_gpu=False):
+    """
+    Soft Student probabilities as a tensor, or for a TopKProba as a dictionary of
+    tensors (ids, vals and residual) that the RAN aggregates sparsely.
+    """
+    if isinstance(student_proba, TopKProba):
+        tensors = {
+            'ids': torch.LongTensor(student_proba.ids.astype(np.int64)),
+            'vals': torch.tensor(student_proba.vals),
+            'residual': torch.tensor(student_proba.residual),
+        }
+        if use_gpu:
+            tensors = {key: value.cuda() for key, value in tensors.items()}
+        return tensors
+    student_proba = torch.tensor(student_proba)
+    return student_proba.cuda() if use_gpu else student_proba
+
+def topk_to_dense(student_topk, num_labels):
+    """Materializes top-k Student probabilities, as TopKProba.dense."""
+    ids = student_topk['ids']
+    background = student_topk['residual'].float() / max(num_labels - ids.shape[-1], 1)
+    dense = background.unsqueeze(-1).repeat(*([1] * background.dim()), num_labels)
+    return dense.scatter(-1, ids, student_topk['vals'].float())
+
+def sparse_rule_proba(rule_label_ids, att_sigmoid_proba, rule_mask, num_labels, student_topk=None):
+    """
+    Sparse form of the RAN output distribution when every source is a label index or
+    top-k Student probabilities (`student_topk`, see student_proba_tensors, on the first
+    rule slot). Every label that no source lists gets the same probability, so a token
+    is fully described by:
+      * label_ids: batch_size x seq_len x num_slots distinct labels predicted by the
+        fired rules or in the Student top-k (num_labels for padded or duplicated slots)
+      * proba: probability of each of these labels (0 for padded slots)
+      * background: batch_size x seq_len probability of every other label
+    Values match l1_normalize(normalize_with_random_rule(...)) on the dense outputs.
+    """
+    labeled = rule_mask & (rule_label_ids < num_labels)
+    label_ids = rule_label_ids
+    att = att_sigmoid_proba.float() * labeled
+    student_background = 0
+    if student_topk is not None:
+        # The Student adds its residual share to every label, and the rest of its
+        # top-k probabilities to their labels
+        share = student_topk['residual'].float() / max(num_labels - student_topk['ids'].shape[-1], 1)
+        student_att = att_sigmoid_proba[..., :1].float()
+        student_background = student_att[..., 0] * share
+        label_ids = torch.cat([label_ids, student_topk['ids']], dim=-1)
+        att = torch.cat([att, student_att * (student_topk['vals'].float() - share.unsqueeze(-1))], dim=-1)
+        labeled = torch.cat([labeled, torch.ones_like(student_topk['ids'], dtype=torch.bool)], dim=-1)
+    same_label = (label_ids.unsqueeze(-1) == label_ids.unsqueeze(-2)) \
+        & labeled.unsqueeze(-1) & labeled.unsqueeze(-2)
+    label_mass = torch.matmul(same_label.float(), att.unsqueeze(-1)).squeeze(-1)
+    # Keep the first slot of each predicted label, which carries the mass of its duplicates
+    num_slots = label_ids.shape[-1]
+    earlier = torch.ones(num_slots, num_slots, dtype=torch.bool, device=label_ids.device).tril(diagonal=-1)
+    first = labeled & ~(same_label & earlier).any(dim=-1)
+
+    # Label masses, the Student and the random rule add up to the number of fired rules
+    l1_norm = torch.sum(rule_mask.float(), dim=-1) + num_labels * 1e-05
+    uniform_rule_att_proba = random_rule_mass(att_sigmoid_proba, rule_mask)
+    background = (uniform_rule_att_proba / num_labels + student_background + 1e-05) / l1_norm.detach()
+    proba = label_mass / l1_norm.detach().unsqueeze(-1) + background.unsqueeze(-1)
+    return {
+        'label_ids': torch.where(first, label_ids, num_labels),
+        'proba': torch.where(first, proba, torch.zeros_like(proba)),
+        'background': background,
+    }
+
+def sparse_to_dense(sparse_proba, num_labels):
+    """Materializes the batch_size x seq_len x num_labels distribution of sparse_rule_proba."""
+    background = sparse_proba['background']
+    dense = background.unsqueeze(-1).repeat(*([1] * background.dim()), num_labels + 1)
+    dense = dense.scatter(-1, sparse_proba['label_ids'], sparse_proba['proba'])
+    return dense[..., :-1]
+
+def sparse_max(sparse_proba, num_labels):
+    """
+    torch.max over the labels of a sparse distribution: returns (max_proba, preds),
+    ties going to the smallest label as with argmax on the dense outputs.
+    """
+    label_ids, proba = sparse_proba['label_ids'], sparse_proba['proba']
+    background = sparse_proba['background']
+    fired = label_ids < num_labels
+    max_proba = torch.where(fired, proba, torch.full_like(proba, -1)).max(dim=-1)[0]
+    is_max = fired & (proba == max_proba.unsqueeze(-1))
+    preds = torch.where(is_max, label_ids, num_labels).min(dim=-1)[0]
+    # Without fired rules the distribution is uniform and argmax picks the first label
+    has_rule = fired.any(dim=-1)
+    preds = torch.where(has_rule, preds, torch.zeros_like(preds))
+    max_proba = torch.where(has_rule, max_proba, background)
+    return max_proba, preds
+
+def MinEntropyLoss(num_labels=None):
+    def loss(y_prob):
+        if isinstance(y_prob, dict):
+            # Labels that no rule predicts share the background probability
+            fired = y_prob['label_ids'] < num_labels
+            proba = torch.where(fired, y_prob['proba'], torch.ones_like(y_prob['proba']))
+            background = y_prob['background']
+            num_background = num_labels - fired.sum(dim=-1)
+            per_token_loss = torch.sum(-proba * torch.log(proba), dim=-1) \
+                - num_background * background * torch.log(background)
+            return torch.mean(per_token_loss) / num_labels
+        per_example_loss = -y_prob * torch.log(y_prob)
+        return torch.mean(per_example_loss)
+    return loss
+
+def RuleCrossEntropyLoss(num_labels, ignore_index):
+    """
+    nn.CrossEntropyLoss over the RAN outputs (used as logits), for both dense
+    outputs and the sparse form of sparse_rule_proba.
+    """
+    dense_loss_fn = nn.CrossEntropyLoss(ignore_index=ignore_index)
+    def loss(y_prob, y):
+        if not isinstance(y_prob, dict):
+            return dense_loss_fn(y_prob.view(-1, num_labels), y.view(-1))
+        label_ids, proba = y_prob['label_ids'], y_prob['proba']
+        background = y_prob['background']
+        fired = label_ids < num_labels
+        num_background = num_labels - fired.sum(dim=-1)
+        sum_exp = torch.sum(torch.exp(proba) * fired, dim=-1) + num_background * torch.exp(background)
+        is_target = fired & (label_ids == y.unsqueeze(-1))
+        target_proba = torch.where(is_target.any(dim=-1), torch.sum(proba * is_target, dim=-1), background)
+        per_token_loss = torch.log(sum_exp) - target_proba
+        keep = y != ignore_index
+        return per_token_loss[keep].mean()
+    return loss
@@ -12,22 +12,30 @@ class Student:
         self.training_mode = args.training_mode
         self.remove_accents = args.remove_accents
         self.trainer = Trainer(args=self.args, tokenizer=self.tokenizer, logger=self.logger)
+        # Incremented whenever the weights change, identifies cached outputs (see FeatureCache)
+        self.version = 0
 
     def train(self, train_dataset, dev_dataset, mode='train'):
         assert mode in ['train', 'finetune', 'train_pseudo']
+        self.version += 1
+        augmenter = None
         if mode in ['train', 'finetune']:
+            if self.remove_accents and getattr(train_dataset, 'online_augmentation', False):
+                augmenter = train_dataset.accent_augmenter()
             train_dataset = sort_data(train_dataset, remove_accents=self.remove_accents)
         dev_dataset = sort_data(dev_dataset, remove_accents=self.remove_accents)
         if mode == 'train':
             res = self.trainer.train(
                 train_data=train_dataset,
                 dev_data=dev_dataset,
+                augmenter=augmenter,
             )
             return res
         if mode == 'finetune':
             res = self.trainer.finetune(
                 train_data=train_dataset,
                 dev_data=dev_dataset,
+                augmenter=augmenter,
             )
             return res
         if mode == 'train_pseudo':
@@ -37,18 +45,25 @@ class Student:
             )
             return res
 
-    def predict(self, dataset, dataIter=None, inference_mode=False):
-        res = self.trainer.predict(data=dataset, dataIter=dataIter, inference_mode=inference_mode)
+    def predict(self, dataset, dataIter=None, inference_mode=False, accumulator=None, return_outputs=True):
+        res = self.trainer.predict(
+            data=dataset, dataIter=dataIter, inference_mode=inference_mode,
+            accumulator=accumulator, return_outputs=return_outputs
+        )
         return res
 
     def inference(self, user_input):
         res = self.trainer.inference(user_input)
         return res
 
+    def batch_inference(self, user_inputs, batch_size=None):
+        res = self.trainer.batch_inference(user_inputs, batch_size=batch_size)
+        return res
+
     def save(self, name='student'):
         # savefolder = ./model_checkpoints/visobert/weakly_supervised_0.0/student
         savefolder = os.path.join(
-            self.args.ckpt_dir, self.args.student_name, f"{args.training_mode}_{args.rm_accent_ratio}", name
+            self.args.ckpt_dir, self.args.student_name, f"{self.args.training_mode}_{self.args.rm_accent_ratio}", name
         )
         self.logger.info('Saving {} to {}'.format(name, savefolder))
         os.makedirs(savefolder, exist_ok=True)
@@ -57,8 +72,9 @@ class Student:
     def load(self, name='student', best=False):
         version = f"{name}_best" if best else f"{name}_last"
         savefolder = os.path.join(
-            self.args.ckpt_dir, self.args.student_name, f"{args.training_mode}_{args.rm_accent_ratio}", version
+            self.args.ckpt_dir, self.args.student_name, f"{self.args.training_mode}_{self.args.rm_accent_ratio}", version
         )
         if not os.path.exists(savefolder):
             AssetFetcher.download_model(self.args, version, self.logger)
-        self.trainer.load(savefolder)
\ No newline at end of file
+        self.trainer.load(savefolder)
+        self.version += 1
\ No newline at end of file
@@ -2,6 +2,7 @@ import os
 import numpy as np
 from visolex.framework_components.rule_attention_network import RAN
 from visolex.framework_components.asset_fetcher import AssetFetcher
+from visolex.framework_components.feature_cache import FeatureCache
 from visolex.utils import sort_data, gen_dataIter
 
 class Teacher:
@@ -27,22 +28,74 @@ class Teacher:
         )
         self.name = 'ran'
         self.student = None
+        # Student outputs reused while the Student is not re-trained, set args.feature_cache = 0
+        # to disable. args.feature_cache_dir: memory-mapped storage, feature_cache_fp16: float16
+        self.feature_cache = FeatureCache(
+            cache_dir=getattr(args, 'feature_cache_dir', None), fp16=bool(getattr(args, 'feature_cache_fp16', 0))
+        ) if getattr(args, 'feature_cache', 1) else None
+
+    def student_predict(self, dataIter, dataset_id=None):
+        """
+        Student.predict over dataIter. Batches whose sentences were already predicted
+        by the current Student weights come from the feature cache, the other ones are
+        predicted (in a single pass) and cached.
+        """
+        version = getattr(self.student, 'version', None)
+        if self.feature_cache is None or dataset_id is None or version is None:
+            return self.student.predict(dataset=None, dataIter=dataIter)
+        hits = {}  # position of the batch - (batch, cached outputs)
+        misses = []  # positions of the batches given to the Student
+
+        def missing_batches():
+            for position, batch in enumerate(dataIter):
+                cached = self.feature_cache.get(version, dataset_id, batch['id'])
+                # Sentence ids are only trusted along with their tokens
+                if cached is not None and np.array_equal(cached['input_ids'], np.array(batch['input_ids'])):
+                    hits[position] = (batch, cached)
+                else:
+                    misses.append(position)
+                    yield batch
+
+        predicted = self.student.predict(dataset=None, dataIter=missing_batches())
+        outputs = {}  # position of the batch - outputs of the batch
+        for j, position in enumerate(misses):
+            outputs[position] = {key: values[j] for key, values in predicted.items() if values}
+            outputs[position]['is_nsw'] = np.asarray(outputs[position]['is_nsw'])
+            self.feature_cache.put(version, dataset_id, outputs[position]['id'], {
+                key: outputs[position][key] for key in ['input_ids', 'preds', 'proba', 'features', 'is_nsw']
+            })
+        for position, (batch, cached) in hits.items():
+            outputs[position] = dict(cached)
+            outputs[position].update({
+                'id': batch['id'],
+                'input_ids': np.array(batch['input_ids']),
+                'output_ids': np.array(batch['output_ids']) if 'output_ids' in batch else None,
+                'align_index': batch['align_index'],
+                'weak_labels': np.array(batch['weak_labels']),
+            })
+        outputs = [outputs[position] for position in range(len(outputs))]
+        res = {key: [batch.get(key) for batch in outputs] for key in predicted}
+        if not outputs or outputs[0].get('output_ids') is None:
+            res['output_ids'] = None
+        return res
 
     def predict(self, dataset):
         dataset = sort_data(dataset)
         res = self.aggregate_sources(dataset)
         return res
 
-    def predict_ran(self, dataset, inference_mode=False):
+    def predict_ran(self, dataset, inference_mode=False, return_proba=False):
         self.logger.info("Getting RAN predictions")
+        dataset_id = getattr(dataset, 'method', None)
         dataset = sort_data(dataset)
         len_ls = list(set(dataset['sent_len']))
         dataIter = gen_dataIter(dataset, self.agg_model.unsup_batch_size, len_ls)
-        data_dict = self.student.predict(dataset=None, dataIter=dataIter)
-        res = self.aggregate_sources(data_dict, inference_mode=inference_mode)
+        data_dict = self.student_predict(dataIter, dataset_id)
+        res = self.aggregate_sources(data_dict, inference_mode=inference_mode, return_proba=return_proba)
         return res
 
     def train_ran(self, train_dataset=None, dev_dataset=None, unlabeled_dataset=None):
+        dataset_ids = [getattr(dataset, 'method', None) for dataset in [train_dataset, dev_dataset, unlabeled_dataset]]
         train_dataset = sort_data(train_dataset) if train_dataset is not None else None
         dev_dataset = sort_data(dev_dataset) if dev_dataset is not None else None
         unlabeled_dataset = sort_data(unlabeled_dataset) if unlabeled_dataset is not None else None
@@ -57,9 +110,9 @@ class Teacher:
 
         self.logger.info("Getting student predictions on train (and dev) dataset")
         assert self.student is not None, "To train RAN we need access to the Student"
-        train_data = self.student.predict(dataset=None, dataIter=trainIter) if train_dataset is not None else {'features': None, 'proba': None}
-        dev_data = self.student.predict(dataset=None, dataIter=devIter) if dev_dataset is not None else {'features': None, 'proba': None}
-        unsup_data = self.student.predict(dataset=None, dataIter=unsupIter) if unlabeled_dataset is not None else {'features': None, 'proba': None}
+        train_data = self.student_predict(trainIter, dataset_ids[0]) if train_dataset is not None else {'features': None, 'proba': None}
+        dev_data = self.student_predict(devIter, dataset_ids[1]) if dev_dataset is not None else {'features': None, 'proba': None}
+        unsup_data = self.student_predict(unsupIter, dataset_ids[2]) if unlabeled_dataset is not None else {'features': None, 'proba': None}
 
         self.logger.info("Training Rule Attention Network")
         self.agg_model.train(
@@ -70,10 +123,10 @@ class Teacher:
         del train_data, dev_data, unsup_data
         return {}
 
-    def aggregate_sources(self, data_dict, inference_mode=False):
+    def aggregate_sources(self, data_dict, inference_mode=False, return_proba=False):
         if self.name != "ran":
             raise(BaseException("Teacher method not implemented: {}".format(self.name)))
-        res = self.agg_model.predict_ran(data_dict, inference_mode=inference_mode)
+        res = self.agg_model.predict_ran(data_dict, inference_mode=inference_mode, return_proba=return_proba)
         return res
 
     def save(self, name='teacher'):
@@ -0,0 +1,57 @@
+import numpy as np
+import torch
+
+class TopKProba:
+    """
+    Top-k form of [..., num_labels] probabilities: the k most probable labels of every
+    token (`ids` and their probabilities `vals`, by decreasing probability) and the
+    `residual` mass of the other num_labels - k labels, spread uniformly over them by
+    `dense`. Indexing selects rows (e.g. sentences of a batch), and np.max / np.argmax
+    over the last axis work as on the dense probabilities.
+    """
+
+    def __init__(self, ids, vals, residual, num_labels):
+        self.ids = ids
+        self.vals = vals
+        self.residual = residual
+        self.num_labels = num_labels
+
+    @classmethod
+    def from_proba(cls, proba, k):
+        # proba: [..., num_labels] tensor
+        vals, ids = torch.topk(proba, min(k, proba.shape[-1]), dim=-1)
+        residual = torch.clamp(1 - vals.sum(dim=-1), min=0)
+        return cls(
+            ids.detach().cpu().numpy().astype(np.int32), vals.detach().cpu().numpy(),
+            residual.detach().cpu().numpy(), proba.shape[-1]
+        )
+
+    @property
+    def shape(self):
+        return self.ids.shape[:-1] + (self.num_labels,)
+
+    @property
+    def ndim(self):
+        return self.ids.ndim
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, item):
+        return TopKProba(self.ids[item], self.vals[item], self.residual[item], self.num_labels)
+
+    def max(self, axis=-1, out=None, **kwargs):
+        assert axis in (-1, self.ndim - 1) and out is None, "Only the maximum over the labels is supported"
+        return self.vals[..., 0]
+
+    def argmax(self, axis=-1, out=None, **kwargs):
+        assert axis in (-1, self.ndim - 1) and out is None, "Only the argmax over the labels is supported"
+        return self.ids[..., 0].astype(np.int64)
+
+    def dense(self):
+        """Materializes the [..., num_labels] probabilities."""
+        k = self.ids.shape[-1]
+        background = self.residual / max(self.num_labels - k, 1)
+        dense = np.repeat(background[..., np.newaxis].astype(self.vals.dtype), self.num_labels, axis=-1)
+        np.put_along_axis(dense, self.ids.astype(np.int64), self.vals, axis=-1)
+        return dense
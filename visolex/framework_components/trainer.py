@@ -145,6 +145,7 @@ class ViSoLexTrainer:
             self.pseudodataset.student_data['align_index'] = student_pred_dict_unlabeled['align_index']
             self.pseudodataset.student_data['labels'] = student_pred_dict_unlabeled['preds']
             self.pseudodataset.student_data['proba'] = student_pred_dict_unlabeled['proba']
+            # np.max also takes the top-k probabilities of args.proba_topk (TopKProba)
             self.pseudodataset.student_data['weights'] = [
                 np.max(array, axis=-1) for array in student_pred_dict_unlabeled['proba']
             ]
@@ -207,7 +208,9 @@ class ViSoLexTrainer:
             )
 
             # Apply Teacher on unlabeled data
-            teacher_pred_dict_unlabeled = self.teacher.predict_ran(dataset=self.pseudodataset)
+            teacher_pred_dict_unlabeled = self.teacher.predict_ran(
+                dataset=self.pseudodataset, return_proba=self.args.soft_labels
+            )
 
             self.logger.info("\n\n\t*** Evaluating teacher on dev data ***")
             teacher_dev_res, t_dev_dict = evaluate(self.teacher, self.dev_dataset, self.ev, "ran", comment="teacher dev iter{}".format(iter+1))
@@ -222,8 +225,9 @@ class ViSoLexTrainer:
             self.pseudodataset.teacher_data['is_nsw'] = teacher_pred_dict_unlabeled['is_nsw']
             self.pseudodataset.teacher_data['align_index'] = teacher_pred_dict_unlabeled['align_index']
             self.pseudodataset.teacher_data['labels'] = teacher_pred_dict_unlabeled['preds']
-            self.pseudodataset.teacher_data['proba'] = teacher_pred_dict_unlabeled['proba']
-            self.pseudodataset.teacher_data['weights'] = [np.max(array, axis=-1) for array in teacher_pred_dict_unlabeled['proba']]
+            if teacher_pred_dict_unlabeled['proba'] is not None:
+                self.pseudodataset.teacher_data['proba'] = teacher_pred_dict_unlabeled['proba']
+            self.pseudodataset.teacher_data['weights'] = teacher_pred_dict_unlabeled['max_proba']
             self.pseudodataset.drop(col='labels', value=-1, type='teacher')
             del teacher_pred_dict_unlabeled
 
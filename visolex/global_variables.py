@@ -12,6 +12,9 @@ DATASET_DIR = os.path.join(PROJECT_PATH, "dataset")
 CKPT_DIR = os.path.join(PROJECT_PATH, "model_checkpoints")
 LOG_DIR = os.path.join(PROJECT_PATH, "logs")
 DICT_PATH = os.path.join(PROJECT_PATH, "dictionary", "dictionary.json")
+DICT_INDEX_PATH = os.path.join(PROJECT_PATH, "dictionary", "dictionary.idx")
+DICT_JOURNAL_PATH = os.path.join(PROJECT_PATH, "dictionary", "dictionary.journal.jsonl")
+LLM_CACHE_PATH = os.path.join(PROJECT_PATH, "llm", "responses.sqlite")
 GIT_DOWNLOAD_URL = "https://github.com/anhdung2918/visolex-toolkit/releases/download/0.0.1"
 
 # Tokenizer constants
@@ -1,31 +1,43 @@
-def basic_normalizer(input_str, args=None, lowercase=False):
-    import os
+import os
+from functools import lru_cache
+from visolex.utils import get_arguments
+from visolex.framework_components.log import get_logger
+
+@lru_cache(maxsize=None)
+def _get_logger(logfile):
+    # get_logger attaches new handlers on every call, so build each logger only once
+    return get_logger(logfile=logfile)
+
+@lru_cache(maxsize=None)
+def _get_basic_normalizer():
+    # BasicNormalizer compiles its patterns on creation, so share one instance
     from visolex.lexnorm.basic_normalizer import BasicNormalizer
+    return BasicNormalizer()
 
-    if args is None:
-         args = get_arguments()
-    logger = get_logger(logfile=os.path.join(args.logdir, 'basic_normalizer.log'))
-    basic_normalizer = BasicNormalizer(args, logger)
+def basic_normalizer(input_str, args=None, lowercase=False):
+    # args is kept for compatibility: the rule-based normalizer needs no settings nor log
+    basic_normalizer = _get_basic_normalizer()
     return basic_normalizer.basic_normalizer(input_str=input_str, lowercase=lowercase)
 
 def detect_nsw(input_str, args=None):
-    import os
     from visolex.lexnorm.detect import NswDetector
+    from visolex.lexnorm.registry import ModelRegistry
 
     if args is None:
         args = get_arguments()
-    logger = get_logger(logfile=os.path.join(args.logdir, 'detect.log'))
-    detector = NswDetector(args, logger)
+    logger = _get_logger(os.path.join(args.logdir, 'detect.log'))
+    tokenizer, normalizer = ModelRegistry.Instance().get(args, logger)
+    detector = NswDetector(args, logger, tokenizer=tokenizer, normalizer=normalizer)
     nsw_spans = detector.detect_nsw(input_str=input_str)
     return nsw_spans
 
 def normalize_sentence(input_str, args=None, nsw_detection=True):
-    import os
     from visolex.lexnorm.normalize import ViSoLexNormalizer
+    from visolex.lexnorm.registry import ModelRegistry
 
     if args is None:
         args = get_arguments()
-    logger = get_logger(logfile=os.path.join(args.logdir, 'normalize.log'))
-    normalizer = ViSoLexNormalizer(args, logger)
-    self.normalizer.load()
-    return normalizer.normalize_sentence(input_str, nsw_detection)
\ No newline at end of file
+    logger = _get_logger(os.path.join(args.logdir, 'normalize.log'))
+    tokenizer, student = ModelRegistry.Instance().get(args, logger)
+    normalizer = ViSoLexNormalizer(args, logger, tokenizer=tokenizer, normalizer=student)
+    return normalizer.normalize_sentence(input_str, nsw_detection)
@@ -1,20 +1,114 @@
+import os
 import re
-from typing import List, Dict, Any, Union
-from visolex.framework_components.regex_expression import Protected, emoji_pattern, emoji_list, tone_dict_map
-from visolex.framework_components.preprocessing import tone_normalization, split_emoji_text, split_emoji_emoji, simple_tokenize
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Union, Iterable, Iterator
+from visolex.framework_components.regex_expression import Protected, emoji_list, tone_dict_map
+from visolex.framework_components.preprocessing import split_edge_punctuation
 
 class BasicNormalizer:
     def __init__(self):
         """Initialize BasicNormalizer with optional logging (if needed)."""
         self.logger = None  # Placeholder for logger if needed in the future.
 
+        # Everything the pipeline looks up is compiled once here; the output is the same
+        # as chaining tone_normalization, split_emoji_text, simple_tokenize and
+        # split_emoji_emoji from visolex.framework_components.preprocessing.
+        # Tone keys never overlap nor create new matches once replaced, so a single
+        # alternation gives the same result as one str.replace per entry
+        self.tone_map = {replacement: original for original, replacement in tone_dict_map.items()}
+        self.tone_pattern = re.compile('|'.join(map(re.escape, self.tone_map)))
+        # Emojis are matched character by character, so only single-character ones apply
+        self.emoji_chars = frozenset(emoji for emoji in emoji_list if len(emoji) == 1)
+        self.emoji_table = str.maketrans({emoji: f' {emoji} ' for emoji in self.emoji_chars})
+        self.protected_pattern = Protected
+
+    def tone_normalization(self, text: str) -> str:
+        return self.tone_pattern.sub(lambda match: self.tone_map[match.group()], text)
+
+    def split_emoji_text(self, text: str) -> str:
+        return text.translate(self.emoji_table)
+
+    def simple_tokenize(self, text: str) -> List[str]:
+        # Single scan over the protected spans, splitting the text in between on whitespace
+        text = split_edge_punctuation(text)
+        tokens = []
+        end = 0
+        for match in self.protected_pattern.finditer(text):
+            if match.start() == match.end():
+                continue
+            tokens.extend(text[end:match.start()].split())
+            protected = match.group().strip()
+            if protected:
+                tokens.append(protected)
+            end = match.end()
+        tokens.extend(text[end:].split())
+        return tokens
+
+    def split_emoji_emoji(self, tokens: List[str]) -> List[str]:
+        result = []
+        for word in tokens:
+            if self.emoji_chars.isdisjoint(word):
+                result.append(word)
+            else:
+                result.extend(char if char in self.emoji_chars else word for char in word)
+        return result
+
     # Preprocessing pipeline
     def basic_normalizer(self, input_str: str,  lowercase: bool = False):
         text = input_str
         if lowercase:
             text = text.lower()
-        text = tone_normalization(text, tone_dict_map)
-        text = split_emoji_text(text, emoji_list)
-        tokens = simple_tokenize(text, [Protected], emoji_pattern)
-        tokens = split_emoji_emoji(tokens, emoji_list)
+        text = self.tone_normalization(text)
+        text = self.split_emoji_text(text)
+        tokens = self.simple_tokenize(text)
+        tokens = self.split_emoji_emoji(tokens)
         return ' '.join(filter(str.strip, tokens))
+
+    def normalize_many(self, input_strs: Iterable[str], workers: int = None, chunksize: int = 256,
+                       lowercase: bool = False) -> Iterator[str]:
+        """
+        Normalizes many strings over a pool of `workers` processes (default: all cores),
+        yielding the results lazily and in input order. Strings are sent to the workers
+        `chunksize` at a time, with at most 2 chunks per worker in flight, so the input
+        can be a stream of any size. Inputs that fit in a single chunk, or
+        workers=1, are normalized in-process.
+        """
+        workers = workers or os.cpu_count() or 1
+        iterator = iter(input_strs)
+        chunks = iter(lambda: list(islice(iterator, chunksize)), [])
+
+        # Look ahead to avoid starting a pool for small inputs
+        head = list(islice(chunks, 2))
+        if workers <= 1 or len(head) < 2:
+            for chunk in head:
+                yield from self._normalize_chunk(chunk, lowercase)
+            for chunk in chunks:
+                yield from self._normalize_chunk(chunk, lowercase)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            pending = deque()
+            for chunk in head:
+                pending.append(executor.submit(_normalize_chunk, chunk, lowercase))
+            for chunk in chunks:
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(_normalize_chunk, chunk, lowercase))
+            while pending:
+                yield from pending.popleft().result()
+
+    def _normalize_chunk(self, chunk: List[str], lowercase: bool) -> List[str]:
+        return [self.basic_normalizer(input_str, lowercase=lowercase) for input_str in chunk]
+
+
+# Each worker process compiles its own BasicNormalizer once
+_worker_normalizer = None
+
+def _init_worker():
+    global _worker_normalizer
+    _worker_normalizer = BasicNormalizer()
+
+def _normalize_chunk(chunk, lowercase):
+    return _worker_normalizer._normalize_chunk(chunk, lowercase)
@@ -3,10 +3,11 @@ from visolex.utils import get_tokenizer, delete_special_tokens
 from visolex.framework_components.student import Student
 
 class NswDetector:
-    def __init__(args, logger, tokenizer=None, normalizer=None):
+    def __init__(self, args, logger, tokenizer=None, normalizer=None):
         self.args = args
-        self.logger = self.logger
-        self.loaded = True if normalizer is None else False
+        self.logger = logger
+        # A normalizer passed in is shared with its owner, which is responsible for loading it
+        self.loaded = True
 
         if tokenizer is None:
             self.tokenizer = get_tokenizer(self.args.student_name)
@@ -15,7 +16,7 @@ class NswDetector:
 
         if normalizer is None:
             self.normalizer = Student(self.args, tokenizer=self.tokenizer, logger=self.logger)
-            self.normalizer.load('student_best')
+            self.normalizer.load(best=True)
         else:
             self.normalizer = normalizer
 
@@ -24,13 +25,10 @@ class NswDetector:
             self.logger.info("Model have already been loaded")
         else:
             self.logger.info("Loading model from checkpoints")
-            if last:
-                self.normalizer.load('student_last')
-            else:
-                self.normalizer.load('student_best')
+            self.normalizer.load(best=not last)
             self.loaded = True
 
-    def concatenate_nsw_spans(nsw_spans):
+    def concatenate_nsw_spans(self, nsw_spans):
         result = []
         current_span = nsw_spans[0]
 
@@ -6,32 +6,33 @@ from visolex.framework_components.student import Student
 
 
 class ViSoLexNormalizer:
-    def __init__(args, logger):
+    def __init__(self, args, logger, tokenizer=None, normalizer=None):
         self.args = args
-        self.logger = self.logger
-        self.tokenizer = get_tokenizer(self.args.student_name)
-        self.normalizer = Student(self.args, tokenizer=self.tokenizer, logger=self.logger)
-        self.loaded = False
+        self.logger = logger
+        self.tokenizer = get_tokenizer(self.args.student_name) if tokenizer is None else tokenizer
+        self.nsw_detector = None
+        # A normalizer passed in (e.g. from ModelRegistry) is expected to be loaded already
+        if normalizer is None:
+            self.normalizer = Student(self.args, tokenizer=self.tokenizer, logger=self.logger)
+            self.loaded = False
+        else:
+            self.normalizer = normalizer
+            self.loaded = True
 
     def load(self, last=False):
         if self.args.inference_model == "teacher":
             print("Teacher inference is not supported yet. Load Normalizer instead")
-        if last:
-            self.normalizer.load("student_last")
-        else:
-            self.normalizer.load("student_best")
+        self.normalizer.load(best=not last)
         self.loaded = True
 
-    def normalize_sentence(self, input_str, detect_nsw=False):
-        if not self.loaded:
-            self.load()
-        output = self.normalizer.inference(user_input=input_str)
+    def decode_output(self, output, detect_nsw=False):
         pred = output['pred']
         proba = output['proba']
         decoded_pred = self.tokenizer.convert_ids_to_tokens(pred)
 
         if detect_nsw:
-            self.nsw_detector = NswDetector(self.args, self.logger, self.tokenizer, self.normalizer)
+            if self.nsw_detector is None:
+                self.nsw_detector = NswDetector(self.args, self.logger, self.tokenizer, self.normalizer)
             nsw_spans = self.nsw_detector.detect_nsw(normalizer_output=output)
             nsw_indices = [span['index'] for span in nsw_spans]
             for i, nsw_idx in enumerate(nsw_indices):
@@ -48,4 +49,17 @@ class ViSoLexNormalizer:
         else:
             pred_str = self.tokenizer.convert_tokens_to_string(decoded_pred)
             pred_str = post_process(pred_str)
-            return pred_str
\ No newline at end of file
+            return pred_str
+
+    def normalize_sentence(self, input_str, detect_nsw=False):
+        if not self.loaded:
+            self.load()
+        output = self.normalizer.inference(user_input=input_str)
+        return self.decode_output(output, detect_nsw)
+
+    def normalize_batch(self, input_strs, batch_size=None, detect_nsw=False):
+        # Sentences are padded and pushed through the normalizer `batch_size` at a time
+        if not self.loaded:
+            self.load()
+        outputs = self.normalizer.batch_inference(input_strs, batch_size=batch_size)
+        return [self.decode_output(output, detect_nsw) for output in outputs]
@@ -0,0 +1,81 @@
+import threading
+from visolex.utils import Singleton, get_tokenizer
+from visolex.framework_components.student import Student
+
+@Singleton
+class ModelRegistry:
+    """
+    Process-wide cache of tokenizers and loaded Students.
+
+    Models are keyed by (student_name, training_mode, rm_accent_ratio, version) and are
+    loaded from disk at most once; the NSW detector and the normalizer share the same
+    instance. Access the registry through `ModelRegistry.Instance()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokenizers = {}
+        self._models = {}
+        self._loading_locks = {}
+
+    @staticmethod
+    def make_key(args, version='student_best'):
+        return (args.student_name, args.training_mode, args.rm_accent_ratio, version)
+
+    def get_tokenizer(self, student_name):
+        with self._lock:
+            if student_name not in self._tokenizers:
+                self._tokenizers[student_name] = get_tokenizer(student_name)
+            return self._tokenizers[student_name]
+
+    def get(self, args, logger=None, version='student_best'):
+        """Returns (tokenizer, normalizer), loading the checkpoint on first use."""
+        key = self.make_key(args, version)
+        with self._lock:
+            if key in self._models:
+                return self._models[key]
+            key_lock = self._loading_locks.setdefault(key, threading.Lock())
+
+        # Loading happens outside the registry lock so that other models stay available
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    return self._models[key]
+            tokenizer = self.get_tokenizer(args.student_name)
+            normalizer = Student(args, tokenizer=tokenizer, logger=logger)
+            name, suffix = version.rsplit('_', 1)
+            normalizer.load(name, best=suffix == 'best')
+            with self._lock:
+                self._models[key] = (tokenizer, normalizer)
+                self._loading_locks.pop(key, None)
+                return self._models[key]
+
+    def warm_up(self, args, logger=None, versions=('student_best',)):
+        """Loads the given checkpoint versions ahead of the first request."""
+        for version in versions:
+            self.get(args, logger=logger, version=version)
+
+    def evict(self, args=None, version=None):
+        """
+        Drops cached models. Without `args` every model is evicted, otherwise only the
+        models matching `args` (and `version`, if given).
+        """
+        with self._lock:
+            if args is None:
+                evicted = list(self._models)
+            else:
+                evicted = [
+                    key for key in self._models
+                    if key[:3] == self.make_key(args)[:3] and (version is None or key[3] == version)
+                ]
+            for key in evicted:
+                del self._models[key]
+            in_use = set(key[0] for key in self._models)
+            for student_name in list(self._tokenizers):
+                if student_name not in in_use:
+                    del self._tokenizers[student_name]
+        return evicted
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
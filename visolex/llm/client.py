@@ -0,0 +1,118 @@
+import os
+import asyncio
+import sqlite3
+import threading
+from visolex.global_variables import OPENAI_MODEL, MAX_TOKENS, TEMPERATURE, LLM_CACHE_PATH
+from visolex.llm.prompts import DEFAULT_NSW_SEARCH_PROMPT
+
+class ResponseCache:
+    """Persistent LLM responses keyed by (prompt template, nsw, model), stored in sqlite."""
+
+    def __init__(self, path=LLM_CACHE_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "template TEXT, nsw TEXT, model TEXT, response TEXT, PRIMARY KEY (template, nsw, model))"
+            )
+
+    def get(self, template, nsw, model):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response FROM responses WHERE template=? AND nsw=? AND model=?", (template, nsw, model)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, template, nsw, model, response):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (template, nsw, model, response)
+            )
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+class OpenAIBackend:
+    """
+    Chat completion backend with its own AsyncOpenAI client (no global api key).
+    `base_url` points it to any OpenAI-compatible server, e.g. a local stub.
+    """
+
+    def __init__(self, api_key=None, model=OPENAI_MODEL, base_url=None, max_tokens=MAX_TOKENS, temperature=TEMPERATURE):
+        from openai import AsyncOpenAI
+
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+
+    async def complete(self, prompt):
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=self.max_tokens,
+            temperature=self.temperature
+        )
+        return response.choices[0].message.content
+
+class AsyncLLMClient:
+    """
+    Asynchronous NSW search over a backend (any object with a `model` attribute and an
+    `async complete(prompt)` method):
+      * at most `max_concurrency` requests run at the same time,
+      * concurrent searches of the same (template, nsw) share a single request,
+      * responses are stored in `cache` (a ResponseCache, or None) and reused across runs.
+    """
+
+    def __init__(self, backend, cache=None, max_concurrency=8):
+        self.backend = backend
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.in_flight = {}
+        self._semaphores = {}
+
+    @property
+    def semaphore(self):
+        # asyncio primitives belong to the running loop, e.g. one per asyncio.run
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores = {loop: asyncio.Semaphore(self.max_concurrency)}
+        return self._semaphores[loop]
+
+    async def search(self, nsw, prompt_tmpl=None):
+        template = DEFAULT_NSW_SEARCH_PROMPT if prompt_tmpl is None else prompt_tmpl
+        key = (template, nsw, self.backend.model)
+        if self.cache is not None:
+            response = self.cache.get(*key)
+            if response is not None:
+                return response
+        if key not in self.in_flight:
+            self.in_flight[key] = asyncio.ensure_future(self._request(key))
+        return await asyncio.shield(self.in_flight[key])
+
+    async def _request(self, key):
+        template, nsw, _ = key
+        try:
+            async with self.semaphore:
+                # Templates may use a positional {} or a named {nsw} placeholder
+                response = await self.backend.complete(template.format(nsw, nsw=nsw))
+            if self.cache is not None:
+                self.cache.set(*key, response)
+            return response
+        finally:
+            self.in_flight.pop(key, None)
+
+    async def search_many(self, nsws, prompt_tmpl=None):
+        """Responses for `nsws`, in the same order."""
+        return await asyncio.gather(*(self.search(nsw, prompt_tmpl) for nsw in nsws))
+
+    def run(self, nsws, prompt_tmpl=None):
+        """Blocking version of `search_many`, for use outside of an event loop."""
+        return asyncio.run(self.search_many(nsws, prompt_tmpl))
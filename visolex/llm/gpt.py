@@ -1,12 +1,18 @@
 import openai
 import json
 import re
+from functools import lru_cache
 from visolex.global_variables import OPENAI_MODEL, MAX_TOKENS, TEMPERATURE
 
+@lru_cache(maxsize=None)
+def get_client(openai_api_key):
+    # One client (and connection pool) per api key instead of setting the global openai.api_key
+    return openai.OpenAI(api_key=openai_api_key)
+
 def run_chatgpt(nsw, openai_api_key, prompt):
-    openai.api_key = openai_api_key
+    client = get_client(openai_api_key)
     # Generate text using the ChatGPT 'completions' API with the new syntax
-    response = openai.chat.completions.create(
+    response = client.chat.completions.create(
             model=OPENAI_MODEL,  # or use "gpt-4" if you have access to it
             messages=[{"role": "user", "content": prompt}],
             max_tokens=MAX_TOKENS,
@@ -5,19 +5,21 @@ import numpy as np
 import joblib
 import unicodedata
 import random
+import threading
 from datasets import Dataset
 import torch
 import attridict
 from transformers import AutoTokenizer
 from visolex.global_variables import (
     SPECIAL_TOKEN_LS, BOS_TOKEN, EOS_TOKEN, RM_ACCENTS_DICT,
-    PRETRAINED_TOKENIZER_MAP, NULL_STR,
+    PRETRAINED_TOKENIZER_MAP, NULL_STR, PAD_TOKEN,
     PROJECT_PATH, DATASET_DIR, LOG_DIR, ARGS_PATH, CKPT_DIR
 )
+from visolex.framework_components.columnar import ColumnStore
 
 class Singleton:
     """
-    A non-thread-safe helper class to ease implementing singletons.
+    A thread-safe helper class to ease implementing singletons.
     This should be used as a decorator -- not a metaclass -- to the
     class that should be a singleton.
 
@@ -33,6 +35,7 @@ class Singleton:
 
     def __init__(self, decorated):
         self._decorated = decorated
+        self._lock = threading.Lock()
 
     def Instance(self):
         """
@@ -44,7 +47,9 @@ class Singleton:
         try:
             return self._instance
         except AttributeError:
-            self._instance = self._decorated()
+            with self._lock:
+                if not hasattr(self, '_instance'):
+                    self._instance = self._decorated()
             return self._instance
 
     def __call__(self):
@@ -91,20 +96,25 @@ def run_strip_accents(txt, ratio):
         txt = unicodedata.normalize("NFC", txt)
     num_character = len(txt)
     num_remove = int(ratio*num_character)
-    random_indices = random.sample(np.arange(num_character).tolist(), num_remove)
-    new_txt = ""
-    for i in range(num_character):
-        c = txt[i]
-        if i in random_indices:
-            c = c.translate(RM_ACCENTS_DICT)
-        new_txt += c
-    return new_txt
+    # Same draw as sampling from the list of indices. For batches of words, see
+    # framework_components.augmentation.AccentStripper
+    chars = list(txt)
+    for i in random.sample(range(num_character), num_remove):
+        chars[i] = chars[i].translate(RM_ACCENTS_DICT)
+    return ''.join(chars)
+
+def arrow_dataset(data):
+    # Columnar stores are handed to Arrow as flat arrays instead of Python lists
+    if isinstance(data, ColumnStore):
+        return Dataset(data.to_arrow())
+    return Dataset.from_dict(data)
 
 def sort_data(dataset, remove_accents=False):
-    if remove_accents:
-        new_dataset = Dataset.from_dict(dataset.no_accent_data)
-    else:
-        new_dataset = Dataset.from_dict(dataset.data)
+    if hasattr(dataset, 'sorted_view'):
+        # WSDataset / PseudoDataset: the Arrow Dataset of a split is built once and
+        # reused, sorting only maps indices
+        return dataset.sorted_view(remove_accents=remove_accents)
+    new_dataset = arrow_dataset(dataset.no_accent_data if remove_accents else dataset.data)
     sorted_dataset = new_dataset.sort('sent_len')
     return sorted_dataset
 
@@ -124,30 +134,122 @@ def gen_dataIter(dataset, batch_size, len_list=None, shuffle=False, seed=None):
                 batch = dataset[start_index:end_index]
                 yield batch
         else:
+            # Group sentences of the same length from one precomputed length index
+            # instead of filtering the whole dataset once per length
+            sent_lens = np.asarray(dataset['sent_len'])
+            order = np.argsort(sent_lens, kind='stable')
+            sorted_lens = sent_lens[order]
             for sent_len in len_list:
-                sub_dataset = dataset.filter(lambda example: example["sent_len"] == sent_len)
+                start = np.searchsorted(sorted_lens, sent_len, side='left')
+                end = np.searchsorted(sorted_lens, sent_len, side='right')
+                sub_indices = order[start:end]
                 if shuffle:
-                    sub_dataset = sub_dataset.shuffle(seed=seed)
+                    sub_indices = sub_indices[np.random.default_rng(seed).permutation(len(sub_indices))]
 
-                num_samples = len(sub_dataset)
+                num_samples = len(sub_indices)
                 num_batches = (num_samples + batch_size - 1) // batch_size
 
                 for i in range(num_batches):
                     start_index = i * batch_size
                     end_index = min((i + 1) * batch_size, num_samples)
 
-                    batch = sub_dataset[start_index:end_index]
+                    batch = dataset[sub_indices[start_index:end_index].tolist()]
                     yield batch
 
+def get_length_buckets(sent_lens, batch_size=None, max_tokens=None, bucket_width=8, shuffle=False, seed=None):
+    """
+    Builds batches of sentence indices in one pass over a precomputed length index.
+
+    Sentences are grouped into length ranges of `bucket_width` tokens. A batch is closed
+    when it holds `batch_size` sentences or when padding it to its longest sentence would
+    exceed `max_tokens`; at least one of the two budgets must be given.
+    """
+    assert batch_size is not None or max_tokens is not None, "batch_size or max_tokens must be given"
+    sent_lens = np.asarray(sent_lens)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(sent_lens)) if shuffle else np.arange(len(sent_lens))
+    buckets = sent_lens[order] // bucket_width
+    order = order[np.argsort(buckets, kind='stable')]
+
+    batches = []
+    batch = []
+    batch_bucket = None
+    batch_max_len = 0
+    for idx in order.tolist():
+        sent_len = int(sent_lens[idx])
+        bucket = sent_len // bucket_width
+        max_len = max(batch_max_len, sent_len)
+        full = (
+            (batch_size is not None and len(batch) >= batch_size)
+            or (max_tokens is not None and (len(batch) + 1) * max_len > max_tokens)
+        )
+        if batch and (bucket != batch_bucket or full):
+            batches.append(np.array(batch))
+            batch = []
+            max_len = sent_len
+        batch.append(idx)
+        batch_bucket = bucket
+        batch_max_len = max_len
+    if batch:
+        batches.append(np.array(batch))
+
+    if shuffle:
+        batches = [batches[i] for i in rng.permutation(len(batches))]
+    return batches
+
+def pad_batch(batch, pad_id, num_rules=None):
+    """
+    Right-pads token-level columns of a batch and adds the matching attention mask.
+    num_rules: width of the weak_labels rows (default: taken from the first non-empty sentence)
+    """
+    sent_lens = [len(ids) for ids in batch['input_ids']]
+    max_len = max(sent_lens)
+    padded_batch = dict(batch)
+    if num_rules is None and batch.get('weak_labels') is not None:
+        num_rules = next((len(sent[0]) for sent in batch['weak_labels'] if len(sent)), 0)
+    for key in ['input_ids', 'output_ids', 'align_index', 'weak_labels']:
+        if batch.get(key) is None:
+            continue
+        padded = []
+        for sent in batch[key]:
+            num_pad = max_len - len(sent)
+            if key == 'weak_labels':
+                pad_value = [-1] * num_rules
+            elif key == 'align_index':
+                pad_value = -1
+            else:
+                pad_value = pad_id
+            padded.append(list(sent) + [pad_value] * num_pad)
+        padded_batch[key] = padded
+    padded_batch['attention_mask'] = [[1] * n + [0] * (max_len - n) for n in sent_lens]
+    return padded_batch
+
+def gen_bucketIter(dataset, pad_id, batch_size=None, max_tokens=None, bucket_width=8, shuffle=False, seed=None, pad=True):
+    # pad: with False, batches are yielded as lists of sentences of different lengths
+    #   (e.g. to be augmented before being padded, see AccentAugmenter.augment_batch)
+    batches = get_length_buckets(
+        dataset['sent_len'], batch_size=batch_size, max_tokens=max_tokens,
+        bucket_width=bucket_width, shuffle=shuffle, seed=seed
+    )
+    for indices in batches:
+        batch = dataset[indices.tolist()]
+        yield pad_batch(batch, pad_id) if pad else batch
+
 def evaluate(model, dataset, evaluator, mode="standard", comment="test", remove_accents=False):
     if model.__class__.__name__ == "Student":
         dataset = sort_data(dataset, remove_accents=remove_accents)
-    pred_dict = model.predict_ran(dataset=dataset) if mode=='ran' else model.predict(dataset=dataset)
-    # pred_dict = {'id', 'sources', 'targets', 'preds', 'aligned_index'}
-    res = evaluator.evaluate(preds=pred_dict['preds'],
-                             targets=pred_dict['output_ids'],
-                             sources=pred_dict['input_ids'],
-                             comment=comment)
+    if mode=='ran':
+        pred_dict = model.predict_ran(dataset=dataset)
+        # pred_dict = {'id', 'sources', 'targets', 'preds', 'aligned_index'}
+        res = evaluator.evaluate(preds=pred_dict['preds'],
+                                 targets=pred_dict['output_ids'],
+                                 sources=pred_dict['input_ids'],
+                                 comment=comment)
+    else:
+        # Metrics are accumulated batch by batch, predictions are only kept when returned
+        accumulator = evaluator.accumulator()
+        pred_dict = model.predict(dataset=dataset, accumulator=accumulator, return_outputs=mode!='standard')
+        res = evaluator.report(accumulator, comment=comment)
     if mode=='standard':
         return res
     else:
@@ -186,68 +288,79 @@ def merge_dicts(dict_list):
                 merged_dict[key] = value.copy()
     return merged_dict
 
-def write_predictions(args, logger, tokenizer, pred_dict, file_name=""):
+def prediction_row(tokenizer, sent_id, source, pred, align_index, is_nsw=None, target=None):
+    """Decodes one predicted sentence (token ids with special tokens) into an output record."""
+    # Sentences of padded batches (see pad_batch): padded positions are dropped
+    pad_id = tokenizer.convert_tokens_to_ids([PAD_TOKEN])[0]
+    source = [id for id in source if id != pad_id]
+    align_index = [index for index in align_index if index != -1]
+    if is_nsw is not None:
+        is_nsw = [label for label in is_nsw if label != -1]
+    decoded_source = tokenizer.convert_ids_to_tokens(source)
+    decoded_source, _ = delete_special_tokens(decoded_source)
+    source_str = tokenizer.convert_tokens_to_string(decoded_source)
+    pred = [id for id in pred if id != -1]
+    decoded_pred = tokenizer.convert_ids_to_tokens(pred)
+    decoded_pred, _ = delete_special_tokens(decoded_pred)
+    pred_str = tokenizer.convert_tokens_to_string(decoded_pred)
+    if target is not None:
+        target = target[:len(source)]
+        decoded_target = tokenizer.convert_ids_to_tokens(target)
+        decoded_target, _ = delete_special_tokens(decoded_target)
+        target_str = tokenizer.convert_tokens_to_string(decoded_target)
+        return {
+            'id': sent_id,
+            'source_text': post_process(source_str),
+            'target_text': post_process(target_str),
+            'prediction_text': post_process(pred_str),
+            'source_tokens': decoded_source,
+            'target_tokens': decoded_target,
+            'prediction_tokens': decoded_pred,
+            'aligned_index': align_index,
+            'is_nsw': is_nsw
+        }
+    return {
+        'id': sent_id,
+        'source_text': post_process(source_str),
+        'prediction_text': post_process(pred_str),
+        'source_tokens': decoded_source,
+        'prediction_tokens': decoded_pred,
+        'aligned_index': align_index,
+        'is_nsw': is_nsw
+    }
+
+def iter_predictions(args, tokenizer, pred_dict):
+    """Yields the output record of every sentence in a (batched) prediction dict."""
     label = False
     if 'output_ids' in pred_dict:
         label = True
     results = Dataset.from_dict(pred_dict)
-    data = []
     for i in range(len(results)):
         batch = results[i]
-        sent_ids = batch['id']
-        sources = batch['input_ids']
-        if label:
-            targets = batch['output_ids']
-        preds = batch['preds']
-        align_index = batch['align_index']
         is_nsw = batch['is_nsw']
         if args.nsw_detect:
             assert is_nsw, "ERROR: is_nsw must not be empty in NSW detection mode."
-        for idx, sent_id in enumerate(sent_ids):
-            source = sources[idx]
-            decoded_source = tokenizer.convert_ids_to_tokens(source)
-            decoded_source, _ = delete_special_tokens(decoded_source)
-            source_str = tokenizer.convert_tokens_to_string(decoded_source)
-            if label:
-                target = targets[idx]
-                decoded_target = tokenizer.convert_ids_to_tokens(target)
-                decoded_target, _ = delete_special_tokens(decoded_target)
-                target_str = tokenizer.convert_tokens_to_string(decoded_target)
-            if is_nsw:
-                norm_or_not = is_nsw[idx]
-            pred = preds[idx]
-            pred = [id for id in pred if id != -1]
-            decoded_pred = tokenizer.convert_ids_to_tokens(pred)
-            decoded_pred, _ = delete_special_tokens(decoded_pred)
-            pred_str = tokenizer.convert_tokens_to_string(decoded_pred)
-            if label:
-                res = {
-                    'id': sent_id,
-                    'source_text': post_process(source_str),
-                    'target_text': post_process(target_str),
-                    'prediction_text': post_process(pred_str),
-                    'source_tokens': decoded_source,
-                    'target_tokens': decoded_target,
-                    'prediction_tokens': decoded_pred,
-                    'aligned_index': align_index[idx],
-                    'is_nsw': norm_or_not
-                }
-            else:
-                res = {
-                    'id': sent_id,
-                    'source_text': post_process(source_str),
-                    'prediction_text': post_process(pred_str),
-                    'source_tokens': decoded_source,
-                    'prediction_tokens': decoded_pred,
-                    'aligned_index': align_index[idx],
-                    'is_nsw': norm_or_not
-                }
-            data.append(res)
-    
+        for idx, sent_id in enumerate(batch['id']):
+            yield prediction_row(
+                tokenizer, sent_id,
+                source=batch['input_ids'][idx],
+                pred=batch['preds'][idx],
+                align_index=batch['align_index'][idx],
+                is_nsw=is_nsw[idx] if is_nsw else None,
+                target=batch['output_ids'][idx] if label else None,
+            )
+
+def write_predictions(args, logger, tokenizer, pred_dict, file_name=""):
     json_path = os.path.join(args.logdir, "{}.json".format(file_name))
     logger.info("Writing predictions to json file at {}".format(json_path))
+    # Records are written one by one into the json list instead of being collected first
     with open(json_path, "w") as final:
-        json.dump(data, final)
+        final.write("[")
+        for i, res in enumerate(iter_predictions(args, tokenizer, pred_dict)):
+            if i > 0:
+                final.write(", ")
+            json.dump(res, final)
+        final.write("]")
     logger.info("Finish")
                        
 